@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from data_management.utils import backfill_anomaly_rollups
+
+
+class Command(BaseCommand):
+    """
+    Builds the anomaly rollups of the production anomalies stored before rollups existed.
+
+    Usage:
+        python manage.py backfill_anomaly_rollups [--batch-size N]
+    """
+
+    help = "Creates the missing minute and hour rollups from the stored production anomalies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows read from the database at a time.")
+
+    def handle(self, *args, **options):
+        created = backfill_anomaly_rollups(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} rollup buckets"))
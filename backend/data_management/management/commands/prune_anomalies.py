@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from data_management.utils import prune_production_anomalies
+
+
+class Command(BaseCommand):
+    """
+    Prunes the production anomalies older than the retention period.
+
+    Usage:
+        python manage.py prune_anomalies [--days N] [--no-archive]
+    """
+
+    help = "Prunes (and optionally archives) production anomalies older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Retention in days (default: ANOMALY_RETENTION_DAYS).")
+        parser.add_argument("--no-archive", action="store_true", help="Delete the rows without archiving them.")
+
+    def handle(self, *args, **options):
+        result = prune_production_anomalies(
+            retention_days=options["days"],
+            archive=False if options["no_archive"] else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Pruned {result['anomalies']} anomalies and {result['rollups']} rollups (archive: {result['archive']})"
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0029_file_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScenarioRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='Queued', max_length=20)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('nodes', models.JSONField(default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('scenario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='data_management.scenario')),
+            ],
+            options={
+                'db_table': 'ScenarioRun',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0030_scenariorun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scenariorun',
+            name='execution',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scenariorun',
+            name='profile',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0031_scenariorun_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalymetric',
+            name='artifact',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.24 on 2026-10-19 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0032_anomalymetric_artifact'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomalymetric',
+            index=models.Index(fields=['scenario_model', 'production', 'date'], name='anomaly_model_prod_date_idx'),
+        ),
+        migrations.CreateModel(
+            name='AnomalyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=255)),
+                ('granularity', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('sources', models.JSONField(default=dict)),
+                ('scenario_model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomaly_rollups', to='data_management.scenariomodel')),
+            ],
+            options={
+                'db_table': 'AnomalyRollup',
+                'indexes': [models.Index(fields=['scenario_model', 'granularity', 'bucket'], name='rollup_model_gran_bucket_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='anomalyrollup',
+            constraint=models.UniqueConstraint(fields=('scenario_model', 'model_name', 'granularity', 'bucket'), name='unique_anomaly_rollup'),
+        ),
+    ]
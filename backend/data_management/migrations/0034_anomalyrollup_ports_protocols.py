@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0033_anomalyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomalyrollup',
+            name='ports',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='anomalyrollup',
+            name='protocols',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -15,6 +15,8 @@ class File(models.Model):
     - entry_count: Number of rows or records contained in the file.
     - content: Actual file uploaded and stored under MEDIA_ROOT/files/.
     - references: Number of times the file is referenced across designs or scenarios.
+    - sha256: SHA-256 of the content, used to deduplicate uploads. Records with the
+      same hash share the stored content.
     """
     
     FILE_TYPES = [
@@ -28,6 +30,7 @@ class File(models.Model):
     entry_count = models.IntegerField(default=0)
     content = models.FileField(upload_to='files/')
     references = models.IntegerField(default=1)
+    sha256 = models.CharField(max_length=64, blank=True, default="", db_index=True)
 
     class Meta:
         db_table = "File"
@@ -70,6 +73,37 @@ class ScenarioModel(models.Model):
     class Meta:
         db_table = "ScenarioModel"
 
+class ScenarioRun(models.Model):
+    """
+    Represents one asynchronous execution of a scenario design.
+
+    Fields:
+    - scenario: Foreign key to the Scenario being executed.
+    - status: State of the run ('Queued', 'Running', 'Finished' or 'Error').
+    - error: Error message when the run fails.
+    - nodes: Progress of every design node keyed by node id, with its type, state
+      ('pending', 'running', 'finished' or 'error') and elapsed seconds.
+    - execution: Execution number of the scenario model produced by this run.
+    - profile: Measurements of every executed node keyed by node id (wall and CPU
+      time, process peak RSS when the node ended, rows in/out, artifact size and cache usage).
+    - created, started, finished: Timestamps of the run lifecycle.
+    """
+
+    STATUS_ACTIVE = ("Queued", "Running")
+
+    scenario = models.ForeignKey(Scenario, on_delete=models.CASCADE, related_name="runs")
+    status = models.CharField(max_length=20, default="Queued")
+    error = models.TextField(null=True, blank=True)
+    nodes = models.JSONField(default=dict)
+    execution = models.IntegerField(null=True, blank=True)
+    profile = models.JSONField(default=dict)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "ScenarioRun"
+
 class ClassificationMetric(models.Model):
     """
     Represents metrics for classification models used in anomaly detection.
@@ -144,6 +178,9 @@ class AnomalyMetric(models.Model):
     - date: Timestamp when the metrics were recorded.
     - anomaly_details: Text field for additional details about the anomalies.
     - global_shap_images, local_shap_images, global_lime_images, local_lime_images: JSON fields to store images related to SHAP and LIME explanations.
+    - artifact: For training results, path prefix (relative to MEDIA_ROOT) of the `.npy` files
+      with the values of every feature, the predictions and the anomaly indices. These rows hold one
+      result per model and execution, and `anomalies` only keeps a summary.
     """
     scenario_model = models.ForeignKey(ScenarioModel, on_delete=models.CASCADE)
     execution = models.IntegerField()
@@ -158,6 +195,53 @@ class AnomalyMetric(models.Model):
     local_shap_images = JSONField(null=True, blank=True)
     global_lime_images = JSONField(null=True, blank=True)
     local_lime_images = JSONField(null=True, blank=True)
+    artifact = models.CharField(max_length=255, blank=True, default="")
 
     class Meta:
         db_table = "AnomalyMetric"
+        indexes = [
+            models.Index(fields=["scenario_model", "production", "date"], name="anomaly_model_prod_date_idx"),
+        ]
+
+class AnomalyRollup(models.Model):
+    """
+    Represents the number of production anomalies detected by a model in a time bucket.
+
+    Rows are updated incrementally every time a production anomaly is stored, so
+    dashboards can be drawn without scanning the raw AnomalyMetric rows.
+
+    Fields:
+    - scenario_model: Foreign key to the ScenarioModel the anomalies belong to.
+    - model_name: Name of the anomaly detection model.
+    - granularity: Size of the bucket ('minute' or 'hour').
+    - bucket: Start of the bucket.
+    - count: Number of anomalies in the bucket.
+    - sources: Anomalies per source IP, limited to the most frequent ones.
+    - ports: Anomalies per destination port, limited to the most frequent ones.
+    - protocols: Anomalies per protocol, limited to the most frequent ones.
+    """
+
+    GRANULARITIES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+    ]
+
+    scenario_model = models.ForeignKey(ScenarioModel, on_delete=models.CASCADE, related_name="anomaly_rollups")
+    model_name = models.CharField(max_length=255)
+    granularity = models.CharField(max_length=10, choices=GRANULARITIES)
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    sources = models.JSONField(default=dict)
+    ports = models.JSONField(default=dict)
+    protocols = models.JSONField(default=dict)
+
+    class Meta:
+        db_table = "AnomalyRollup"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["scenario_model", "model_name", "granularity", "bucket"], name="unique_anomaly_rollup"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["scenario_model", "granularity", "bucket"], name="rollup_model_gran_bucket_idx"),
+        ]
@@ -1,3 +1,825 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shlex
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import joblib
+import numpy as np
+import pandas as pd
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from sklearn.decomposition import PCA
+from sklearn.impute import KNNImputer
+from sklearn.preprocessing import MinMaxScaler, Normalizer, StandardScaler
+
+from netanoms_runtime import feature_agent, handler_packet_traffic_anomalies
+from netanoms_runtime.agent_stream import build_agent_cmd, iter_batches
+from netanoms_runtime.capture_config import CaptureConfig
+from netanoms_runtime.handler_agent_anomalies import _network_frame
+from netanoms_runtime.pcap_stream import PACKET_COLUMNS, PacketBatch, extract_packet_features, iter_pcap_records
+from netanoms_runtime.pipeline_compiler import AffineStage, _apply_step, apply_stages, compile_steps, index_knn_imputer
+from netanoms_runtime.syscall_features import (SYSCALL_COLUMNS, SYSCALL_COUNTERS, SyscallWindowRing,
+                                               add_rolling_syscall_features, load_syscall_jsonl,
+                                               parse_syscall_line)
+
+from .models import AnomalyMetric, AnomalyRollup, ClassificationMetric, File, Scenario, ScenarioModel
+from .utils import (ROLLUP_MAX_KEYS, backfill_anomaly_rollups, build_pipelines_from_design, downsample_anomaly_series,
+                    load_anomaly_results, load_cached_features, load_config, prune_production_anomalies,
+                    save_cached_features, save_training_anomaly_metrics, update_anomaly_rollups)
+from .views import execute_scenario
+
+
+def make_csv(rows=200, seed=0):
+    """Returns the content of a small labelled CSV."""
+
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, 3))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    lines = ["a,b,c,label"] + [f"{a:.6f},{b:.6f},{c:.6f},{t}" for (a, b, c), t in zip(X, y)]
+    return ("\n".join(lines) + "\n").encode()
+
+
+class MediaRootMixin:
+    """Gives every test a temporary MEDIA_ROOT, removed afterwards, and a user."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix="media-")
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+        self.user = get_user_model().objects.create_user(username="tester", password="secret")
+
+    def create_scenario(self, design, csv_content):
+        """Creates a scenario of the test user whose design reads `csv_content` as data.csv."""
+
+        scenario = Scenario.objects.create(user=self.user, design=design)
+        csv = File.objects.create(name="data.csv", file_type="csv")
+        csv.content.save("data.csv", ContentFile(csv_content))
+        scenario.files.add(csv)
+        return scenario, ScenarioModel.objects.create(scenario=scenario)
+
+
+class ParallelExecutionTests(MediaRootMixin, TransactionTestCase):
+    """
+    Running the independent branches of a design in parallel must not change its results.
+
+    The nodes run in worker threads with their own database connections, so the rows
+    created by the test are committed instead of living in the test transaction.
+    """
+
+    def diamond_design(self):
+        # CSV -> two seeded splitters -> one model fed by both -> monitor
+        return {
+            "elements": [
+                {"id": "csv", "type": "CSV",
+                 "parameters": {"csvFileName": "data.csv", "columns": {"a": True, "b": True, "c": True, "label": True}}},
+                {"id": "split_a", "type": "DataSplitter",
+                 "parameters": {"train_size": 70, "test_size": 30, "random_state": "custom", "custom_random_state": 1}},
+                {"id": "split_b", "type": "DataSplitter",
+                 "parameters": {"train_size": 60, "test_size": 40, "random_state": "custom", "custom_random_state": 2}},
+                {"id": "tree", "type": "DecisionTree",
+                 "parameters": {"execution_mode": "cpu", "random_state": "custom", "custom_random_state": 3}},
+                {"id": "monitor", "type": "ClassificationMonitor",
+                 "parameters": {"metrics": {"accuracy": True, "precision": True, "recall": True, "f1Score": True,
+                                            "confusionMatrix": True}}},
+            ],
+            "connections": [
+                {"startId": "csv", "endId": "split_a"},
+                {"startId": "csv", "endId": "split_b"},
+                {"startId": "split_a", "endId": "tree", "startOutput": "train"},
+                {"startId": "split_a", "endId": "tree", "startOutput": "test"},
+                {"startId": "split_b", "endId": "tree", "startOutput": "train"},
+                {"startId": "split_b", "endId": "tree", "startOutput": "test"},
+                {"startId": "tree", "endId": "monitor"},
+            ],
+        }
+
+    def run_design(self, workers):
+        design = self.diamond_design()
+        scenario, scenario_model = self.create_scenario(design, make_csv())
+
+        with override_settings(SCENARIO_NODE_WORKERS=workers):
+            result = execute_scenario(scenario_model, scenario, design, use_cache=False)
+        self.assertEqual(result, {"message": "Execution successful"})
+
+        metric = ClassificationMetric.objects.get(scenario_model=scenario_model)
+        return metric.accuracy, metric.precision, metric.recall, metric.f1_score, metric.confusion_matrix
+
+    def test_diamond_design_gives_the_same_outputs_serially_and_in_parallel(self):
+        serial = self.run_design(workers=1)
+        parallel = self.run_design(workers=4)
+
+        self.assertIsNotNone(serial[0])
+        self.assertEqual(serial, parallel)
+
+
+class IndexedKNNImputerTests(SimpleTestCase):
+    """The indexed KNNImputer must impute exactly like sklearn's brute-force search."""
+
+    def fit(self, X, **params):
+        imputer = KNNImputer(n_neighbors=3, **params)
+        imputer.fit(pd.DataFrame(X, columns=[f"f{i}" for i in range(X.shape[1])]))
+        indexed = index_knn_imputer(imputer)
+        self.assertIsNotNone(indexed)
+        return imputer, indexed
+
+    def assert_same_imputation(self, imputer, indexed, X):
+        expected = imputer.transform(pd.DataFrame(X, columns=imputer.feature_names_in_))
+        np.testing.assert_allclose(indexed.transform(X), expected, rtol=1e-9, atol=1e-12)
+
+    def training_data(self, rows=300, features=4, missing=0.1):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(rows, features))
+        X[rng.random(X.shape) < missing] = np.nan
+        return X
+
+    def queries(self, rows=100, features=4, missing=0.3):
+        rng = np.random.default_rng(1)
+        X = rng.normal(size=(rows, features))
+        X[rng.random(X.shape) < missing] = np.nan
+        return X
+
+    def test_uniform_weights(self):
+        imputer, indexed = self.fit(self.training_data())
+        self.assert_same_imputation(imputer, indexed, self.queries())
+
+    def test_distance_weights(self):
+        imputer, indexed = self.fit(self.training_data(), weights="distance")
+        self.assert_same_imputation(imputer, indexed, self.queries())
+
+        # A row equal to a training row takes the values of that row only
+        X = self.training_data()
+        row = X[~np.isnan(X).any(axis=1)][:1].copy()
+        row[0, 1] = np.nan
+        self.assert_same_imputation(imputer, indexed, row)
+
+    def test_rows_without_any_present_feature(self):
+        for weights in ("uniform", "distance"):
+            imputer, indexed = self.fit(self.training_data(), weights=weights)
+            X = self.queries()
+            X[::7] = np.nan
+            self.assert_same_imputation(imputer, indexed, X)
+
+    def test_rows_whose_nearest_neighbors_miss_the_feature(self):
+        rng = np.random.default_rng(2)
+        X = rng.normal(size=(200, 3))
+        # The training rows close to the origin never have f2, so its donors are far away
+        X[np.linalg.norm(X[:, :2], axis=1) < 1.0, 2] = np.nan
+        # f0 is only known where f1 is not, so rows with only f1 have no donor at a defined distance
+        X[:50, 1] = np.nan
+        X[50:, 0] = np.nan
+
+        queries = rng.normal(scale=0.3, size=(40, 3))
+        queries[:20, 2] = np.nan
+        queries[20:, 0] = np.nan
+        queries[20:, 2] = np.nan
+        for weights in ("uniform", "distance"):
+            imputer, indexed = self.fit(X, weights=weights)
+            self.assert_same_imputation(imputer, indexed, queries)
+
+    def test_rows_without_missing_values_are_unchanged(self):
+        imputer, indexed = self.fit(self.training_data())
+        X = self.queries(missing=0.0)
+        np.testing.assert_array_equal(indexed.transform(X), X)
+
+
+class StepFusionTests(SimpleTestCase):
+    """Fused preprocessing stages must give the same frame as applying the steps one by one."""
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.train = pd.DataFrame(rng.normal(loc=5.0, scale=3.0, size=(200, 4)), columns=["a", "b", "c", "d"])
+        self.live = pd.DataFrame(rng.normal(loc=5.0, scale=3.0, size=(30, 4)), columns=["a", "b", "c", "d"])
+        # Columns no step transforms
+        self.live["src_port"] = rng.integers(1, 65535, size=30)
+        self.live["protocol"] = rng.choice(["TCP", "UDP"], size=30)
+
+    def assert_same_output(self, steps, df, fused=True):
+        stages = compile_steps(steps)
+        self.assertEqual(any(isinstance(stage, AffineStage) for stage in stages), fused)
+
+        expected = df.copy()
+        for step in steps:
+            expected = _apply_step(expected, *step)
+        actual = apply_stages(df.copy(), stages)
+
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-9, atol=1e-9)
+
+    def test_steps_on_the_same_columns(self):
+        steps = [
+            ("StandardScaler", StandardScaler().fit(self.train[["a", "b", "c", "d"]])),
+            ("MinMaxScaler", MinMaxScaler().fit(self.train[["a", "b", "c", "d"]])),
+            ("PCA", PCA(whiten=True).fit(self.train[["a", "b", "c", "d"]])),
+        ]
+        self.assert_same_output(steps, self.live)
+
+    def test_steps_on_column_subsets(self):
+        steps = [
+            ("StandardScaler", StandardScaler().fit(self.train[["a", "b"]])),
+            ("MinMaxScaler", MinMaxScaler().fit(self.train[["b", "c"]])),
+            ("StandardScaler", StandardScaler(with_mean=False).fit(self.train[["d"]])),
+        ]
+        self.assert_same_output(steps, self.live)
+
+        # Columns missing from the live rows are filled with 0 by both paths
+        self.assert_same_output(steps, self.live.drop(columns=["c"]))
+
+    def test_pass_through_columns_are_unchanged(self):
+        steps = [
+            ("StandardScaler", StandardScaler().fit(self.train[["a", "b"]])),
+            ("MinMaxScaler", MinMaxScaler().fit(self.train[["a", "b"]])),
+        ]
+        output = apply_stages(self.live.copy(), compile_steps(steps))
+        pd.testing.assert_frame_equal(output[["c", "d", "src_port", "protocol"]],
+                                      self.live[["c", "d", "src_port", "protocol"]])
+
+    def test_rows_with_missing_values(self):
+        steps = [
+            ("StandardScaler", StandardScaler().fit(self.train)),
+            ("MinMaxScaler", MinMaxScaler().fit(self.train)),
+        ]
+        live = self.live.copy()
+        live.loc[3, "b"] = np.nan
+        self.assert_same_output(steps, live)
+
+    def test_non_linear_steps_split_the_runs(self):
+        steps = [
+            ("StandardScaler", StandardScaler().fit(self.train)),
+            ("MinMaxScaler", MinMaxScaler().fit(self.train)),
+            ("Normalizer", Normalizer().fit(self.train)),
+            ("MinMaxScaler", MinMaxScaler(clip=True).fit(self.train)),
+            ("PCA", PCA().fit(self.train)),
+        ]
+        self.assert_same_output(steps, self.live)
+
+        stages = compile_steps(steps)
+        self.assertIsInstance(stages[0], AffineStage)
+        self.assertEqual([stage[0] for stage in stages[1:]], ["Normalizer", "MinMaxScaler", "PCA"])
+
+
+class PrecompiledStagesTests(MediaRootMixin, TestCase):
+    """The preprocessing stages of a model are compiled at training time and reused by production sessions."""
+
+    design = {
+        "elements": [
+            {"id": "csv", "type": "CSV",
+             "parameters": {"csvFileName": "data.csv", "columns": {"a": True, "b": True, "c": True}}},
+            {"id": "std", "type": "StandardScaler", "parameters": {}},
+            {"id": "minmax", "type": "MinMaxScaler", "parameters": {}},
+            {"id": "forest", "type": "IsolationForest",
+             "parameters": {"execution_mode": "cpu", "random_state": "custom", "custom_random_state": 7}},
+        ],
+        "connections": [
+            {"startId": "csv", "endId": "std"},
+            {"startId": "std", "endId": "minmax"},
+            {"startId": "minmax", "endId": "forest"},
+        ],
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.scenario, scenario_model = self.create_scenario(self.design, make_csv(rows=100))
+        result = execute_scenario(scenario_model, self.scenario, self.design, use_cache=False)
+        self.assertEqual(result, {"message": "Execution successful"})
+        self.models_dir = os.path.join(self.media_root, "models_storage")
+
+    def build_pipeline(self):
+        pipelines = build_pipelines_from_design(self.design, self.scenario.uuid, load_config(), self.models_dir)
+        self.assertEqual(len(pipelines), 1)
+        return pipelines[0]
+
+    def test_bundle_stores_the_compiled_stages(self):
+        bundle = joblib.load(os.path.join(self.models_dir, f"forest_{self.scenario.uuid}.pkl"))
+        self.assertEqual(len(bundle["stages"]), 1)
+        self.assertIsInstance(bundle["stages"][0], AffineStage)
+        self.assertEqual([step_type for step_type, _ in bundle["stages"][0].steps], ["StandardScaler", "MinMaxScaler"])
+
+    def test_sessions_do_not_compile_the_steps_again(self):
+        with mock.patch("netanoms_runtime.pipeline_def.compile_steps") as compile_mock:
+            pipeline = self.build_pipeline()
+        compile_mock.assert_not_called()
+
+        live = pd.DataFrame({"a": [0.5, -1.0], "b": [2.0, 0.0], "c": [1.0, 1.5]})
+        expected = live.copy()
+        for step in pipeline.steps:
+            expected = _apply_step(expected, *step)
+        pd.testing.assert_frame_equal(pipeline.transform(live.copy()), expected, check_exact=False, rtol=1e-9)
+
+    def test_steps_saved_after_the_model_are_compiled_again(self):
+        step_path = os.path.join(self.models_dir, f"minmax_{self.scenario.uuid}.pkl")
+        os.utime(step_path, (time.time() + 60, time.time() + 60))
+
+        with mock.patch("netanoms_runtime.pipeline_def.compile_steps", wraps=compile_steps) as compile_mock:
+            self.build_pipeline()
+        compile_mock.assert_called_once()
+
+
+def ethernet(ethertype, payload, vlans=()):
+    """Returns an Ethernet frame, with one 802.1Q/802.1ad tag per entry of `vlans`."""
+
+    header = b"\x02" * 6 + b"\x04" * 6
+    for tag in vlans:
+        header += struct.pack("!HH", tag, 7)
+    return header + struct.pack("!H", ethertype) + payload
+
+
+def ipv4(proto, payload, src="10.0.0.1", dst="10.0.0.2", ttl=64, fragment_offset=0):
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(payload), 1, fragment_offset, ttl, proto, 0,
+                         socket.inet_aton(src), socket.inet_aton(dst))
+    return header + payload
+
+
+def ipv6(next_header, payload, src="2001:db8::1", dst="2001:db8::2", hop_limit=60):
+    header = struct.pack("!IHBB16s16s", 6 << 28, len(payload), next_header, hop_limit,
+                         socket.inet_pton(socket.AF_INET6, src), socket.inet_pton(socket.AF_INET6, dst))
+    return header + payload
+
+
+def ipv6_extension(next_header, payload, units=0):
+    """Returns an IPv6 hop-by-hop/destination options header of (units + 1) * 8 bytes."""
+
+    return struct.pack("!BB", next_header, units) + b"\x00" * (6 + 8 * units) + payload
+
+
+def ipv6_fragment(next_header, payload, offset=0):
+    return struct.pack("!BBHI", next_header, 0, offset << 3, 1) + payload
+
+
+def transport(src_port, dst_port):
+    return struct.pack("!HH", src_port, dst_port) + b"\x00" * 16
+
+
+def pcap_file(frames, linktype=1, snaplen=65535):
+    """Returns a little-endian pcap capture with (captured bytes, original length) frames."""
+
+    content = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, snaplen, linktype)
+    for i, (data, length) in enumerate(frames):
+        content += struct.pack("<IIII", 1700000000 + i, 250 * i, len(data), length) + data
+    return content
+
+
+def pcapng_file(interfaces, frames):
+    """Returns a pcapng capture with one interface per link type and (interface, captured bytes) frames."""
+
+    def block(block_type, body):
+        body += b"\x00" * (-len(body) % 4)
+        return struct.pack("<II", block_type, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+    content = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    for linktype in interfaces:
+        content += block(1, struct.pack("<HHI", linktype, 0, 0))
+    for i, (interface, data) in enumerate(frames):
+        content += block(6, struct.pack("<IIIII", interface, 0, 1000 * i, len(data), len(data) + 4) + data)
+    return content
+
+
+class PacketExtractionTests(SimpleTestCase):
+    """The batch header decoder must give the rows of the per-packet decoder used live."""
+
+    def frames(self):
+        tcp = transport(40000, 443)
+        udp = transport(5353, 53)
+        return [
+            ethernet(0x0800, ipv4(6, tcp)),
+            ethernet(0x0800, ipv4(17, udp, src="192.168.1.10", dst="8.8.8.8", ttl=128)),
+            ethernet(0x0800, ipv4(1, b"\x08\x00" + b"\x00" * 30)),
+            ethernet(0x0800, ipv4(6, tcp, fragment_offset=100)),
+            ethernet(0x0800, ipv4(6, tcp), vlans=(0x88A8, 0x8100)),
+            ethernet(0x0806, b"\x00" * 28),
+            ethernet(0x0800, ipv4(6, tcp))[:30],
+            b"\x00" * 10,
+            ethernet(0x86DD, ipv6(6, tcp)),
+            ethernet(0x86DD, ipv6(0, ipv6_extension(17, udp), src="fe80::1", dst="ff02::fb")),
+            ethernet(0x86DD, ipv6(44, ipv6_fragment(17, udp))),
+            ethernet(0x86DD, ipv6(44, ipv6_fragment(17, udp, offset=20))),
+            # Options longer than the bytes decoded with NumPy
+            ethernet(0x86DD, ipv6(60, ipv6_extension(6, tcp, units=40))),
+            ethernet(0x86DD, ipv6(60, ipv6_extension(6, tcp, units=40)))[:200],
+        ]
+
+    def serial_rows(self, content):
+        batch = PacketBatch(1000)
+        for record in iter_pcap_records(io.BytesIO(content)):
+            batch.append(*record)
+        return batch.to_frame()
+
+    def assert_same_rows(self, content):
+        expected = self.serial_rows(content)
+        for chunk_size in (3, 16_384):
+            actual = extract_packet_features(io.BytesIO(content), chunk_size=chunk_size)
+            pd.testing.assert_frame_equal(actual, expected)
+        return expected
+
+    def test_pcap(self):
+        frames = self.frames()
+        rows = self.assert_same_rows(pcap_file([(data, len(data) + 4) for data in frames]))
+        self.assertEqual(len(rows), len(frames))
+        # The reported protocol is the first next header, the ports are found after the long options
+        self.assertEqual(rows.loc[12, ["protocol", "src_port", "dst_port"]].tolist(), ["60", 40000, 443])
+
+    def test_pcapng_with_several_link_types(self):
+        sll = b"\x00" * 14 + struct.pack("!H", 0x0800) + ipv4(17, transport(1000, 2000))
+        sll2 = struct.pack("!H", 0x86DD) + b"\x00" * 18 + ipv6(6, transport(3000, 4000))
+        raw = ipv4(6, transport(5000, 6000), src="172.16.0.1")
+        frames = [(0, data) for data in self.frames()] + [(1, sll), (2, sll2), (3, raw), (4, raw), (3, raw[:10])]
+        self.assert_same_rows(pcapng_file([1, 113, 276, 101, 147], frames))
+
+    def test_empty_capture(self):
+        rows = extract_packet_features(io.BytesIO(pcap_file([])))
+        self.assertTrue(rows.empty)
+        self.assertEqual(list(rows.columns), PACKET_COLUMNS)
+
+
+class PacketHandlerFlushTests(SimpleTestCase):
+    """Waiting packets are scored once `interval` has passed, even if no other packet arrives."""
+
+    def test_batch_is_scored_while_the_pipe_is_idle(self):
+        read_fd, write_fd = os.pipe()
+        scored = []
+
+        def score(df, pipelines, **kwargs):
+            scored.append((time.monotonic(), len(df), kwargs["log_prefix"]))
+            return kwargs["image_counter"]
+
+        with open(read_fd, "rb") as stdout, \
+                mock.patch.object(handler_packet_traffic_anomalies, "_score_traffic_frame", side_effect=score), \
+                mock.patch.object(handler_packet_traffic_anomalies, "get_next_anomaly_index", return_value=1):
+            proc = mock.Mock(stdout=stdout)
+            thread = threading.Thread(
+                target=handler_packet_traffic_anomalies.handle_pcap_packet_anomalies,
+                args=(proc, []), kwargs={"scenario_uuid": "flush-test", "interval": 0.2},
+            )
+            thread.start()
+
+            # One packet, then the pipe stays open without data
+            written = time.monotonic()
+            os.write(write_fd, pcap_file([(ethernet(0x0800, ipv4(6, transport(1, 2))), 60)]))
+            deadline = time.monotonic() + 5
+            while not scored and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            os.close(write_fd)
+            thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(scored), 1)
+        flushed_at, rows, log_prefix = scored[0]
+        self.assertEqual((rows, log_prefix), (1, "[HANDLE PACKET]"))
+        self.assertLess(flushed_at - written, 2)
+
+
+class FeatureCacheTests(SimpleTestCase):
+    """Cached features must come back with the values and types they were saved with."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix="features-")
+        self.addCleanup(shutil.rmtree, self.tmp, True)
+        self.path = os.path.join(self.tmp, "data.csv")
+        with open(self.path, "wb") as fh:
+            fh.write(make_csv(rows=5))
+
+    def frame(self):
+        return pd.DataFrame({
+            "count": np.array([1, 2, 3, 4, 5], dtype=np.int64),
+            "ratio": [0.5, np.nan, 1.5, 2.0, -1.0],
+            "flag": [True, False, True, True, False],
+            "proto": ["TCP", "UDP", None, "TCP", "ICMP"],
+            "mixed": [1, "1", None, 2.5, "x"],
+        })
+
+    def test_round_trip(self):
+        df = self.frame()
+        save_cached_features(self.path, "csv", df)
+        loaded = load_cached_features(self.path, "csv")
+
+        self.assertEqual(loaded.columns.tolist(), df.columns.tolist())
+        pd.testing.assert_frame_equal(loaded[["count", "ratio", "flag"]].copy(), df[["count", "ratio", "flag"]])
+        self.assertEqual(loaded["proto"].tolist()[:2] + loaded["proto"].tolist()[3:], ["TCP", "UDP", "TCP", "ICMP"])
+        self.assertTrue(pd.isna(loaded["proto"].iloc[2]))
+
+        mixed = loaded["mixed"].tolist()
+        self.assertEqual([(type(v), v) for v in mixed[:2] + mixed[3:]], [(int, 1), (str, "1"), (float, 2.5), (str, "x")])
+        self.assertTrue(pd.isna(mixed[2]))
+
+    def test_numeric_columns_are_memory_mapped_and_writable(self):
+        save_cached_features(self.path, "csv", self.frame())
+        loaded = load_cached_features(self.path, "csv", columns=["ratio", "count"])
+
+        self.assertEqual(loaded.columns.tolist(), ["ratio", "count"])
+        for name in loaded.columns:
+            self.assertIsInstance(np.asarray(loaded[name].values).base, np.memmap)
+        loaded.loc[0, "count"] = 10
+
+        reloaded = load_cached_features(self.path, "csv", columns=["count"])
+        self.assertEqual(reloaded["count"].iloc[0], 1)
+
+    def test_miss_and_unknown_column(self):
+        self.assertIsNone(load_cached_features(self.path, "csv"))
+        save_cached_features(self.path, "csv", self.frame())
+        with self.assertRaises(KeyError):
+            load_cached_features(self.path, "csv", columns=["missing"])
+
+    def test_unsupported_categories_are_not_cached(self):
+        df = pd.DataFrame({"raw": [b"a", b"b"]})
+        with self.assertRaises(TypeError):
+            save_cached_features(self.path, "csv", df)
+        self.assertIsNone(load_cached_features(self.path, "csv"))
+
+
+class FeatureAgentTests(SimpleTestCase):
+    """Agent batches must keep every address, and docker runs must not rely on backend paths."""
+
+    def test_ipv4_and_ipv6_addresses_round_trip(self):
+        fields = [
+            ["1.5", "60", "10.0.0.1", "10.0.0.2", "6", "64", "", "", "1", "", "2", "", "", ""],
+            ["1.6", "80", "", "", "", "", "17", "60", "", "5", "", "6", "2001:db8::1", "2001:db8::2"],
+            ["1.7", "80", "", "", "", "", "17", "60", "", "5", "", "6", "2001:db8::3", "2001:db8::2"],
+            ["1.8", "40", "", "", "", "", "", "", "", "", "", "", "", ""],
+        ]
+        rows = [feature_agent.parse_packet_line("\t".join(f)) for f in fields]
+        stream = io.BytesIO(feature_agent.encode_batch(feature_agent.PACKET_SCHEMA, rows))
+
+        batch, = iter_batches(stream)
+        df = _network_frame(pd.DataFrame(batch))
+
+        self.assertEqual(df["src"].tolist()[:3], ["10.0.0.1", "2001:db8::1", "2001:db8::3"])
+        self.assertEqual(df["dst"].tolist()[:3], ["10.0.0.2", "2001:db8::2", "2001:db8::2"])
+        self.assertTrue(df[["src", "dst"]].iloc[3].isna().all())
+        self.assertEqual(df["protocol"].tolist(), ["TCP", "UDP", "UDP", "UNKNOWN"])
+        self.assertEqual(df["dst_port"].tolist(), [2, 6, 6, -1])
+
+    def test_docker_mode_sends_the_bpftrace_script_inline(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".bt", delete=False) as fh:
+            fh.write('tracepoint:syscalls:sys_enter_read { @c["read"]++; }\n')
+        self.addCleanup(os.remove, fh.name)
+        ssh = mock.Mock(username="user", host="host", interface="eth0", tshark_path="/usr/bin/tshark",
+                        dumpcap_path="/usr/bin/dumpcap", bpftrace_path="/usr/bin/bpftrace", sudo=False)
+
+        docker = build_agent_cmd(ssh, CaptureConfig(mode="syscalls", run_env="docker", bpftrace_script_path=fh.name))
+        remote = shlex.split(docker[-1])
+        self.assertEqual(remote[remote.index("--program") + 1], 'tracepoint:syscalls:sys_enter_read { @c["read"]++; }\n')
+        self.assertNotIn("--script", remote)
+
+        host = build_agent_cmd(ssh, CaptureConfig(mode="syscalls", run_env="host", bpftrace_script_path=fh.name))
+        self.assertEqual(host[host.index("--script") + 1], fh.name)
+        self.assertEqual(feature_agent._capture_cmd(mock.Mock(mode="syscalls", bpftrace="bpftrace", program="x", script="", extra=[])),
+                         ["bpftrace", "-q", "-e", "x"])
+
+
+class RollingSyscallFeatureTests(SimpleTestCase):
+    """Live rolling features (ring buffer) must match the ones computed at training time."""
+
+    def jsonl_lines(self, windows=150):
+        rng = np.random.default_rng(0)
+        lines = []
+        for w in range(windows):
+            record = {"window_start_ns": w * 10**9, "window_end_ns": (w + 1) * 10**9}
+            # Some counters are missing, and some windows are idle (total 0)
+            record.update({c: int(rng.integers(0, 500)) for c in SYSCALL_COUNTERS if rng.random() > 0.2})
+            if w % 17 == 0:
+                record = {k: 0 for k in record}
+            record["total_syscalls"] = sum(record.get(c, 0) for c in SYSCALL_COUNTERS)
+            lines.append(json.dumps(record))
+        lines.insert(40, "not a window")
+        return lines
+
+    def assert_same_features(self, lines, horizons):
+        tmp = tempfile.mkdtemp(prefix="syscalls-")
+        self.addCleanup(shutil.rmtree, tmp, True)
+        path = os.path.join(tmp, "windows.jsonl")
+        with open(path, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+        df, _ = load_syscall_jsonl(path)
+        batch = add_rolling_syscall_features(df, horizons)
+
+        # Same path as handle_syscalls_anomalies: parse every line and push it to the ring
+        ring = SyscallWindowRing(horizons)
+        live = []
+        for line in lines:
+            values = parse_syscall_line(line)
+            if values is not None:
+                live.append(ring.push(dict(zip(SYSCALL_COLUMNS, values))))
+        live = pd.DataFrame(live)
+
+        self.assertEqual(len(live), len(batch))
+        self.assertEqual(live.columns.tolist(), ring.feature_names)
+        for name in ring.feature_names:
+            np.testing.assert_allclose(live[name].to_numpy(dtype=float), batch[name].to_numpy(dtype=float),
+                                       rtol=1e-12, err_msg=name)
+
+    def test_default_horizons(self):
+        self.assert_same_features(self.jsonl_lines(), (5, 30, 60))
+
+    def test_short_horizons(self):
+        self.assert_same_features(self.jsonl_lines(windows=20), (1, 2, 3))
+
+
+class TrainingAnomalyResultsTests(MediaRootMixin, TestCase):
+    """Training anomaly results are stored as one row per model plus memory-mapped arrays."""
+
+    def setUp(self):
+        super().setUp()
+        self.scenario_model = ScenarioModel.objects.create(scenario=Scenario.objects.create(user=self.user, design={}))
+
+    def test_save_writes_one_row_and_npy_artifacts(self):
+        X = pd.DataFrame({"a": [1.0, 2.0, np.nan, 4.0], "b": ["5", "x", "7", "8"]})
+        metric = save_training_anomaly_metrics(self.scenario_model, "IsolationForest", X, [0, 1, 0, 1], 3)
+
+        self.assertEqual(AnomalyMetric.objects.filter(scenario_model=self.scenario_model).count(), 1)
+        self.assertEqual(metric.anomalies, {"rows": 4, "count": 2, "features": ["a", "b"]})
+        self.assertFalse(metric.production)
+        self.assertEqual((metric.model_name, metric.execution), ("IsolationForest", 3))
+        for member in ("predictions", "anomaly_indices", "c0", "c1"):
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, f"{metric.artifact}_{member}.npy")), member)
+
+        features, values, predictions = load_anomaly_results(metric)
+        self.assertEqual(features, ["a", "b"])
+        self.assertIsInstance(predictions, np.memmap)
+        np.testing.assert_array_equal(predictions, [0, 1, 0, 1])
+        np.testing.assert_array_equal(values["a"], [1.0, 2.0, np.nan, 4.0])
+        np.testing.assert_array_equal(values["b"], [5.0, np.nan, 7.0, 8.0])
+        np.testing.assert_array_equal(np.load(os.path.join(self.media_root, f"{metric.artifact}_anomaly_indices.npy")), [1, 3])
+
+    def test_legacy_npz_artifact_is_loaded(self):
+        os.makedirs(os.path.join(self.media_root, "anomaly_results"))
+        np.savez_compressed(os.path.join(self.media_root, "anomaly_results", "legacy.npz"),
+                            c0=np.array([1.0, 2.0]), c1=np.array([3.0, 4.0]), predictions=np.array([1, 0], dtype=np.int8),
+                            anomaly_indices=np.array([0]))
+        metric = AnomalyMetric.objects.create(
+            scenario_model=self.scenario_model, execution=1, model_name="LOF", feature_name="",
+            anomalies={"rows": 2, "count": 1, "features": ["x", "y"]}, artifact="anomaly_results/legacy.npz",
+        )
+
+        features, values, predictions = load_anomaly_results(metric)
+        self.assertEqual(features, ["x", "y"])
+        np.testing.assert_array_equal(values["x"], [1.0, 2.0])
+        np.testing.assert_array_equal(values["y"], [3.0, 4.0])
+        np.testing.assert_array_equal(predictions, [1, 0])
+
+
+class DownsampleAnomalySeriesTests(SimpleTestCase):
+    """Chart downsampling keeps bucket extremes and every anomaly."""
+
+    def test_short_series_is_kept(self):
+        values = np.arange(10.0)
+        np.testing.assert_array_equal(downsample_anomaly_series(values, values > 5, max_points=10), np.arange(10))
+
+    def test_buckets_keep_extremes_and_anomalies(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=10_000)
+        values[1234], values[8765] = 50.0, -50.0
+        values[rng.random(values.size) < 0.01] = np.nan
+        mask = np.zeros(values.size, dtype=bool)
+        mask[[5, 999, 5000, 9999]] = True
+
+        picked = downsample_anomaly_series(values, mask, max_points=200)
+
+        self.assertLessEqual(len(picked), 200)
+        self.assertTrue(np.all(np.diff(picked) > 0))
+        self.assertTrue(set(np.flatnonzero(mask)) <= set(picked.tolist()))
+        self.assertIn(1234, picked)
+        self.assertIn(8765, picked)
+
+        # Every bucket contributes its minimum and maximum
+        buckets = (200 - mask.sum()) // 2
+        edges = np.linspace(0, values.size, buckets + 1).astype(np.int64)
+        filled = np.nan_to_num(values)
+        for lo, hi in zip(edges[:-1], edges[1:]):
+            self.assertIn(lo + int(np.argmax(filled[lo:hi])), picked)
+            self.assertIn(lo + int(np.argmin(filled[lo:hi])), picked)
+
+    def test_too_many_anomalies_are_subsampled(self):
+        values = np.arange(1000.0)
+        mask = values % 2 == 0
+
+        picked = downsample_anomaly_series(values, mask, max_points=100)
+
+        self.assertEqual(len(picked), 100)
+        self.assertTrue(mask[picked].all())
+        self.assertEqual((picked[0], picked[-1]), (0, 998))
+
+
+def network_description(src, dst_port, protocol="TCP"):
+    """Returns a description in the format of `build_anomaly_description` for network records."""
+
+    return f"src: {src}, dst: 10.0.0.254, ports: 40000->{dst_port}, protocol: {protocol}"
+
+
+class AnomalyRollupTests(MediaRootMixin, TestCase):
+    """Rollup buckets follow the production anomalies as they are stored, pruned and backfilled."""
+
+    def setUp(self):
+        super().setUp()
+        self.scenario_model = ScenarioModel.objects.create(scenario=Scenario.objects.create(user=self.user, design={}))
+        self.now = timezone.now().replace(minute=30, second=10, microsecond=0)
+
+    def rollup(self, granularity, model_name="IsolationForest", date=None):
+        date = date or self.now
+        bucket = date.replace(second=0) if granularity == "minute" else date.replace(minute=0, second=0)
+        return AnomalyRollup.objects.get(scenario_model=self.scenario_model, model_name=model_name,
+                                         granularity=granularity, bucket=bucket)
+
+    def production_anomaly(self, description, date, model_name="IsolationForest"):
+        metric = AnomalyMetric.objects.create(
+            scenario_model=self.scenario_model, execution=1, model_name=model_name, feature_name="",
+            anomalies={"values": "", "anomaly_indices": description}, production=True,
+        )
+        # `date` is auto_now_add, so it is set afterwards
+        AnomalyMetric.objects.filter(id=metric.id).update(date=date)
+        return metric
+
+    def test_update_counts_keys_and_removes_them(self):
+        update_anomaly_rollups(self.scenario_model, "IsolationForest", network_description("10.0.0.1", 80), date=self.now)
+        update_anomaly_rollups(self.scenario_model, "IsolationForest", network_description("10.0.0.1", 443), date=self.now)
+        update_anomaly_rollups(self.scenario_model, "IsolationForest", "window: 1->2, read: 5",
+                               date=self.now + timedelta(minutes=5))
+
+        minute = self.rollup("minute")
+        self.assertEqual(minute.count, 2)
+        self.assertEqual(minute.sources, {"10.0.0.1": 2})
+        self.assertEqual(minute.ports, {"80": 1, "443": 1})
+        self.assertEqual(minute.protocols, {"TCP": 2})
+
+        # Syscall anomalies only count towards the totals
+        self.assertEqual(self.rollup("minute", date=self.now + timedelta(minutes=5)).count, 1)
+        self.assertEqual(self.rollup("hour").count, 3)
+
+        update_anomaly_rollups(self.scenario_model, "IsolationForest", network_description("10.0.0.1", 80),
+                               date=self.now, delta=-1)
+        minute = self.rollup("minute")
+        self.assertEqual(minute.count, 1)
+        self.assertEqual(minute.ports, {"443": 1})
+        self.assertEqual(self.rollup("hour").count, 2)
+
+    def test_update_keeps_the_most_frequent_keys(self):
+        update_anomaly_rollups(self.scenario_model, "IsolationForest", network_description("10.0.0.1", 80), date=self.now)
+        for i in range(ROLLUP_MAX_KEYS + 5):
+            update_anomaly_rollups(self.scenario_model, "IsolationForest",
+                                   network_description("10.0.0.1", 1000 + i), date=self.now)
+
+        ports = self.rollup("minute").ports
+        self.assertEqual(len(ports), ROLLUP_MAX_KEYS)
+        self.assertEqual(self.rollup("minute").sources, {"10.0.0.1": ROLLUP_MAX_KEYS + 6})
+
+    @override_settings(ANOMALY_ROLLUP_RETENTION_DAYS=60)
+    def test_prune_archives_old_anomalies_and_rollups(self):
+        old = self.production_anomaly(network_description("10.0.0.1", 80), self.now - timedelta(days=40))
+        recent = self.production_anomaly(network_description("10.0.0.2", 80), self.now - timedelta(days=1))
+        training = AnomalyMetric.objects.create(scenario_model=self.scenario_model, execution=1, feature_name="",
+                                                anomalies={}, production=False)
+        AnomalyMetric.objects.filter(id=training.id).update(date=self.now - timedelta(days=400))
+        for days in (40, 1, 90):
+            update_anomaly_rollups(self.scenario_model, "IsolationForest", network_description("10.0.0.1", 80),
+                                   date=self.now - timedelta(days=days))
+
+        result = prune_production_anomalies(retention_days=30, archive=True, batch_size=1)
+
+        self.assertEqual(result["anomalies"], 1)
+        self.assertEqual(set(AnomalyMetric.objects.values_list("id", flat=True)), {recent.id, training.id})
+        with gzip.open(result["archive"], "rt", encoding="utf-8") as fh:
+            archived = [json.loads(line) for line in fh]
+        self.assertEqual([(row["id"], row["scenario"]) for row in archived],
+                         [(old.id, str(self.scenario_model.scenario.uuid))])
+
+        # Minute buckets follow the raw retention (30 days), hour buckets their own (60 days)
+        minutes = AnomalyRollup.objects.filter(granularity="minute")
+        hours = AnomalyRollup.objects.filter(granularity="hour")
+        self.assertEqual([r.bucket.date() for r in minutes], [(self.now - timedelta(days=1)).date()])
+        self.assertEqual(sorted(r.bucket.date() for r in hours),
+                         sorted((self.now - timedelta(days=d)).date() for d in (40, 1)))
+        self.assertEqual(result["rollups"], 3)
+
+    def test_backfill_creates_missing_buckets_only(self):
+        self.production_anomaly(network_description("10.0.0.1", 80), self.now)
+        self.production_anomaly(network_description("10.0.0.2", 80), self.now)
+        self.production_anomaly(network_description("10.0.0.1", 22), self.now + timedelta(minutes=2))
+        self.production_anomaly(network_description("10.0.0.1", 22), self.now, model_name="LOF")
+        AnomalyRollup.objects.create(scenario_model=self.scenario_model, model_name="LOF", granularity="hour",
+                                     bucket=self.now.replace(minute=0, second=0), count=99)
+
+        # 2 minute buckets + 1 hour bucket for IsolationForest, 1 minute bucket for LOF
+        self.assertEqual(backfill_anomaly_rollups(batch_size=2), 4)
+
+        minute = self.rollup("minute")
+        self.assertEqual(minute.count, 2)
+        self.assertEqual(minute.sources, {"10.0.0.1": 1, "10.0.0.2": 1})
+        self.assertEqual(self.rollup("hour").count, 3)
+        self.assertEqual(self.rollup("hour").ports, {"80": 2, "22": 1})
+        self.assertEqual(self.rollup("hour", model_name="LOF").count, 99)
+
+        self.assertEqual(backfill_anomaly_rollups(), 0)
@@ -7,6 +7,8 @@ urlpatterns = [
     path('scenarios/', views.get_scenarios_by_user, name='get_scenarios_by_user'), 
     path('scenarios/<uuid:uuid>/', views.get_scenario_by_uuid, name='get_scenario_by_uuid'), 
     path('scenarios/run/<uuid:uuid>/', views.run_scenario_by_uuid, name='run_scenario_by_uuid'),
+    path('scenarios/<uuid:uuid>/run-status/', views.get_scenario_run_status_by_uuid, name='get_scenario_run_status_by_uuid'),
+    path('scenarios/<uuid:uuid>/run-profile/', views.get_scenario_run_profile_by_uuid, name='get_scenario_run_profile_by_uuid'),
     path('scenarios/delete/<uuid:uuid>/', views.delete_scenario_by_uuid, name='delete_scenario_by_uuid'),
     path('scenarios/put/<uuid:uuid>/', views.put_scenario_by_uuid, name='put_scenario_by_uuid'),
     path('scenarios/<uuid:uuid>/classification-metrics/', views.get_scenario_classification_metrics_by_uuid, name='get_scenario_classification_metrics_by_uuid'),
@@ -14,6 +16,12 @@ urlpatterns = [
     path('scenarios/<uuid:uuid>/stop-production/', views.stop_scenario_production_by_uuid, name='stop_scenario_production_by_uuid'),
     path('scenarios/<uuid:uuid>/regression-metrics/', views.get_scenario_regression_metrics_by_uuid, name='get_scenario_regression_metrics_by_uuid'),
     path('scenarios/<uuid:uuid>/anomaly-metrics/', views.get_scenario_anomaly_metrics_by_uuid, name='get_scenario_anomaly_metrics_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomaly-results/', views.get_scenario_anomaly_results_by_uuid, name='get_scenario_anomaly_results_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomaly-rollups/', views.get_scenario_anomaly_rollups_by_uuid, name='get_scenario_anomaly_rollups_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomaly-stats/timeline/', views.get_scenario_anomaly_timeline_by_uuid, name='get_scenario_anomaly_timeline_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomaly-stats/top/', views.get_scenario_anomaly_top_by_uuid, name='get_scenario_anomaly_top_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomaly-stats/models/', views.get_scenario_anomaly_model_counts_by_uuid, name='get_scenario_anomaly_model_counts_by_uuid'),
+    path('scenarios/<uuid:uuid>/anomalies/export/', views.export_scenario_anomalies_by_uuid, name='export_scenario_anomalies_by_uuid'),
     path('scenarios/<uuid:uuid>/anomaly-production-metrics/', views.get_scenario_production_anomaly_metrics_by_uuid, name='get_scenario_production_anomaly_metrics_by_uuid'),
     path('scenarios/<uuid:uuid>/delete-anomaly/<int:anomaly_id>/', views.delete_anomaly, name='delete_anomaly'),
 
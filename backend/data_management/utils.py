@@ -5,11 +5,16 @@ import numpy as np
 from typing import List
 import io
 import time
-from collections import defaultdict
+import uuid
+import threading
+import resource
+import sys
+from collections import OrderedDict
 import logging
 from .models import *
 from netanoms_runtime.policy_storage import load_alert_policies, delete_alert_policy
 
+from sklearn.cluster import KMeans
 from sklearn.metrics import f1_score, precision_score, recall_score, accuracy_score, confusion_matrix, mean_squared_error, mean_absolute_error, r2_score
 
 from django.core.mail import send_mail
@@ -18,19 +23,31 @@ import os
 import socket
 import struct
 import importlib
+import importlib.util
+import csv
 import ipaddress
 import shap
 import matplotlib.pyplot as plt
 import tempfile
-import pyshark
 
 from collections import defaultdict
 import joblib
 
 import shutil
+import hashlib
+import gzip
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.core.files.storage import default_storage
 import subprocess
 
 from netanoms_runtime.pipeline_def import PipelineDef
+from netanoms_runtime.categorical_encoding import encode_categorical
+from netanoms_runtime.pcap_stream import extract_packet_features
 
 logger = logging.getLogger('backend')
 
@@ -475,151 +492,1262 @@ def extract_features_by_flow_from_pcap(file_obj):
 
         df_raw = df_raw[mask].copy()
 
-        # Convert numerics
-        for c in ["sport","dport","pkts","bytes","dur","sttl","dttl"]:
-            df_raw[c] = pd.to_numeric(df_raw[c], errors="coerce")
+        # Convert numerics
+        for c in ["sport","dport","pkts","bytes","dur","sttl","dttl"]:
+            df_raw[c] = pd.to_numeric(df_raw[c], errors="coerce")
+
+        out_df = pd.DataFrame({
+            "src": df_raw["saddr"].astype("string"),
+            "src_port": df_raw["sport"].fillna(-1).astype("int64", errors="ignore"),
+            "dst": df_raw["daddr"].astype("string"),
+            "dst_port": df_raw["dport"].fillna(-1).astype("int64", errors="ignore"),
+            "protocol": df_raw["proto"].astype("string").fillna("UNKNOWN").replace("", "UNKNOWN"),
+            "packet_count": df_raw["pkts"].fillna(0).astype("int64", errors="ignore"),
+            "total_bytes": df_raw["bytes"].fillna(0).astype("int64", errors="ignore"),
+            "flow_duration": df_raw["dur"].fillna(0).astype(float),
+        })
+
+        pkts = pd.to_numeric(out_df["packet_count"], errors="coerce").fillna(0)
+        bytes_ = pd.to_numeric(out_df["total_bytes"], errors="coerce").fillna(0)
+        out_df["avg_packet_size"] = (bytes_ / pkts.replace(0, pd.NA)).fillna(0).astype(float)
+
+        out_df["avg_ttl"] = pd.concat([df_raw["sttl"], df_raw["dttl"]], axis=1).mean(axis=1, skipna=True)
+
+        # Drop rows that are completely empty (in case ra printed weird stuff)
+        out_df = out_df.dropna(subset=["src","dst","protocol"], how="all")
+
+        logger.info("[EXTRACT FLOW][ARGUS] DataFrame aggregated head:\n%s", out_df.head(5))
+        return out_df
+
+    finally:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+
+def extract_features_by_packet_from_pcap(file_obj):
+    """
+    Extracts packet-level features from a PCAP file with the native header decoder.
+
+    Packets are decoded like `pcap_stream.decode_headers`, the decoder used by the live
+    `dumpcap` packet source, so training and production rows share the same semantics
+    (time, length, IPs, ports, protocol name, TTL). The headers are decoded in chunks
+    of packets with NumPy, in the calling process.
+
+    Args:
+        file_obj (file-like object): The uploaded PCAP/PCAPNG file, opened in binary mode.
+
+    Returns:
+        pandas.DataFrame: A DataFrame containing one row per packet with basic features.
+    """
+
+    logger.info("[EXTRACT PACKET] Extracting packet-level features...")
+
+    df = extract_packet_features(file_obj)
+
+    logger.info("[EXTRACT PACKET] Extracted %d packets", len(df))
+    logger.debug("[EXTRACT PACKET] DataFrame aggregated: %s", df)
+
+    return df
+
+def ip_to_int(ip_str):
+    """
+    Converts an IPv4 address string to its 32-bit integer representation.
+
+    Args:
+        ip_str (str): The IP address in dotted-decimal notation (e.g., '192.168.1.1').
+
+    Returns:
+        int: The integer representation of the IP address (e.g. 3232235777).
+             Returns 0 if the input is invalid or conversion fails.
+    """
+    try:
+        return int(ipaddress.IPv4Address(ip_str))
+    except Exception:
+        return 0
+
+def int_to_ip(ip_int):
+    """
+    Converts a 32-bit integer to its IPv4 dotted-decimal string representation.
+
+    Args:
+        ip_int (int): The integer value of the IP address (e.g., 3232235777).
+
+    Returns:
+        str: The IP address in dotted-decimal notation (e.g., '192.168.1.1').
+    """
+    return socket.inet_ntoa(struct.pack("!I", int(ip_int)))
+
+def _is_ip(x) -> bool:
+    try:
+        if pd.isna(x):
+            return False
+        ipaddress.ip_address(str(x).strip())
+        return True
+    except Exception:
+        return False
+    
+# Version of each feature extractor. Bump it when the extracted columns or their
+# semantics change, so that cached features of older versions are not reused.
+FEATURE_EXTRACTOR_VERSIONS = {"packet": 1, "flow": 1, "jsonl": 2, "csv": 1}
+
+# Version of the cache layout itself (2: categories keep their type in the manifest)
+FEATURE_CACHE_FORMAT = 2
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 of a file, reading it in chunks.
+
+    Args:
+        path (str): Path of the file.
+        chunk_size (int, optional): Bytes read per chunk. Defaults to 1 MiB.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _feature_cache_dir(path):
+    return f"{path}.features"
+
+def _cached_content_hash(path):
+    # The hash is kept next to the cache and only recomputed when size or mtime change
+    stat = os.stat(path)
+    sidecar = os.path.join(_feature_cache_dir(path), "content.json")
+    try:
+        with open(sidecar) as fh:
+            meta = json.load(fh)
+        if meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+            return meta["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sha256 = file_sha256(path)
+    os.makedirs(_feature_cache_dir(path), exist_ok=True)
+    with open(sidecar, "w") as fh:
+        json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}, fh)
+    return sha256
+
+def _feature_cache_key(path, kind):
+    version = FEATURE_EXTRACTOR_VERSIONS[kind]
+    return os.path.join(_feature_cache_dir(path), f"{_cached_content_hash(path)}-{kind}-v{version}-f{FEATURE_CACHE_FORMAT}")
+
+def load_cached_features(path, kind, columns=None):
+    """
+    Loads the features previously extracted from a file, if they are cached.
+
+    Numeric columns are memory-mapped (copy-on-write) from their `.npy` files and
+    the frame is built with `copy=False`, so they are not consolidated into a copy;
+    text columns are rebuilt from their dictionary codes. When `columns` is given,
+    only those columns are read (projection pushdown).
+
+    Args:
+        path (str): Path of the source file (PCAP, JSONL or CSV).
+        kind (str): Extraction kind ("packet", "flow", "jsonl" or "csv").
+        columns (list, optional): Columns to load, in order. Defaults to None (all).
+
+    Returns:
+        pandas.DataFrame or None: The cached DataFrame, or None on a cache miss.
+
+    Raises:
+        KeyError: If a requested column is not in the cached features.
+    """
+
+    cache_dir = _feature_cache_key(path, kind)
+    try:
+        with open(os.path.join(cache_dir, "manifest.json")) as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+    entries = {col["name"]: col for col in manifest["columns"]}
+    names = list(entries) if columns is None else list(columns)
+    missing = [name for name in names if name not in entries]
+    if missing:
+        raise KeyError(f"{missing} not in cached columns")
+
+    data = {}
+    for name in names:
+        col = entries[name]
+        values = np.load(os.path.join(cache_dir, col["file"]), mmap_mode="c")
+        if "categories" in col:
+            categories = np.array(col["categories"] + [None], dtype=object)
+            values = categories[values]
+        data[name] = values
+
+    return pd.DataFrame(data, columns=names, index=pd.RangeIndex(manifest["rows"]), copy=False)
+
+def _manifest_category(value):
+    # Categories keep their JSON type, so mixed object columns (e.g. 1 and "1") round-trip
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    raise TypeError(f"Category of type {type(value).__name__} cannot be cached")
+
+def save_cached_features(path, kind, df):
+    """
+    Stores extracted features next to their source file, one `.npy` file per column.
+
+    Numeric and boolean columns are saved as is. Other columns are dictionary-encoded
+    (int32 codes plus categories in the manifest, -1 for missing values); categories
+    keep their type, and columns holding values other than text, numbers or booleans
+    are not cached. The cache is written to a temporary directory and renamed, so
+    readers never see partial files.
+
+    Args:
+        path (str): Path of the source file (PCAP, JSONL or CSV).
+        kind (str): Extraction kind ("packet", "flow", "jsonl" or "csv").
+        df (pandas.DataFrame): Extracted features.
+
+    Returns:
+        None
+
+    Raises:
+        TypeError: If a column holds values that cannot be stored in the manifest.
+    """
+
+    cache_dir = _feature_cache_key(path, kind)
+    tmp_dir = f"{cache_dir}.tmp{os.getpid()}"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    try:
+        manifest = {"rows": len(df), "columns": []}
+        for i, name in enumerate(df.columns):
+            series = df[name]
+            entry = {"name": str(name), "file": f"c{i}.npy"}
+            values = series.to_numpy()
+            if values.dtype != object and (pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+                np.save(os.path.join(tmp_dir, entry["file"]), values)
+            else:
+                codes, categories = pd.factorize(series.astype(object))
+                entry["categories"] = [_manifest_category(c) for c in categories]
+                np.save(os.path.join(tmp_dir, entry["file"]), codes.astype(np.int32))
+            manifest["columns"].append(entry)
+
+        with open(os.path.join(tmp_dir, "manifest.json"), "w") as fh:
+            json.dump(manifest, fh)
+
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+def extract_features_cached(path, kind, extract, columns=None):
+    """
+    Returns the features of a file from the cache, extracting and caching them on a miss.
+
+    The cache key combines the SHA-256 of the file content, the extraction kind and
+    its version in `FEATURE_EXTRACTOR_VERSIONS`.
+
+    Args:
+        path (str): Path of the source file (PCAP, JSONL or CSV).
+        kind (str): Extraction kind ("packet", "flow", "jsonl" or "csv").
+        extract (callable): Function that extracts the DataFrame from `path`.
+        columns (list, optional): Columns to return. Defaults to None (all).
+
+    Returns:
+        pandas.DataFrame: The extracted features.
+
+    Raises:
+        KeyError: If a requested column does not exist in the extracted features.
+    """
+
+    try:
+        df = load_cached_features(path, kind, columns)
+    except KeyError:
+        raise
+    except Exception as e:
+        logger.warning("[FEATURE CACHE] Ignoring unreadable cache for %s: %s", path, str(e))
+        df = None
+
+    if df is not None:
+        logger.info("[FEATURE CACHE] Hit for %s (%s): %d rows", path, kind, len(df))
+        return df
+
+    logger.info("[FEATURE CACHE] Miss for %s (%s), extracting features", path, kind)
+    df = extract(path)
+
+    try:
+        save_cached_features(path, kind, df)
+    except Exception as e:
+        logger.warning("[FEATURE CACHE] Could not cache features for %s: %s", path, str(e))
+
+    return df if columns is None else df[list(columns)]
+
+def downcast_dtypes(df, exclude=()):
+    """
+    Converts the columns of a DataFrame to the smallest dtypes that keep their values.
+
+    Integer columns are downcast to the smallest integer type. Float columns are
+    stored as float32 only when that conversion is lossless.
+
+    Args:
+        df (pandas.DataFrame): DataFrame to convert (modified in place).
+        exclude (tuple, optional): Columns left untouched. Defaults to ().
+
+    Returns:
+        pandas.DataFrame: The converted DataFrame.
+    """
+
+    for name in df.columns:
+        if name in exclude:
+            continue
+        series = df[name]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[name] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+            as32 = series.astype(np.float32)
+            if ((as32.astype(np.float64) == series) | series.isna()).all():
+                df[name] = as32
+    return df
+
+# Rows parsed at a time by read_csv_columnar
+CSV_CHUNK_ROWS = 100_000
+
+def read_csv_columnar(path, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Reads a CSV file with inferred and downcast dtypes, ready to be cached by column.
+
+    The file is parsed `chunk_rows` rows at a time and every chunk is downcast before
+    the next one is read, so only one chunk is ever held at full width. Chunks whose
+    columns were downcast to different types are upcast to the common type when
+    they are concatenated.
+
+    Args:
+        path (str): Path of the CSV file.
+        chunk_rows (int, optional): Rows parsed at a time. Defaults to CSV_CHUNK_ROWS.
+
+    Returns:
+        pandas.DataFrame: The CSV content.
+    """
+
+    chunks = [downcast_dtypes(chunk) for chunk in pd.read_csv(path, chunksize=chunk_rows)]
+    if not chunks:
+        return pd.read_csv(path)
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True, copy=False)
+
+def compact_dataframe(df, category_ratio=0.5, exclude=("target", "label")):
+    """
+    Reduces the memory used by a DataFrame produced during a scenario execution.
+
+    Numeric columns are downcast with `downcast_dtypes`, and text columns with few
+    distinct values (at most `category_ratio` of the rows) become categoricals.
+    Target columns listed in `exclude` keep their original dtype.
+
+    Args:
+        df (pandas.DataFrame): DataFrame to compact.
+        category_ratio (float, optional): Maximum share of distinct values for a text
+            column to become categorical. Defaults to 0.5.
+        exclude (tuple, optional): Columns left untouched. Defaults to ("target", "label").
+
+    Returns:
+        pandas.DataFrame: The compacted DataFrame.
+    """
+
+    df = downcast_dtypes(df.copy(deep=False), exclude=exclude)
+
+    for name in df.columns:
+        if name in exclude:
+            continue
+        series = df[name]
+        if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if len(series) and series.nunique(dropna=True) <= category_ratio * len(series):
+                df[name] = series.astype("category")
+    return df
+
+def count_node_consumers(connections):
+    """
+    Counts the distinct downstream nodes that read the output of every node of a design.
+
+    Args:
+        connections (list): Connections of the design (dicts with `startId` and `endId`).
+
+    Returns:
+        dict: Number of consumers keyed by node id (nodes without consumers are omitted).
+    """
+
+    consumers = defaultdict(set)
+    for conn in connections:
+        consumers[conn["startId"]].add(conn["endId"])
+    return {node: len(ends) for node, ends in consumers.items()}
+
+# Folder (under MEDIA_ROOT) of the training anomaly results of every execution
+ANOMALY_RESULTS_DIR = "anomaly_results"
+
+# Version of the node output cache. Bump it when execute_scenario changes how a
+# node computes its output, so that outputs of older versions are not reused.
+NODE_CACHE_VERSION = 1
+
+# Node types cached besides preprocessing and model nodes (data nodes use the feature cache)
+CACHED_NODE_TYPES = ("DataSplitter",)
+
+# Node types whose output changes between runs even with the same inputs (never cached,
+# and neither are the nodes that depend on them)
+NONDETERMINISTIC_NODE_TYPES = ("CodeProcessing", "CodeSplitter", "CNNClassifier", "RNNClassifier", "MLPClassifier")
+
+# Parameter holding the input file name of every data node
+DATA_NODE_FILE_PARAMS = {"CSV": "csvFileName", "Network": "networkFileName", "JSONL": "jsonlFileName"}
+
+# Serializes the size accounting and eviction of the node cache
+_node_cache_lock = threading.Lock()
+
+def _node_cache_root():
+    return os.path.join(settings.MEDIA_ROOT, "node_cache")
+
+def node_is_deterministic(element, element_def):
+    """
+    Returns whether a design node gives the same output every time it runs on the same inputs.
+
+    Nodes with a `random_state` property are deterministic only when a seed is set,
+    TensorFlow models and custom code never are (their randomness can't be seeded from
+    the design), and the other nodes always are.
+
+    Args:
+        element (dict): Node of the design.
+        element_def (dict): Definition of the node type in config.json, if any.
+
+    Returns:
+        bool: Whether the output of the node can be cached.
+    """
+
+    if element["type"] in NONDETERMINISTIC_NODE_TYPES:
+        return False
+
+    properties = {prop.get("name") for prop in (element_def or {}).get("properties", [])}
+    if "random_state" in properties:
+        seed = str(element.get("parameters", {}).get("random_state", "None")).strip().lower()
+        return seed not in ("", "none")
+    return True
+
+def node_cache_key(element, element_def, upstream, file_hash=None, scenario_uuid=None):
+    """
+    Computes the content-addressed cache key of a design node.
+
+    Args:
+        element (dict): Node of the design (type and parameters are used).
+        element_def (dict): Definition of the node type in config.json, if any.
+        upstream (list): (output name, key) pairs of the incoming connections, in order.
+        file_hash (str, optional): SHA-256 of the input file of data nodes. Defaults to None.
+        scenario_uuid (str, optional): Scenario the node belongs to; outputs are never
+            shared between scenarios. Defaults to None.
+
+    Returns:
+        str: Hexadecimal SHA-256 key.
+    """
+
+    payload = {
+        "version": NODE_CACHE_VERSION,
+        "scenario": str(scenario_uuid) if scenario_uuid is not None else None,
+        "type": element["type"],
+        "parameters": element.get("parameters", {}),
+        "definition": element_def,
+        "upstream": upstream,
+        "file": file_hash,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def scenario_file_hash(scenario, name):
+    """
+    Returns the SHA-256 of a file referenced by a scenario design.
+
+    Args:
+        scenario (Scenario): Scenario whose design references the file.
+        name (str): File name used in the design.
+
+    Returns:
+        str: Hexadecimal SHA-256 of the file content.
+    """
+
+    file = get_scenario_file(scenario, name)
+    return file.sha256 or _cached_content_hash(file.content.path)
+
+def load_node_output(key, artifact_path=None):
+    """
+    Loads the cached output of a node and marks it as recently used.
+
+    Args:
+        key (str): Cache key from `node_cache_key`.
+        artifact_path (str, optional): Where to restore the artifact the node writes
+            to `models_storage`, if one was cached. Defaults to None.
+
+    Returns:
+        dict or None: The cached output (`data` and `model` entries), or None on a miss.
+    """
+
+    entry = os.path.join(_node_cache_root(), key)
+    try:
+        output = joblib.load(os.path.join(entry, "output.joblib"))
+    except Exception:
+        return None
+
+    cached_artifact = os.path.join(entry, "artifact.pkl")
+    if artifact_path and os.path.exists(cached_artifact):
+        # Copy then rename, so sessions that memory-map the current artifact keep a valid file
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+        for source, target in ((cached_artifact, artifact_path),
+                               (training_data_path(cached_artifact), training_data_path(artifact_path))):
+            if os.path.exists(source):
+                tmp_path = f"{target}.tmp{os.getpid()}-{threading.get_ident()}"
+                shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, target)
+
+    # The modification time of the entry is its last use, for LRU eviction
+    os.utime(entry)
+    return output
+
+def save_node_output(key, output, artifact_path=None, max_bytes=None):
+    """
+    Stores the output of a node in the cache and evicts the least recently used entries.
+
+    Args:
+        key (str): Cache key from `node_cache_key`.
+        output (dict): Output to cache (`data` and `model` entries).
+        artifact_path (str, optional): Artifact written by the node to `models_storage`. Defaults to None.
+        max_bytes (int, optional): Maximum size of the cache. Defaults to `settings.NODE_CACHE_MAX_BYTES`.
+
+    Returns:
+        None
+    """
+
+    entry = os.path.join(_node_cache_root(), key)
+    tmp_entry = f"{entry}.tmp{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp_entry, exist_ok=True)
+
+    try:
+        joblib.dump(output, os.path.join(tmp_entry, "output.joblib"))
+        if artifact_path and os.path.exists(artifact_path):
+            shutil.copyfile(artifact_path, os.path.join(tmp_entry, "artifact.pkl"))
+            if os.path.exists(training_data_path(artifact_path)):
+                shutil.copyfile(training_data_path(artifact_path), training_data_path(os.path.join(tmp_entry, "artifact.pkl")))
+
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+    except Exception:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        raise
+
+    evict_node_cache(settings.NODE_CACHE_MAX_BYTES if max_bytes is None else max_bytes)
+
+def evict_node_cache(max_bytes):
+    """
+    Deletes the least recently used node cache entries until the cache fits in `max_bytes`.
+
+    Args:
+        max_bytes (int): Maximum size of the cache in bytes.
+
+    Returns:
+        int: Number of evicted entries.
+    """
+
+    root = _node_cache_root()
+    with _node_cache_lock:
+        entries = []
+        for name in os.listdir(root) if os.path.isdir(root) else []:
+            path = os.path.join(root, name)
+            if ".tmp" in name or not os.path.isdir(path):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+            entries.append((os.stat(path).st_mtime, size, path))
+
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+    if evicted:
+        logger.info("[NODE CACHE] Evicted %d entries", evicted)
+    return evicted
+
+def dump_artifact(obj, path):
+    """
+    Writes a `models_storage` artifact atomically.
+
+    The object is dumped to a temporary file that then replaces `path`. Production
+    sessions may hold the previous file memory-mapped (see `ModelArtifactRegistry`),
+    and truncating it in place would break their mappings.
+
+    Args:
+        obj (Any): Object to serialize with joblib (uncompressed, so it can be memory-mapped).
+        path (str): Destination path.
+
+    Returns:
+        None
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+    try:
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def training_data_path(artifact_path):
+    """
+    Returns where the training data of a model artifact is stored.
+
+    Args:
+        artifact_path (str): Path of the `.pkl` model bundle.
+
+    Returns:
+        str: Path of the `.npy` file next to it.
+    """
+
+    return f"{os.path.splitext(artifact_path)[0]}_X_train.npy"
+
+def save_training_data(X, artifact_path):
+    """
+    Stores the training data of a model next to its bundle as a column-major float64 `.npy`.
+
+    Every column is contiguous in the file, so it can be read memory-mapped without
+    loading the rest. The file is written atomically (see `dump_artifact`).
+
+    Args:
+        X (pandas.DataFrame): Numeric training data.
+        artifact_path (str): Path of the `.pkl` model bundle.
+
+    Returns:
+        str: Path of the written file.
+    """
+
+    path = training_data_path(artifact_path)
+    tmp_path = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asfortranarray(X.to_numpy(dtype=np.float64)))
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+def load_training_data(artifact_path, columns):
+    """
+    Loads the training data stored by `save_training_data` memory-mapped (read-only).
+
+    Args:
+        artifact_path (str): Path of the `.pkl` model bundle.
+        columns (list): Feature names of the columns.
+
+    Returns:
+        pandas.DataFrame: Training data backed by the file.
+    """
+
+    values = np.load(training_data_path(artifact_path), mmap_mode="r")
+    return pd.DataFrame(values, columns=columns, copy=False)
+
+def summarize_background(X, size=None, method=None, labels=None):
+    """
+    Builds the small background set given to SHAP and LIME explainers in production.
+
+    Args:
+        X (pandas.DataFrame): Training data.
+        size (int, optional): Number of rows. Defaults to EXPLAINER_BACKGROUND_SIZE.
+            With 0 no background is built.
+        method (str, optional): 'kmeans' for k-means centroids or 'sample' for a sample
+            stratified by `labels`. Defaults to EXPLAINER_BACKGROUND_METHOD. K-means falls
+            back to sampling when the data has missing values.
+        labels (list, optional): Class of every row (e.g. the anomaly predictions) used to
+            stratify the sample. Defaults to None.
+
+    Returns:
+        pandas.DataFrame or None: Background rows with the columns of `X`.
+    """
+
+    size = settings.EXPLAINER_BACKGROUND_SIZE if size is None else size
+    method = settings.EXPLAINER_BACKGROUND_METHOD if method is None else method
+
+    if not size:
+        return None
+    if len(X) <= size:
+        return X.copy()
+
+    if method == "kmeans" and not X.isna().to_numpy().any():
+        kmeans = KMeans(n_clusters=size, n_init=1, random_state=42).fit(X.to_numpy(dtype=np.float64))
+        return pd.DataFrame(kmeans.cluster_centers_, columns=X.columns)
+
+    if labels is None:
+        return X.sample(n=size, random_state=42)
+
+    # Keep the proportion of every class, with at least one row of each
+    groups = dict(list(pd.Series(np.asarray(labels), index=X.index).groupby(np.asarray(labels))))
+    counts = {label: min(len(group), max(1, round(size * len(group) / len(X)))) for label, group in groups.items()}
+    while sum(counts.values()) > size:
+        counts[max(counts, key=counts.get)] -= 1
+
+    picked = [groups[label].sample(n=n, random_state=42).index for label, n in counts.items() if n > 0]
+    return X.loc[np.concatenate(picked)]
+
+class ModelArtifactRegistry:
+    """
+    In-memory LRU cache of the artifacts loaded by production pipelines.
+
+    Entries are keyed by (scenario uuid, element id, file mtime), so an artifact
+    rewritten by a new training is loaded again while unchanged ones are reused
+    when a session is restarted. Artifacts are loaded with `mmap_mode='r'`: their
+    NumPy arrays are read-only views of the file, shared through the page cache by
+    every session using the same model. The size of an entry is estimated with
+    the size of its file.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, path, scenario_uuid, element_id):
+        """
+        Returns the artifact stored at `path`, loading it only if it is not cached.
+
+        Args:
+            path (str): Path of the `.pkl` artifact.
+            scenario_uuid (str): UUID of the scenario.
+            element_id (str): Design element the artifact belongs to.
+
+        Returns:
+            Any: The loaded object. It is shared between sessions and must not be modified.
+        """
+
+        stat = os.stat(path)
+        key = (str(scenario_uuid), str(element_id), stat.st_mtime_ns)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        obj = joblib.load(path, mmap_mode="r")
+
+        with self._lock:
+            # Drop the versions of the artifact replaced by a new training
+            for stale in [k for k in self._entries if k[:2] == key[:2] and k != key]:
+                del self._entries[stale]
+
+            self._entries[key] = (obj, stat.st_size)
+            self._entries.move_to_end(key)
+
+            total = sum(size for _, size in self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, (_, size) = self._entries.popitem(last=False)
+                total -= size
+
+        return obj
+
+    def discard(self, scenario_uuid):
+        """
+        Removes every cached artifact of a scenario.
+
+        Args:
+            scenario_uuid (str): UUID of the scenario.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(scenario_uuid)]:
+                del self._entries[key]
+
+model_registry = ModelArtifactRegistry(settings.MODEL_REGISTRY_MAX_BYTES)
+
+def anomaly_results_path(artifact, member):
+    """
+    Returns the absolute path of one array of a training results artifact.
+
+    Every array (`c<i>` per feature, `predictions`, `anomaly_indices`) is stored as
+    its own uncompressed `<artifact>_<member>.npy` file, so it can be memory-mapped.
+
+    Args:
+        artifact (str): `AnomalyMetric.artifact` (path prefix relative to MEDIA_ROOT).
+        member (str): Name of the array.
+
+    Returns:
+        str: Absolute path of the `.npy` file.
+    """
+
+    return os.path.join(settings.MEDIA_ROOT, f"{artifact}_{member}.npy")
+
+def save_training_anomaly_metrics(scenario_model, model_name, X, y_pred, execution):
+    """
+    Saves the anomalies found while training an anomaly detection model.
+
+    One AnomalyMetric row is created per model and execution. The values of every
+    feature, the predictions and the anomaly indices are written as uncompressed
+    `.npy` files under MEDIA_ROOT/anomaly_results (see `anomaly_results_path`), and
+    the row only keeps a summary (rows, anomaly count and feature names) plus the
+    common path prefix of the files.
+
+    Args:
+        scenario_model (ScenarioModel): Scenario model the metrics belong to.
+        model_name (str): Type of the anomaly detection node.
+        X (pandas.DataFrame): Training data.
+        y_pred (list): Predictions (1 for anomaly, 0 for normal) aligned with `X`.
+        execution (int): Execution number.
+
+    Returns:
+        AnomalyMetric: The created record.
+    """
+
+    predictions = np.asarray(y_pred, dtype=np.int8)
+    anomaly_indices = np.flatnonzero(predictions).astype(np.int64)
+    features = [str(col) for col in X.columns]
+
+    folder = os.path.join(settings.MEDIA_ROOT, ANOMALY_RESULTS_DIR)
+    os.makedirs(folder, exist_ok=True)
+    artifact = os.path.join(ANOMALY_RESULTS_DIR, f"{scenario_model.scenario.uuid}_{execution}_{uuid.uuid4().hex}")
+
+    np.save(anomaly_results_path(artifact, "predictions"), predictions)
+    np.save(anomaly_results_path(artifact, "anomaly_indices"), anomaly_indices)
+    for i, col in enumerate(X.columns):
+        np.save(anomaly_results_path(artifact, f"c{i}"), pd.to_numeric(X[col], errors="coerce").to_numpy(dtype=np.float64))
+
+    return AnomalyMetric.objects.create(
+        scenario_model=scenario_model,
+        model_name=model_name,
+        feature_name="",
+        anomalies={"rows": int(len(predictions)), "count": int(len(anomaly_indices)), "features": features},
+        artifact=artifact,
+        execution=execution,
+        production=False,
+        global_shap_images=[],
+        local_shap_images=[],
+        global_lime_images=[],
+        local_lime_images=[],
+    )
+
+def load_anomaly_results(metric):
+    """
+    Loads the training results stored in the artifact of an AnomalyMetric.
+
+    The arrays are memory-mapped, so slicing a page only reads that page from disk.
+    Artifacts written as a single compressed `.npz` by older versions are loaded
+    in full.
+
+    Args:
+        metric (AnomalyMetric): Record created by `save_training_anomaly_metrics`.
+
+    Returns:
+        tuple: (features, values, predictions) where `values` maps every feature name
+        to its float64 array and `predictions` holds 1 for anomalies and 0 otherwise.
+    """
+
+    features = metric.anomalies.get("features", [])
+    if metric.artifact.endswith(".npz"):
+        with np.load(os.path.join(settings.MEDIA_ROOT, metric.artifact)) as data:
+            values = {name: data[f"c{i}"] for i, name in enumerate(features)}
+            predictions = data["predictions"]
+        return features, values, predictions
+
+    values = {
+        name: np.load(anomaly_results_path(metric.artifact, f"c{i}"), mmap_mode="r")
+        for i, name in enumerate(features)
+    }
+    predictions = np.load(anomaly_results_path(metric.artifact, "predictions"), mmap_mode="r")
+    return features, values, predictions
+
+def downsample_anomaly_series(values, anomaly_mask, max_points=1000):
+    """
+    Selects the points of a series to draw in a chart of at most `max_points` points.
+
+    The series is split into buckets and the minimum and maximum of each bucket are
+    kept, so peaks survive the reduction. Anomalous points are always kept, unless
+    they alone exceed `max_points`, in which case they are evenly subsampled.
+
+    Args:
+        values (numpy.ndarray): Values of the series.
+        anomaly_mask (numpy.ndarray): Boolean mask of the anomalous points.
+        max_points (int, optional): Maximum number of points. Defaults to 1000.
+
+    Returns:
+        numpy.ndarray: Sorted indices of the selected points.
+    """
+
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    anomalies = np.flatnonzero(anomaly_mask)
+    if len(anomalies) >= max_points:
+        return np.unique(anomalies[np.linspace(0, len(anomalies) - 1, max_points).astype(np.int64)])
+
+    buckets = max(1, (max_points - len(anomalies)) // 2)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    filled = np.where(np.isnan(values), 0.0, values)
+
+    picked = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            picked.append(lo + int(np.argmin(filled[lo:hi])))
+            picked.append(lo + int(np.argmax(filled[lo:hi])))
+
+    return np.union1d(np.asarray(picked, dtype=np.int64), anomalies)
+
+def anomaly_metric_series(metric, max_points=1000):
+    """
+    Builds the chart series of a training AnomalyMetric, downsampled to `max_points`.
+
+    Args:
+        metric (AnomalyMetric): Training record, either with an artifact (one row per
+            model) or legacy (one row per feature with the values inline).
+        max_points (int, optional): Maximum number of points per series. Defaults to 1000.
+
+    Returns:
+        list: One dict per feature with `feature_name` and `anomalies`, where `anomalies`
+        holds the selected `values`, the `anomaly_indices` (positions within `values`),
+        the original row `index` of every value and the `total` number of rows.
+    """
+
+    if metric.artifact:
+        features, values, predictions = load_anomaly_results(metric)
+        series = [(name, values[name], predictions.astype(bool)) for name in features]
+    else:
+        anomalies = metric.anomalies
+        if isinstance(anomalies, str):
+            anomalies = json.loads(anomalies)
+        if not isinstance(anomalies, dict) or "values" not in anomalies:
+            return [{"feature_name": metric.feature_name, "anomalies": anomalies}]
+        feature_values = np.asarray(anomalies.get("values", []), dtype=np.float64)
+        mask = np.zeros(len(feature_values), dtype=bool)
+        mask[np.asarray(anomalies.get("anomaly_indices", []), dtype=np.int64)] = True
+        series = [(metric.feature_name, feature_values, mask)]
+
+    result = []
+    for name, feature_values, mask in series:
+        index = downsample_anomaly_series(feature_values, mask, max_points)
+        selected = feature_values[index]
+        result.append({
+            "feature_name": name,
+            "anomalies": {
+                "values": [None if np.isnan(v) else float(v) for v in selected],
+                "anomaly_indices": np.flatnonzero(mask[index]).tolist(),
+                "index": index.tolist(),
+                "total": int(len(feature_values)),
+            },
+        })
+    return result
+
+
+def count_output_rows(value):
+    """
+    Returns the number of rows of a node output.
+
+    Args:
+        value: Output stored in `data_storage` (DataFrame, array or train/test split dict).
+
+    Returns:
+        int: Number of rows (train plus test rows for splits, 0 if unknown).
+    """
+
+    if value is None:
+        return 0
+    if isinstance(value, dict):
+        return sum(len(value[part][0]) for part in ("train", "test") if part in value)
+    try:
+        return len(value)
+    except TypeError:
+        return 0
+
+def _peak_rss_bytes():
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class NodeProfiler:
+    """
+    Measures the cost of executing one node of a scenario design.
+
+    CPU time is measured for the calling thread, so nodes running in parallel are
+    profiled independently. Memory is only reported as the process high-water mark
+    (peak RSS) once the node ends: it includes every other node and request served
+    by the process, so it is not the memory cost of the node.
+    """
 
-        out_df = pd.DataFrame({
-            "src": df_raw["saddr"].astype("string"),
-            "src_port": df_raw["sport"].fillna(-1).astype("int64", errors="ignore"),
-            "dst": df_raw["daddr"].astype("string"),
-            "dst_port": df_raw["dport"].fillna(-1).astype("int64", errors="ignore"),
-            "protocol": df_raw["proto"].astype("string").fillna("UNKNOWN").replace("", "UNKNOWN"),
-            "packet_count": df_raw["pkts"].fillna(0).astype("int64", errors="ignore"),
-            "total_bytes": df_raw["bytes"].fillna(0).astype("int64", errors="ignore"),
-            "flow_duration": df_raw["dur"].fillna(0).astype(float),
-        })
+    def __init__(self, rows_in=0):
+        """
+        Starts measuring a node.
+
+        Args:
+            rows_in (int, optional): Number of input rows of the node. Defaults to 0.
+        """
+
+        self.rows_in = rows_in
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def stop(self, rows_out=0, artifact_path=None, cached=False):
+        """
+        Stops measuring the node.
+
+        Args:
+            rows_out (int, optional): Number of output rows. Defaults to 0.
+            artifact_path (str, optional): Artifact written by the node. Defaults to None.
+            cached (bool, optional): Whether the output was reused from the node cache. Defaults to False.
+
+        Returns:
+            dict: Wall and CPU time (seconds), process peak RSS (bytes), rows in/out,
+            artifact size (bytes) and cache usage.
+        """
+
+        return {
+            "wall_time": round(time.perf_counter() - self._wall, 4),
+            "cpu_time": round(time.thread_time() - self._cpu, 4),
+            "process_peak_rss": _peak_rss_bytes(),
+            "rows_in": int(self.rows_in),
+            "rows_out": int(rows_out),
+            "artifact_size": os.path.getsize(artifact_path) if artifact_path and os.path.exists(artifact_path) else 0,
+            "cached": cached,
+        }
+
+class ScenarioRunProgress:
+    """
+    Records the progress of every node of a ScenarioRun in the database.
 
-        pkts = pd.to_numeric(out_df["packet_count"], errors="coerce").fillna(0)
-        bytes_ = pd.to_numeric(out_df["total_bytes"], errors="coerce").fillna(0)
-        out_df["avg_packet_size"] = (bytes_ / pkts.replace(0, pd.NA)).fillna(0).astype(float)
+    `execute_scenario` calls `start` and `finish` around each node; the node
+    states are written to `ScenarioRun.nodes` so clients can poll them. Several
+    nodes may run at the same time, so updates are serialized with a lock.
+    """
 
-        out_df["avg_ttl"] = pd.concat([df_raw["sttl"], df_raw["dttl"]], axis=1).mean(axis=1, skipna=True)
+    def __init__(self, run):
+        """
+        Initializes the progress recorder of a run.
+
+        Args:
+            run (ScenarioRun): The run being executed.
+        """
+
+        self.run = run
+        self._started_at = {}
+        self._lock = threading.Lock()
+
+    def _save(self):
+        ScenarioRun.objects.filter(pk=self.run.pk).update(nodes=self.run.nodes, profile=self.run.profile)
+
+    def start(self, element_id, el_type):
+        """
+        Marks a node as running.
+
+        Args:
+            element_id (str): Id of the node.
+            el_type (str): Type of the node.
+        """
+
+        with self._lock:
+            self._started_at[element_id] = time.perf_counter()
+            self.run.nodes[element_id] = {"type": el_type, "state": "running", "elapsed": 0.0}
+            self._save()
+
+    def finish(self, element_id, profile=None):
+        """
+        Marks a node as finished and stores its elapsed time and profile.
+
+        Args:
+            element_id (str): Id of the node.
+            profile (dict, optional): Measurements from `NodeProfiler.stop`. Defaults to None.
+        """
+
+        with self._lock:
+            started_at = self._started_at.pop(element_id, time.perf_counter())
+            node = self.run.nodes.setdefault(element_id, {})
+            node["state"] = "finished"
+            node["elapsed"] = round(time.perf_counter() - started_at, 3)
+            if profile is not None:
+                self.run.profile[element_id] = {"type": node.get("type"), **profile}
+            self._save()
+
+    def fail(self):
+        """
+        Marks the nodes that were still running, if any, as failed.
+        """
+
+        with self._lock:
+            if not self._started_at:
+                return
+            for element_id, started_at in self._started_at.items():
+                node = self.run.nodes.setdefault(element_id, {})
+                node["state"] = "error"
+                node["elapsed"] = round(time.perf_counter() - started_at, 3)
+            self._started_at.clear()
+            self._save()
+
+def delete_cached_features(path):
+    """
+    Removes every cached feature set of a file.
 
-        # Drop rows that are completely empty (in case ra printed weird stuff)
-        out_df = out_df.dropna(subset=["src","dst","protocol"], how="all")
+    Args:
+        path (str): Path of the source file.
 
-        logger.info("[EXTRACT FLOW][ARGUS] DataFrame aggregated head:\n%s", out_df.head(5))
-        return out_df
+    Returns:
+        None
+    """
 
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
+    shutil.rmtree(_feature_cache_dir(path), ignore_errors=True)
 
-def extract_features_by_packet_from_pcap(file_obj):
+def store_uploaded_file(uploaded_file, file_type, count_rows=False, log_prefix="[UPLOAD FILE]"):
     """
-    Extracts packet-level features from a PCAP file using PyShark.
+    Stores an uploaded file deduplicated by content hash, streaming it in chunks.
 
-    This function processes each packet in the capture individually and extracts features
-    such as timestamp, length, IP addresses, ports, protocol name, TTL, etc.
+    The upload is written to a temporary file under MEDIA_ROOT/files/ chunk by chunk,
+    while its SHA-256 and (optionally) its number of rows are computed in the same
+    pass, so memory use does not depend on the file size. Then:
+    - Same name and same content as an existing record: its reference count is
+      incremented and the temporary copy is discarded.
+    - Same content under another name: a new record is created that shares the
+      stored content of the existing one.
+    - New content: the temporary file is renamed to its final storage name.
 
     Args:
-        file_obj (file-like object): The uploaded PCAP file.
+        uploaded_file (UploadedFile): File received in the request.
+        file_type (str): Value stored in `File.file_type` (e.g. 'csv', 'pcap', 'jsonl').
+        count_rows (bool, optional): Whether to store the number of data rows (lines
+            minus the header) in `entry_count`. Defaults to False.
+        log_prefix (str, optional): Prefix used in log messages.
 
     Returns:
-        pandas.DataFrame: A DataFrame containing one row per packet with basic features.
+        File: The stored (new or existing) File record.
     """
 
-    logger.info("[EXTRACT PACKET] Extracting packet-level features...")
+    files_dir = os.path.join(settings.MEDIA_ROOT, "files")
+    os.makedirs(files_dir, exist_ok=True)
 
-    # Save uploaded PCAP file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pcap") as tmp:
-        tmp.write(file_obj.read())
-        tmp_path = tmp.name
+    digest = hashlib.sha256()
+    lines = 0
+    last_byte = b"\n"
 
-    # Initialize PyShark capture
-    cap = pyshark.FileCapture(tmp_path, keep_packets=False)
-    packets = []
+    with tempfile.NamedTemporaryFile(dir=files_dir, suffix=".upload", delete=False) as tmp:
+        tmp_path = tmp.name
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            tmp.write(chunk)
+            if count_rows and chunk:
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+
+    sha256 = digest.hexdigest()
+    if count_rows and last_byte != b"\n":
+        lines += 1
+    entry_count = max(lines - 1, 0) if count_rows else 0
 
     try:
-        for i, pkt in enumerate(cap):
-            try:
-                # Timestamp and packet length
-                time = float(pkt.sniff_time.timestamp())
-                length = int(pkt.length)
-
-                # Extract source and destination IPs
-                src = pkt.ip.src if hasattr(pkt, 'ip') else None
-                dst = pkt.ip.dst if hasattr(pkt, 'ip') else None
-
-                # Extract TTL
-                ttl = int(pkt.ip.ttl) if hasattr(pkt, 'ip') and hasattr(pkt.ip, 'ttl') else None
-
-                # Extract protocol information
-                proto = pkt.transport_layer or getattr(pkt, 'highest_layer', None)
-                proto_name = PROTOCOL_MAP.get(str(proto), str(proto)) if proto else 'UNKNOWN'
-
-                # Extract source and destination ports, defaulting to -1 if not available
-                src_port = dst_port = -1
-
-                # Use getattr to safely access srcport and dstport attributes
-                if pkt.transport_layer:
-                    layer = pkt[pkt.transport_layer]
-                    src_port = int(getattr(layer, 'srcport', -1))
-                    dst_port = int(getattr(layer, 'dstport', -1))
-
-                # Append packet features to the list
-                packets.append({
-                    'time': time,
-                    'length': length,
-                    'src': src,
-                    'dst': dst,
-                    'src_port': src_port,
-                    'dst_port': dst_port,
-                    'protocol': proto_name,
-                    'ttl': ttl,
-                })
-            except Exception as e:
-                logger.warning("[EXTRACT PACKET] Error in packet %d: %s", i + 1, str(e))
-    finally:
-        cap.close()
-        del cap
-
-    # Convert the list of packets to a DataFrame
-    df = pd.DataFrame(packets)
-    logger.info("[EXTRACT PACKET] DataFrame aggregated: %s", df)
+        # Same name and content: only the reference count changes
+        existing = File.objects.filter(name=uploaded_file.name, sha256=sha256).first()
+        if existing:
+            existing.references += 1
+            existing.save()
+            logger.info(f"{log_prefix} Existing file found: {uploaded_file.name} (references updated to {existing.references})")
+            return existing
+
+        # Same content under another name: share the stored content
+        same_content = File.objects.filter(sha256=sha256).exclude(content="").first()
+        if same_content:
+            new_file = File.objects.create(
+                name=uploaded_file.name,
+                file_type=file_type,
+                entry_count=entry_count,
+                content=same_content.content.name,
+                references=1,
+                sha256=sha256
+            )
+            logger.info(f"{log_prefix} File {uploaded_file.name} shares content with {same_content.name} (sha256 {sha256[:12]})")
+            return new_file
+
+        # New content: move the streamed copy to its final place
+        storage_name = default_storage.get_available_name(f"files/{os.path.basename(uploaded_file.name)}")
+        os.replace(tmp_path, os.path.join(settings.MEDIA_ROOT, storage_name))
+        tmp_path = None
+
+        new_file = File.objects.create(
+            name=uploaded_file.name,
+            file_type=file_type,
+            entry_count=entry_count,
+            content=storage_name,
+            references=1,
+            sha256=sha256
+        )
+        logger.info(f"{log_prefix} New file saved: {uploaded_file.name} (entries: {entry_count}, sha256 {sha256[:12]})")
+        return new_file
 
-    return df
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-def ip_to_int(ip_str):
+def release_file(file_instance, log_prefix="[RELEASE FILE]"):
     """
-    Converts an IPv4 address string to its 32-bit integer representation.
+    Decrements the reference count of a file and deletes it when it is no longer used.
+
+    The stored content (and its cached features) is only removed from disk when no
+    other File record shares it.
 
     Args:
-        ip_str (str): The IP address in dotted-decimal notation (e.g., '192.168.1.1').
+        file_instance (File): File record to release.
+        log_prefix (str, optional): Prefix used in log messages.
 
     Returns:
-        int: The integer representation of the IP address (e.g. 3232235777).
-             Returns 0 if the input is invalid or conversion fails.
+        None
     """
-    try:
-        return int(ipaddress.IPv4Address(ip_str))
-    except Exception:
-        return 0
 
-def int_to_ip(ip_int):
+    file_instance.references -= 1
+    if file_instance.references > 0:
+        file_instance.save()
+        logger.info(f"{log_prefix} Decremented reference for file: {file_instance.name}")
+        return
+
+    content_name = file_instance.content.name
+    file_instance.delete()
+    logger.info(f"{log_prefix} File record deleted from DB: {file_instance.name}")
+
+    if content_name and not File.objects.filter(content=content_name).exists():
+        file_path = os.path.join(settings.MEDIA_ROOT, content_name)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            logger.info(f"{log_prefix} Deleted file from disk: {file_path}")
+        delete_cached_features(file_path)
+
+def get_scenario_file(scenario, name):
     """
-    Converts a 32-bit integer to its IPv4 dotted-decimal string representation.
+    Returns the file with the given name, preferring the files linked to the scenario.
+
+    Since files are deduplicated by content, several records may share a name. When
+    the scenario holds none, only the files of the other scenarios of the same user
+    are considered, so a design can never read another user's upload.
 
     Args:
-        ip_int (int): The integer value of the IP address (e.g., 3232235777).
+        scenario (Scenario): Scenario whose design references the file.
+        name (str): File name used in the design.
 
     Returns:
-        str: The IP address in dotted-decimal notation (e.g., '192.168.1.1').
+        File: The matching File record.
+
+    Raises:
+        File.DoesNotExist: If the user has no file with that name.
     """
-    return socket.inet_ntoa(struct.pack("!I", int(ip_int)))
 
-def _is_ip(x) -> bool:
-    try:
-        if pd.isna(x):
-            return False
-        ipaddress.ip_address(str(x).strip())
-        return True
-    except Exception:
-        return False
-    
+    file = scenario.files.filter(name=name).order_by("-id").first()
+    if file is None:
+        file = File.objects.filter(name=name, scenario__user=scenario.user).order_by("-id").first()
+    if file is None:
+        raise File.DoesNotExist(f"File not found: {name}")
+    return file
+
 def extract_parameters(properties, params):
     """
     Extracts and converts parameter values from a dynamic configuration form.
@@ -907,6 +2035,481 @@ def save_anomaly_metrics(scenario_model, model_name, feature_name, feature_value
         local_lime_images=local_lime_images
     )
 
+    if production:
+        update_anomaly_rollups(scenario_model, model_name, anomalies)
+
+
+# Maximum number of keys kept in every counter (sources, ports, protocols) of a rollup bucket
+ROLLUP_MAX_KEYS = 20
+
+# Counters of a rollup bucket
+ROLLUP_COUNTERS = ("sources", "ports", "protocols")
+
+# Serializes the read-modify-write of rollup buckets between production threads
+_rollup_lock = threading.Lock()
+
+_ROLLUP_FIELDS_RE = {
+    "sources": re.compile(r"src: ([^,]+)"),
+    "ports": re.compile(r"ports: -?\d+->(\d+)"),
+    "protocols": re.compile(r"protocol: ([^,]+)"),
+}
+
+def anomaly_rollup_keys(description):
+    """
+    Extracts the source IP, destination port and protocol from the description built
+    by `build_anomaly_description`.
+
+    Args:
+        description (Any): Description of the anomaly.
+
+    Returns:
+        dict: Key of every counter in ROLLUP_COUNTERS found in the description. Syscall
+        anomalies and unknown values have no keys.
+    """
+
+    keys = {}
+    if not isinstance(description, str):
+        return keys
+    for counter, pattern in _ROLLUP_FIELDS_RE.items():
+        match = pattern.search(description)
+        if match is not None and match.group(1).strip() not in ("UNDEFINED", "UNKNOWN"):
+            keys[counter] = match.group(1).strip()
+    return keys
+
+def rollup_bucket(date, granularity):
+    """
+    Truncates a date to the start of its minute or hour bucket.
+
+    Args:
+        date (datetime): Date to truncate.
+        granularity (str): 'minute' or 'hour'.
+
+    Returns:
+        datetime: Start of the bucket.
+    """
+
+    if granularity == "hour":
+        return date.replace(minute=0, second=0, microsecond=0)
+    return date.replace(second=0, microsecond=0)
+
+def update_anomaly_rollups(scenario_model, model_name, description, date=None, delta=1):
+    """
+    Adds (or removes) one production anomaly to its minute and hour rollup buckets.
+
+    Besides the total, a bucket counts the anomalies per source IP, destination port
+    and protocol. When a counter holds more than ROLLUP_MAX_KEYS keys, the least
+    frequent one is dropped, so the top keys of busy buckets are approximate.
+
+    Args:
+        scenario_model (ScenarioModel): Scenario model the anomaly belongs to.
+        model_name (str): Name of the anomaly detection model.
+        description (Any): Description of the anomaly (see `anomaly_rollup_keys`).
+        date (datetime, optional): Detection date. Defaults to now.
+        delta (int, optional): 1 to add the anomaly, -1 to remove it. Defaults to 1.
+
+    Returns:
+        None
+    """
+
+    date = date or timezone.now()
+    keys = anomaly_rollup_keys(description)
+
+    try:
+        with _rollup_lock, transaction.atomic():
+            for granularity, _ in AnomalyRollup.GRANULARITIES:
+                rollup, _ = AnomalyRollup.objects.select_for_update().get_or_create(
+                    scenario_model=scenario_model,
+                    model_name=model_name,
+                    granularity=granularity,
+                    bucket=rollup_bucket(date, granularity),
+                )
+                rollup.count = max(0, rollup.count + delta)
+
+                for counter, key in keys.items():
+                    values = getattr(rollup, counter) or {}
+                    values[key] = values.get(key, 0) + delta
+                    if values[key] <= 0:
+                        del values[key]
+                    if len(values) > ROLLUP_MAX_KEYS:
+                        del values[min(values, key=values.get)]
+                    setattr(rollup, counter, values)
+
+                rollup.save(update_fields=["count", *ROLLUP_COUNTERS])
+    except Exception:
+        logger.exception("[ANOMALY ROLLUP] Could not update the rollups of %s", model_name)
+
+def parse_time_range(params, default_hours=24):
+    """
+    Reads the `since` and `until` ISO 8601 query parameters of an aggregation request.
+
+    Args:
+        params (QueryDict): Query parameters of the request.
+        default_hours (int, optional): Length of the range when `since` is missing. Defaults to 24.
+            With None, a missing `since` leaves the range open.
+
+    Returns:
+        tuple: (since, until) as aware datetimes (`since` may be None). `until` defaults to now.
+
+    Raises:
+        ValueError: If a date is not valid or `since` is not before `until`.
+    """
+
+    dates = {}
+    for param in ("since", "until"):
+        value = params.get(param)
+        if not value:
+            dates[param] = None
+            continue
+        date = parse_datetime(value)
+        if date is None:
+            raise ValueError(f"{param} must be an ISO 8601 date")
+        dates[param] = timezone.make_aware(date) if timezone.is_naive(date) else date
+
+    until = dates["until"] or timezone.now()
+    since = dates["since"]
+    if since is None and default_hours is not None:
+        since = until - timedelta(hours=default_hours)
+    if since is not None and since >= until:
+        raise ValueError("since must be before until")
+    return since, until
+
+# Columns of the anomaly exports
+ANOMALY_EXPORT_FIELDS = ("id", "execution", "model_name", "feature_name", "date", "production", "anomalies", "anomaly_details")
+
+def iter_anomaly_export_rows(queryset, chunk_size=2000):
+    """
+    Iterates the rows of an anomaly export without loading the queryset in memory.
+
+    Rows are read in pages of `chunk_size` ids (keyset pagination), each one streamed
+    with `.iterator(chunk_size=...)`. Paging keeps memory flat on MySQL too, whose
+    driver buffers the whole result of a query.
+
+    Args:
+        queryset (QuerySet): AnomalyMetric rows to export.
+        chunk_size (int, optional): Rows fetched per query. Defaults to 2000.
+
+    Yields:
+        dict: One row with the ANOMALY_EXPORT_FIELDS. The date is an ISO 8601 string and
+        the anomalies are serialized as JSON.
+    """
+
+    last_id = 0
+    while True:
+        page = queryset.filter(id__gt=last_id).order_by("id").values_list(*ANOMALY_EXPORT_FIELDS)[:chunk_size]
+        count = 0
+        for values in page.iterator(chunk_size=chunk_size):
+            row = dict(zip(ANOMALY_EXPORT_FIELDS, values))
+            row["date"] = row["date"].isoformat()
+            row["anomalies"] = json.dumps(row["anomalies"], default=str)
+            last_id = row["id"]
+            count += 1
+            yield row
+        if count < chunk_size:
+            return
+
+class _EchoBuffer:
+    """File-like object whose `write` returns the data, used to stream `csv.writer` output."""
+
+    def write(self, value):
+        return value
+
+class _ParquetSink(io.RawIOBase):
+    """Writable stream that keeps the bytes written by a ParquetWriter until they are streamed."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_anomalies_csv(rows):
+    """Yields the header and every row of an anomaly export as CSV lines."""
+
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(ANOMALY_EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in ANOMALY_EXPORT_FIELDS])
+
+def stream_anomalies_jsonl(rows):
+    """Yields every row of an anomaly export as a JSON line."""
+
+    for row in rows:
+        yield json.dumps(row, default=str) + "\n"
+
+def stream_anomalies_parquet(rows, chunk_size=2000):
+    """
+    Yields an anomaly export as a Parquet file, writing one row group per `chunk_size` rows.
+
+    Requires pyarrow, which is imported lazily (see `parquet_available`).
+    """
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()), ("execution", pa.int64()), ("model_name", pa.string()),
+        ("feature_name", pa.string()), ("date", pa.string()), ("production", pa.bool_()),
+        ("anomalies", pa.string()), ("anomaly_details", pa.string()),
+    ])
+
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+                yield sink.take()
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    finally:
+        writer.close()
+    yield sink.take()
+
+def parquet_available():
+    """Returns whether pyarrow is installed, so anomalies can be exported as Parquet."""
+
+    return importlib.util.find_spec("pyarrow") is not None
+
+# Bucket sizes (in seconds) offered by the anomaly timeline
+TIMELINE_BUCKET_SIZES = [60, 300, 900, 3600, 6 * 3600, 86400, 7 * 86400]
+
+def timeline_bucket_size(since, until, max_buckets=120):
+    """
+    Chooses the smallest bucket size that draws a time range in at most `max_buckets` buckets.
+
+    Args:
+        since (datetime): Start of the range.
+        until (datetime): End of the range.
+        max_buckets (int, optional): Maximum number of buckets. Defaults to 120.
+
+    Returns:
+        int: Bucket size in seconds (one of TIMELINE_BUCKET_SIZES).
+    """
+
+    seconds = max(0.0, (until - since).total_seconds())
+    for size in TIMELINE_BUCKET_SIZES:
+        if seconds / size <= max_buckets:
+            return size
+    return TIMELINE_BUCKET_SIZES[-1]
+
+def anomaly_timeline(rollups, since, until, max_buckets=120):
+    """
+    Counts the anomalies of a time range per bucket, with the bucket size chosen from the range.
+
+    Minute rollups are used for buckets smaller than one hour and hour rollups otherwise.
+    The database sums the rollups of every bucket start across models, and the (at most
+    a few thousand) sums are then folded into the chosen buckets.
+
+    Args:
+        rollups (QuerySet): AnomalyRollup rows of the scenario (and model) to count.
+        since (datetime): Start of the range.
+        until (datetime): End of the range.
+        max_buckets (int, optional): Maximum number of buckets. Defaults to 120.
+
+    Returns:
+        tuple: (bucket size in seconds, list of {"bucket", "count"} for the non-empty buckets).
+    """
+
+    size = timeline_bucket_size(since, until, max_buckets)
+    granularity = "minute" if size < 3600 else "hour"
+
+    sums = (
+        rollups.filter(granularity=granularity, bucket__gte=since, bucket__lt=until)
+        .values("bucket")
+        .annotate(total=Sum("count"))
+    )
+
+    counts = defaultdict(int)
+    for row in sums:
+        start = int(row["bucket"].timestamp()) // size * size
+        counts[start] += row["total"]
+
+    timeline = [
+        {"bucket": datetime.fromtimestamp(start, tz=dt_timezone.utc), "count": counts[start]}
+        for start in sorted(counts)
+    ]
+    return size, timeline
+
+def top_rollup_keys(rollups, counter, limit=10):
+    """
+    Merges one counter of several rollup buckets and returns its most frequent keys.
+
+    Args:
+        rollups (QuerySet): AnomalyRollup rows to merge (a single granularity).
+        counter (str): One of ROLLUP_COUNTERS.
+        limit (int, optional): Number of keys to return. Defaults to 10.
+
+    Returns:
+        list: Up to `limit` {"key", "count"} dicts, most frequent first.
+    """
+
+    merged = defaultdict(int)
+    for values in rollups.values_list(counter, flat=True).iterator(chunk_size=2000):
+        for key, count in (values or {}).items():
+            merged[key] += count
+
+    top = sorted(merged.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"key": key, "count": count} for key, count in top]
+
+def prune_production_anomalies(retention_days=None, archive=None, batch_size=1000):
+    """
+    Removes the production anomalies older than the retention period.
+
+    Before being deleted, the rows are optionally archived as gzipped JSON lines under
+    MEDIA_ROOT/anomaly_archive, and their local explanation images are removed.
+    Minute rollups follow the same retention, while hour rollups are kept for
+    ANOMALY_ROLLUP_RETENTION_DAYS.
+
+    Args:
+        retention_days (int, optional): Age in days of the rows to prune. Defaults to
+            ANOMALY_RETENTION_DAYS.
+        archive (bool, optional): Whether to archive the rows. Defaults to ANOMALY_ARCHIVE.
+        batch_size (int, optional): Number of rows read and deleted at a time. Defaults to 1000.
+
+    Returns:
+        dict: Number of pruned anomalies and rollups and the archive path (or None).
+    """
+
+    retention_days = settings.ANOMALY_RETENTION_DAYS if retention_days is None else retention_days
+    archive = settings.ANOMALY_ARCHIVE if archive is None else archive
+
+    now = timezone.now()
+    cutoff = now - timedelta(days=retention_days)
+    expired = AnomalyMetric.objects.filter(production=True, date__lt=cutoff).select_related(
+        "scenario_model__scenario"
+    ).order_by("id")
+
+    archive_path = None
+    archive_file = None
+    if archive and expired.exists():
+        folder = os.path.join(settings.MEDIA_ROOT, "anomaly_archive")
+        os.makedirs(folder, exist_ok=True)
+        archive_path = os.path.join(folder, f"anomalies_{now.strftime('%Y%m%d%H%M%S')}.jsonl.gz")
+        archive_file = gzip.open(archive_path, "wt", encoding="utf-8")
+
+    pruned = 0
+    try:
+        while True:
+            batch = list(expired[:batch_size])
+            if not batch:
+                break
+
+            for metric in batch:
+                if archive_file is not None:
+                    archive_file.write(json.dumps({
+                        "id": metric.id,
+                        "scenario": str(metric.scenario_model.scenario.uuid),
+                        "execution": metric.execution,
+                        "model_name": metric.model_name,
+                        "feature_name": metric.feature_name,
+                        "anomalies": metric.anomalies,
+                        "anomaly_details": metric.anomaly_details,
+                        "date": metric.date.isoformat(),
+                    }, default=str) + "\n")
+
+                for folder, images in (("shap_local_images", metric.local_shap_images),
+                                       ("lime_local_images", metric.local_lime_images)):
+                    for image in images or []:
+                        path = os.path.join(settings.MEDIA_ROOT, folder, os.path.basename(str(image)))
+                        if os.path.exists(path):
+                            try:
+                                os.remove(path)
+                            except OSError as e:
+                                logger.warning("[PRUNE ANOMALIES] Could not delete %s: %s", path, e)
+
+            AnomalyMetric.objects.filter(id__in=[metric.id for metric in batch]).delete()
+            pruned += len(batch)
+    finally:
+        if archive_file is not None:
+            archive_file.close()
+
+    rollups, _ = AnomalyRollup.objects.filter(granularity="minute", bucket__lt=cutoff).delete()
+    hour_cutoff = now - timedelta(days=settings.ANOMALY_ROLLUP_RETENTION_DAYS)
+    hour_rollups, _ = AnomalyRollup.objects.filter(granularity="hour", bucket__lt=hour_cutoff).delete()
+
+    logger.info("[PRUNE ANOMALIES] Pruned %s anomalies older than %s days (archive: %s)", pruned, retention_days, archive_path)
+
+    return {"anomalies": pruned, "rollups": rollups + hour_rollups, "archive": archive_path}
+
+def backfill_anomaly_rollups(batch_size=2000):
+    """
+    Builds the rollup buckets of the production anomalies stored before rollups existed.
+
+    The stored production rows are aggregated in memory into minute and hour buckets,
+    and only the buckets that do not exist yet are created, so the buckets kept up to
+    date by `update_anomaly_rollups` (and the hour buckets whose raw rows were already
+    pruned) are left untouched and the command can be run again safely.
+
+    Args:
+        batch_size (int, optional): Number of rows read from the database at a time.
+            Defaults to 2000.
+
+    Returns:
+        int: Number of rollup buckets created.
+    """
+
+    buckets = {}
+    rows = AnomalyMetric.objects.filter(production=True).values_list(
+        "scenario_model_id", "model_name", "date", "anomalies"
+    )
+    for scenario_model_id, model_name, date, anomalies in rows.iterator(chunk_size=batch_size):
+        if isinstance(anomalies, str):
+            try:
+                anomalies = json.loads(anomalies)
+            except ValueError:
+                anomalies = None
+        keys = anomaly_rollup_keys(anomalies.get("anomaly_indices") if isinstance(anomalies, dict) else None)
+
+        for granularity, _ in AnomalyRollup.GRANULARITIES:
+            key = (scenario_model_id, model_name, granularity, rollup_bucket(date, granularity))
+            bucket = buckets.setdefault(key, {"count": 0, "sources": {}, "ports": {}, "protocols": {}})
+            bucket["count"] += 1
+            for counter, value in keys.items():
+                bucket[counter][value] = bucket[counter].get(value, 0) + 1
+
+    def top(values):
+        return dict(sorted(values.items(), key=lambda item: item[1], reverse=True)[:ROLLUP_MAX_KEYS])
+
+    rollups = [
+        AnomalyRollup(
+            scenario_model_id=scenario_model_id,
+            model_name=model_name,
+            granularity=granularity,
+            bucket=bucket_start,
+            count=bucket["count"],
+            sources=top(bucket["sources"]),
+            ports=top(bucket["ports"]),
+            protocols=top(bucket["protocols"]),
+        )
+        for (scenario_model_id, model_name, granularity, bucket_start), bucket in buckets.items()
+    ]
+
+    existing = AnomalyRollup.objects.count()
+    with _rollup_lock:
+        AnomalyRollup.objects.bulk_create(rollups, batch_size=batch_size, ignore_conflicts=True)
+    created = AnomalyRollup.objects.count() - existing
+
+    logger.info("[BACKFILL ROLLUPS] Created %s rollup buckets from %s candidate buckets", created, len(rollups))
+    return created
 
 def find_explainer_class(module_name, explainer_name):
     """
@@ -1390,6 +2993,83 @@ def topological_sort(elements, connections):
 
     return sorted_order
 
+def upstream_step_ids(prev_map, element_id):
+    """
+    Returns the ids of the nodes upstream of a model, from the source to the model.
+
+    Args:
+        prev_map (dict): Ids of the nodes connected to each node, keyed by node id.
+        element_id (str): ID of the model node.
+
+    Returns:
+        list: Ids of the upstream nodes.
+    """
+
+    step_ids = []
+    visited = set()
+    stack = [element_id]
+
+    # Traverse upstream to collect all connected nodes
+    while stack:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+
+        for prev_id in prev_map.get(node, []):
+            stack.append(prev_id)
+            # prepend para respetar el orden (de origen → modelo)
+            step_ids.insert(0, prev_id)
+
+    return step_ids
+
+def collect_pipeline_steps(elements, prev_map, element_id, scenario_uuid, base_path):
+    """
+    Loads the preprocessing steps applied before a model node.
+
+    Args:
+        elements (dict): Design elements keyed by id.
+        prev_map (dict): Ids of the nodes connected to each node, keyed by node id.
+        element_id (str): ID of the model node.
+        scenario_uuid (str): Unique identifier of the scenario.
+        base_path (str): Folder of the serialized (.pkl) components.
+
+    Returns:
+        list: (type, instance) tuples of the upstream nodes that saved an artifact, in order.
+    """
+
+    pipeline_steps: List[tuple] = []
+    for prev_id in upstream_step_ids(prev_map, element_id):
+        # Load the component from disk if it exists
+        pkl_path = os.path.join(base_path, f"{prev_id}_{scenario_uuid}.pkl")
+        if os.path.exists(pkl_path):
+            instance = model_registry.load(pkl_path, scenario_uuid, prev_id)
+            pipeline_steps.append((elements[prev_id]["type"], instance))
+
+    return pipeline_steps
+
+def steps_newer_than(model_path, prev_map, element_id, scenario_uuid, base_path):
+    """
+    Returns whether a preprocessing step of a model was saved after the model itself.
+
+    Args:
+        model_path (str): Path of the model artifact.
+        prev_map (dict): Ids of the nodes connected to each node, keyed by node id.
+        element_id (str): ID of the model node.
+        scenario_uuid (str): Unique identifier of the scenario.
+        base_path (str): Folder of the serialized (.pkl) components.
+
+    Returns:
+        bool: True if any step artifact is newer than the model artifact.
+    """
+
+    model_mtime = os.path.getmtime(model_path)
+    for prev_id in upstream_step_ids(prev_map, element_id):
+        pkl_path = os.path.join(base_path, f"{prev_id}_{scenario_uuid}.pkl")
+        if os.path.exists(pkl_path) and os.path.getmtime(pkl_path) > model_mtime:
+            return True
+    return False
+
 def build_pipelines_from_design(design, scenario_uuid, config, base_path):
     """
     Constructs execution pipelines for machine learning models based on a visual design.
@@ -1403,13 +3083,14 @@ def build_pipelines_from_design(design, scenario_uuid, config, base_path):
         scenario_uuid (str): Unique identifier for the current scenario.
         config (dict): Configuration containing the list of valid model types per section.
         base_path (str): Filesystem path where serialized (.pkl) components are stored.
+            They are loaded through `model_registry`, so restarting a session reuses them.
 
     Returns:
         list: A list of tuples, each containing:
               - element_id (str): The ID of the model node.
               - model_instance: The loaded model object.
               - pipeline_steps (list): List of (type, instance) tuples for preprocessing.
-              - X_train (optional): Training data used (if available) for explainability.
+              - X_train (optional): Background data (if available) for explainability.
     """
 
     # Map element IDs to their definitions for quick lookup
@@ -1440,42 +3121,35 @@ def build_pipelines_from_design(design, scenario_uuid, config, base_path):
 
         # Only build pipeline for recognized model types
         if el_type in model_types:
-            pipeline_steps: List[tuple] = []
-            visited = set()
-            stack = [element_id]
-
-            # Traverse upstream to collect all connected preprocessing steps
-            while stack:
-                node = stack.pop()
-                if node in visited:
-                    continue
-                visited.add(node)
-
-                for prev_id in prev_map.get(node, []):
-                    stack.append(prev_id)
-                    prev_type = elements[prev_id]["type"]
-
-                    # Load the component from disk if it exists
-                    pkl_path = os.path.join(base_path, f"{prev_id}_{scenario_uuid}.pkl")
-                    if os.path.exists(pkl_path):
-                        instance = joblib.load(pkl_path)
-                        # prepend para respetar el orden (de origen → modelo)
-                        pipeline_steps.insert(0, (prev_type, instance))
+            pipeline_steps = collect_pipeline_steps(elements, prev_map, element_id, scenario_uuid, base_path)
 
             # Load the actual model instance
             model_path = os.path.join(base_path, f"{element_id}_{scenario_uuid}.pkl")
             if not os.path.exists(model_path):
                 continue
 
-            model_bundle = joblib.load(model_path)
+            model_bundle = model_registry.load(model_path, scenario_uuid, element_id)
 
-            # Extract model and optional training data
+            # Extract model and the data given to explainers: the summarized background,
+            # the full training data of older bundles, or the memory-mapped training data
             if isinstance(model_bundle, dict):
                 model_instance = model_bundle.get("model")
-                X_train = model_bundle.get("X_train")
+                X_train = model_bundle.get("background")
+                if X_train is None:
+                    X_train = model_bundle.get("X_train")
+                if X_train is None and os.path.exists(training_data_path(model_path)):
+                    X_train = load_training_data(model_path, model_bundle.get("feature_names"))
+                compiled = model_bundle.get("compiled")
+                stages = model_bundle.get("stages")
             else:
                 model_instance = model_bundle
                 X_train = None
+                compiled = None
+                stages = None
+
+            # Stages saved before a step was trained again no longer match the steps
+            if stages is not None and steps_newer_than(model_path, prev_map, element_id, scenario_uuid, base_path):
+                stages = None
 
             # Añadimos un PipelineDef en vez de una tupla
             pipelines.append(
@@ -1484,6 +3158,8 @@ def build_pipelines_from_design(design, scenario_uuid, config, base_path):
                     model=model_instance,
                     steps=pipeline_steps,
                     X_train=X_train,
+                    compiled=compiled,
+                    stages=stages,
                 )
             )
 
@@ -1607,7 +3283,7 @@ def handle_packet_prediction(proc, pipelines, scenario_model, design, config, ex
                         df_proc[expected_cols] = df_proc_transformed
 
                     elif step_type == "OneHotEncoding":
-                        df_proc = pd.get_dummies(df_proc)
+                        df_proc = encode_categorical(df_proc, transformer)
 
                 # Convert IP addresses to integers and protocols to codes
                 for ip_col in ['src', 'dst']:
@@ -2140,7 +3816,7 @@ def handle_flow_prediction(proc, pipelines, scenario_model, design, config, exec
                         df_proc[expected_cols] = df_proc_transformed
 
                     elif step_type == "OneHotEncoding":
-                        df_proc = pd.get_dummies(df_proc)
+                        df_proc = encode_categorical(df_proc, transformer)
 
                 # Convert IP addresses to integers and protocols to codes
                 for ip_col in ['src', 'dst']:
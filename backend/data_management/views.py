@@ -1,20 +1,17 @@
 # Create your views here.
 from django.shortcuts import render
-import csv
-from django.core.files.base import ContentFile
-from io import StringIO
 import os
-import joblib
 import subprocess
 import threading
+import time
 from django.conf import settings
 from rest_framework.parsers import MultiPartParser
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from .models import Scenario, File, ScenarioModel, ClassificationMetric, RegressionMetric, AnomalyMetric
+from .models import Scenario, File, ScenarioModel, ScenarioRun, ClassificationMetric, RegressionMetric, AnomalyMetric
 from .serializers import ScenarioSerializer
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from system_monitor.models import SystemConfiguration
 import logging
 import json
@@ -24,13 +21,22 @@ import copy
 import shap
 from celery import shared_task
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from sklearn.model_selection import train_test_split
 
 from .utils import *
 from netanoms_runtime.detection import run_live_production
 from netanoms_runtime.ssh_config import SSHConfig
 from netanoms_runtime.capture_config import CaptureConfig
+from netanoms_runtime.utils import derive_capture_pushdown
+from netanoms_runtime.categorical_encoding import FixedVocabularyEncoder
+from netanoms_runtime.pipeline_compiler import compile_model, compile_steps
 from netanoms_runtime.explainability_config import ExplainabilityConfig
+from netanoms_runtime.syscall_features import load_syscall_jsonl, add_rolling_syscall_features
 
 logger = logging.getLogger('backend')
 
@@ -51,15 +57,11 @@ def create_scenario(request):
 
     Behavior:
         - Parses the form data and associates the scenario with the authenticated user.
-        - For each CSV file:
-            - If it already exists in the database (by name), increments reference count.
-            - If new, counts its entries, stores its content, and saves it.
-        - For each PCAP file:
-            - If it already exists in the database (by name), increments reference count.
-            - If new, stores its binary content and saves it.
-        - For each JSONL file:
-            - If it already exists in the database (by name), increments reference count.
-            - If new, stores its binary content and saves it.
+        - Each CSV, PCAP and JSONL file is streamed to storage in chunks with
+          `store_uploaded_file`, computing its SHA-256 (and row count for CSV) in the same pass:
+            - If a file with the same name and content exists, increments its reference count.
+            - If the same content exists under another name, the new record shares it.
+            - Otherwise, the streamed copy is kept as a new file.
         - Links all uploaded files to the created scenario.
 
     Returns:
@@ -93,85 +95,17 @@ def create_scenario(request):
     saved_files = []
 
     try:
-        # Process CSV files
+        # Process CSV files (rows are counted while the upload is streamed to storage)
         for csv_file in csv_files:
-
-            # Check if the file already exists in the database
-            existing_file = File.objects.filter(name=csv_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing_file:
-                existing_file.references += 1
-                existing_file.save()
-                saved_files.append(existing_file)
-                logger.info(f"[CREATE SCENARIO] Existing CSV file found: {csv_file.name} (references updated to {existing_file.references})")
-            
-            # If it does not exist, read the content, count entries, and save it
-            else:
-                csv_content = csv_file.read().decode('utf-8')
-                csv_reader = csv.reader(StringIO(csv_content))
-                entry_count = sum(1 for _ in csv_reader) - 1
-
-                new_file = File.objects.create(
-                    name=csv_file.name,
-                    file_type='csv',
-                    entry_count=entry_count,
-                    content=ContentFile(csv_content.encode('utf-8'), name=csv_file.name),
-                    references=1
-                )
-                saved_files.append(new_file)
-                logger.info(f"[CREATE SCENARIO] New CSV file saved: {csv_file.name} (entries: {entry_count})")
+            saved_files.append(store_uploaded_file(csv_file, 'csv', count_rows=True, log_prefix="[CREATE SCENARIO]"))
 
         # Process PCAP files
         for network_file in network_files:
+            saved_files.append(store_uploaded_file(network_file, 'pcap', log_prefix="[CREATE SCENARIO]"))
 
-            # Check if the file already exists in the database
-            existing_file = File.objects.filter(name=network_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing_file:
-                existing_file.references += 1
-                existing_file.save()
-                saved_files.append(existing_file)
-                logger.info(f"[CREATE SCENARIO] Existing PCAP file found: {network_file.name} (references updated to {existing_file.references})")
-            
-            # If it does not exist, read the content and save it
-            else:
-                network_content = network_file.read()
-                new_file = File.objects.create(
-                    name=network_file.name,
-                    file_type='pcap',
-                    entry_count=0,
-                    content=ContentFile(network_content, name=network_file.name),
-                    references=1
-                )
-                saved_files.append(new_file)
-                logger.info(f"[CREATE SCENARIO] New PCAP file saved: {network_file.name}")
-
+        # Process JSONL files
         for jsonl_file in jsonl_files:
-
-            # Check if the file already exists in the database
-            existing_file = File.objects.filter(name=jsonl_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing_file:
-                existing_file.references += 1
-                existing_file.save()
-                saved_files.append(existing_file)
-                logger.info(f"[CREATE SCENARIO] Existing Log file found: {jsonl_file.name} (references updated to {existing_file.references})")
-            
-            # If it does not exist, read the content, count entries, and save it
-            else:
-                log_content = jsonl_file.read()
-                new_file = File.objects.create(
-                    name=jsonl_file.name,
-                    file_type='jsonl',
-                    entry_count=0,
-                    content=ContentFile(log_content, name=jsonl_file.name),
-                    references=1
-                )
-                saved_files.append(new_file)
-                logger.info(f"[CREATE SCENARIO] New JSONL file saved: {jsonl_file.name}")
+            saved_files.append(store_uploaded_file(jsonl_file, 'jsonl', log_prefix="[CREATE SCENARIO]"))
 
     except Exception as e:
         # Return an error response if there is an issue processing the files
@@ -391,57 +325,68 @@ def get_scenario_regression_metrics_by_uuid(request, uuid):
 @permission_classes([IsAuthenticated])
 def get_scenario_anomaly_metrics_by_uuid(request, uuid):
     """
-    Retrieves all non-production anomaly detection metrics for a given scenario UUID.
+    Retrieves the non-production anomaly detection metrics of one execution of a scenario.
 
     Args:
         uuid (str): UUID of the scenario.
 
+    Query parameters:
+        - execution (optional): Execution number. Defaults to the latest one.
+        - points (optional): Maximum number of points per feature series. Defaults to 1000.
+
     Behavior:
         - Finds the associated scenario and scenario model.
-        - Filters anomaly metrics that are not from production mode, ordered by date descending.
-        - Parses the anomalies field (stored as JSON string or list).
+        - Filters anomaly metrics that are not from production mode for the execution.
+        - Expands every record into one entry per feature with a downsampled series that
+          keeps all the anomalies (see `anomaly_metric_series`).
         - Ensures SHAP and LIME global images are returned as lists.
 
     Returns:
         - 200 OK with metrics list if found.
+        - 400 Bad Request if a query parameter is not an integer.
         - 500 Internal Server Error on unexpected failure.
     """
 
     try:
+        try:
+            max_points = max(2, int(request.query_params.get('points', 1000)))
+            execution = request.query_params.get('execution')
+            execution = int(execution) if execution is not None else None
+        except ValueError:
+            return JsonResponse({"error": "execution and points must be integers"}, status=400)
+
         # Fetch the scenario by UUID
         scenario = Scenario.objects.get(uuid=uuid)
 
         # Fetch the associated scenario model
         scenario_model = ScenarioModel.objects.get(scenario=scenario)
 
-        # Retrieve all anomaly metrics for the scenario model that are not in production mode, ordered by date
-        metrics = AnomalyMetric.objects.filter(scenario_model=scenario_model, production=False).order_by('-date')
+        # Retrieve the anomaly metrics for the scenario model that are not in production mode
+        metrics = AnomalyMetric.objects.filter(scenario_model=scenario_model, production=False)
+        if execution is None:
+            execution = metrics.aggregate(Max('execution'))['execution__max']
+        metrics = metrics.filter(execution=execution).order_by('-date')
 
         # Prepare the metrics data for the response
         metrics_data = []
         for metric in metrics:
-            # Attempt to parse anomalies field, fallback to raw value if parsing fails
-            try:
-                anomalies = json.loads(metric.anomalies)
-            except:
-                anomalies = metric.anomalies
-
-            metrics_data.append({
-                "model_name": metric.model_name,
-                "feature_name": metric.feature_name,
-                "anomalies": anomalies,
-                "date": metric.date,
-                "execution": metric.execution,
-                "production": metric.production,
-                "global_shap_images": (
-                    [metric.global_shap_images] if isinstance(metric.global_shap_images, str)
-                    else (metric.global_shap_images or [])
-                ),
-                "global_lime_images": (
-                    [metric.global_lime_images] if isinstance(metric.global_lime_images, str)
-                    else (metric.global_lime_images or [])
-                )
-            })
+            for series in anomaly_metric_series(metric, max_points):
+                metrics_data.append({
+                    "model_name": metric.model_name,
+                    "feature_name": series["feature_name"],
+                    "anomalies": series["anomalies"],
+                    "date": metric.date,
+                    "execution": metric.execution,
+                    "production": metric.production,
+                    "global_shap_images": (
+                        [metric.global_shap_images] if isinstance(metric.global_shap_images, str)
+                        else (metric.global_shap_images or [])
+                    ),
+                    "global_lime_images": (
+                        [metric.global_lime_images] if isinstance(metric.global_lime_images, str)
+                        else (metric.global_lime_images or [])
+                    )
+                })
 
         # Return the metrics data as a JSON response
         return JsonResponse({"metrics": metrics_data}, safe=False)
@@ -450,6 +395,331 @@ def get_scenario_anomaly_metrics_by_uuid(request, uuid):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
     
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_anomaly_rollups_by_uuid(request, uuid):
+    """
+    Returns the number of production anomalies per time bucket, read from the rollups.
+
+    Query parameters:
+        - granularity (optional): 'minute' or 'hour'. Defaults to 'minute'.
+        - since, until (optional): ISO 8601 dates limiting the buckets.
+        - model (optional): Model name. Defaults to all the models of the scenario.
+
+    Returns:
+        - 200 OK with the buckets (start, model name, count and top sources, ports and protocols).
+        - 400 Bad Request if a query parameter is not valid.
+        - 404 Not Found if the scenario does not exist or does not belong to the user.
+    """
+
+    granularity = request.query_params.get('granularity', 'minute')
+    if granularity not in dict(AnomalyRollup.GRANULARITIES):
+        return JsonResponse({'error': 'granularity must be minute or hour'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        scenario_model = ScenarioModel.objects.get(scenario__uuid=uuid, scenario__user=request.user)
+    except ScenarioModel.DoesNotExist:
+        return JsonResponse({'error': 'Scenario not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    rollups = AnomalyRollup.objects.filter(scenario_model=scenario_model, granularity=granularity)
+
+    for param, lookup in (('since', 'bucket__gte'), ('until', 'bucket__lt')):
+        value = request.query_params.get(param)
+        if value:
+            date = parse_datetime(value)
+            if date is None:
+                return JsonResponse({'error': f'{param} must be an ISO 8601 date'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(date):
+                date = timezone.make_aware(date)
+            rollups = rollups.filter(**{lookup: date})
+
+    model_name = request.query_params.get('model')
+    if model_name:
+        rollups = rollups.filter(model_name=model_name)
+
+    buckets = [
+        {
+            'bucket': rollup['bucket'],
+            'model_name': rollup['model_name'],
+            'count': rollup['count'],
+            'sources': rollup['sources'],
+            'ports': rollup['ports'],
+            'protocols': rollup['protocols'],
+        }
+        for rollup in rollups.order_by('bucket', 'model_name').values(
+            'bucket', 'model_name', 'count', 'sources', 'ports', 'protocols'
+        )
+    ]
+
+    return JsonResponse({'granularity': granularity, 'buckets': buckets}, status=status.HTTP_200_OK)
+
+def _anomaly_stats_request(request, uuid):
+    """
+    Reads the scenario, time range and model filter shared by the anomaly stats endpoints.
+
+    Returns:
+        tuple: (rollups queryset, since, until), or (error response, None, None).
+    """
+
+    try:
+        since, until = parse_time_range(request.query_params)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST), None, None
+
+    try:
+        scenario_model = ScenarioModel.objects.get(scenario__uuid=uuid, scenario__user=request.user)
+    except ScenarioModel.DoesNotExist:
+        return JsonResponse({'error': 'Scenario not found'}, status=status.HTTP_404_NOT_FOUND), None, None
+
+    rollups = AnomalyRollup.objects.filter(scenario_model=scenario_model)
+    model_name = request.query_params.get('model')
+    if model_name:
+        rollups = rollups.filter(model_name=model_name)
+
+    return rollups, since, until
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_anomaly_timeline_by_uuid(request, uuid):
+    """
+    Returns the number of production anomalies over time, with the bucket size chosen from the range.
+
+    Query parameters:
+        - since, until (optional): ISO 8601 dates. Default to the last 24 hours.
+        - model (optional): Model name. Defaults to all the models of the scenario.
+        - buckets (optional): Maximum number of buckets. Defaults to 120.
+
+    Returns:
+        - 200 OK with the bucket size in seconds and the non-empty buckets.
+        - 400 Bad Request if a query parameter is not valid.
+        - 404 Not Found if the scenario does not exist or does not belong to the user.
+    """
+
+    rollups, since, until = _anomaly_stats_request(request, uuid)
+    if since is None:
+        return rollups
+
+    try:
+        max_buckets = min(1000, max(1, int(request.query_params.get('buckets', 120))))
+    except ValueError:
+        return JsonResponse({'error': 'buckets must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    size, timeline = anomaly_timeline(rollups, since, until, max_buckets)
+
+    return JsonResponse({
+        'since': since,
+        'until': until,
+        'bucket_seconds': size,
+        'timeline': timeline,
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_anomaly_top_by_uuid(request, uuid):
+    """
+    Returns the most frequent source IPs, destination ports and protocols of the production anomalies.
+
+    Query parameters:
+        - since, until (optional): ISO 8601 dates. Default to the last 24 hours.
+        - model (optional): Model name. Defaults to all the models of the scenario.
+        - limit (optional): Number of entries of every list (max 100). Defaults to 10.
+
+    Returns:
+        - 200 OK with the `sources`, `ports` and `protocols` lists of {key, count}.
+        - 400 Bad Request if a query parameter is not valid.
+        - 404 Not Found if the scenario does not exist or does not belong to the user.
+    """
+
+    rollups, since, until = _anomaly_stats_request(request, uuid)
+    if since is None:
+        return rollups
+
+    try:
+        limit = min(100, max(1, int(request.query_params.get('limit', 10))))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Hour buckets are enough (and far fewer) unless the range is short
+    granularity = 'minute' if until - since <= timedelta(days=1) else 'hour'
+    rollups = rollups.filter(granularity=granularity, bucket__gte=rollup_bucket(since, granularity), bucket__lt=until)
+
+    return JsonResponse({
+        'since': since,
+        'until': until,
+        **{counter: top_rollup_keys(rollups, counter, limit) for counter in ROLLUP_COUNTERS},
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_anomaly_model_counts_by_uuid(request, uuid):
+    """
+    Returns the number of production anomalies detected by every model of a scenario.
+
+    Query parameters:
+        - since, until (optional): ISO 8601 dates. Default to the last 24 hours.
+
+    Returns:
+        - 200 OK with the total and the count of every model.
+        - 400 Bad Request if a query parameter is not valid.
+        - 404 Not Found if the scenario does not exist or does not belong to the user.
+    """
+
+    rollups, since, until = _anomaly_stats_request(request, uuid)
+    if since is None:
+        return rollups
+
+    granularity = 'minute' if until - since <= timedelta(days=1) else 'hour'
+    models_counts = list(
+        rollups.filter(granularity=granularity, bucket__gte=rollup_bucket(since, granularity), bucket__lt=until)
+        .values('model_name')
+        .annotate(count=Sum('count'))
+        .order_by('-count')
+    )
+
+    return JsonResponse({
+        'since': since,
+        'until': until,
+        'total': sum(row['count'] for row in models_counts),
+        'models': models_counts,
+    }, status=status.HTTP_200_OK)
+
+# Content type and extension of every anomaly export format
+ANOMALY_EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_scenario_anomalies_by_uuid(request, uuid):
+    """
+    Streams the anomalies of a scenario as CSV, JSON lines or Parquet.
+
+    Rows are read from the database in chunks while the response is being sent,
+    so memory stays flat regardless of the number of exported anomalies.
+
+    Query parameters:
+        - export_format (optional): 'csv', 'jsonl' or 'parquet' (requires pyarrow). Defaults to 'csv'.
+        - since, until (optional): ISO 8601 dates. Default to the whole history.
+        - production (optional): 'true' (default) for production anomalies, 'false' for training ones.
+        - model (optional): Model name. Defaults to all the models of the scenario.
+        - execution (optional): Execution number. Defaults to all the executions.
+
+    Returns:
+        - 200 OK with the streamed file as an attachment.
+        - 400 Bad Request if a query parameter is not valid or pyarrow is missing for Parquet.
+        - 404 Not Found if the scenario does not exist or does not belong to the user.
+    """
+
+    export_format = request.query_params.get('export_format', 'csv').lower()
+    if export_format not in ANOMALY_EXPORT_FORMATS:
+        return JsonResponse({'error': 'export_format must be csv, jsonl or parquet'}, status=status.HTTP_400_BAD_REQUEST)
+    if export_format == 'parquet' and not parquet_available():
+        return JsonResponse({'error': 'Parquet export requires pyarrow'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        since, until = parse_time_range(request.query_params, default_hours=None)
+        execution = request.query_params.get('execution')
+        execution = int(execution) if execution is not None else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        scenario_model = ScenarioModel.objects.get(scenario__uuid=uuid, scenario__user=request.user)
+    except ScenarioModel.DoesNotExist:
+        return JsonResponse({'error': 'Scenario not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    production = request.query_params.get('production', 'true').lower() != 'false'
+    anomalies = AnomalyMetric.objects.filter(scenario_model=scenario_model, production=production, date__lt=until)
+    if since is not None:
+        anomalies = anomalies.filter(date__gte=since)
+    if execution is not None:
+        anomalies = anomalies.filter(execution=execution)
+    model_name = request.query_params.get('model')
+    if model_name:
+        anomalies = anomalies.filter(model_name=model_name)
+
+    rows = iter_anomaly_export_rows(anomalies)
+    if export_format == 'csv':
+        content = stream_anomalies_csv(rows)
+    elif export_format == 'jsonl':
+        content = stream_anomalies_jsonl(rows)
+    else:
+        content = stream_anomalies_parquet(rows)
+
+    content_type, extension = ANOMALY_EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="anomalies_{uuid}.{extension}"'
+
+    logger.info("[EXPORT ANOMALIES] Streaming %s anomalies of scenario %s", export_format, uuid)
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_anomaly_results_by_uuid(request, uuid):
+    """
+    Returns a page of the raw training anomaly results of a scenario execution.
+
+    Query parameters:
+        - execution (optional): Execution number. Defaults to the latest one.
+        - model (optional): Model name. Defaults to the first model of the execution.
+        - offset (optional): First row of the page. Defaults to 0.
+        - limit (optional): Number of rows of the page (max 10000). Defaults to 1000.
+
+    Returns:
+        - 200 OK with the features, the rows of the page (values and anomaly flag) and the total.
+        - 400 Bad Request if a query parameter is not an integer.
+        - 404 Not Found if the scenario does not exist, does not belong to the user or
+          has no stored results for the execution.
+    """
+
+    try:
+        execution = request.query_params.get('execution')
+        execution = int(execution) if execution is not None else None
+        offset = max(0, int(request.query_params.get('offset', 0)))
+        limit = min(10000, max(1, int(request.query_params.get('limit', 1000))))
+    except ValueError:
+        return JsonResponse({'error': 'execution, offset and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+    metrics = AnomalyMetric.objects.filter(
+        scenario_model__scenario__uuid=uuid, scenario_model__scenario__user=request.user, production=False
+    ).exclude(artifact="")
+
+    if execution is None:
+        execution = metrics.aggregate(Max('execution'))['execution__max']
+    metrics = metrics.filter(execution=execution)
+
+    model_name = request.query_params.get('model')
+    if model_name:
+        metrics = metrics.filter(model_name=model_name)
+
+    metric = metrics.order_by('id').first()
+    if metric is None:
+        return JsonResponse({'error': 'No anomaly results found for this execution'}, status=status.HTTP_404_NOT_FOUND)
+
+    features, values, predictions = load_anomaly_results(metric)
+    page = slice(offset, offset + limit)
+    columns = [values[name][page] for name in features]
+    rows = [
+        {
+            "index": offset + i,
+            "values": {name: (None if np.isnan(col[i]) else float(col[i])) for name, col in zip(features, columns)},
+            "anomaly": bool(flag),
+        }
+        for i, flag in enumerate(predictions[page])
+    ]
+
+    return JsonResponse({
+        'model_name': metric.model_name,
+        'execution': metric.execution,
+        'features': features,
+        'total': int(len(predictions)),
+        'offset': offset,
+        'limit': limit,
+        'rows': rows,
+    }, status=status.HTTP_200_OK)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_scenario_production_anomaly_metrics_by_uuid(request, uuid):
@@ -526,7 +796,7 @@ def put_scenario_by_uuid(request, uuid):
 
     Behavior:
         - Validates the design JSON sent in the form data.
-        - Updates references for newly uploaded or existing files.
+        - Streams newly uploaded files to storage, deduplicated by content hash.
         - Removes unused files and decrements their references.
         - Updates the scenario's design and associated files.
 
@@ -581,106 +851,44 @@ def put_scenario_by_uuid(request, uuid):
                 if jsonl_name:
                     referenced_file_names.add(jsonl_name)
 
-        # Fetch all referenced files from the database
-        referenced_files = list(File.objects.filter(name__in=referenced_file_names))
+        # Fetch all referenced files of the user from the database (several records may share a name)
+        referenced_files = []
+        for name in referenced_file_names:
+            try:
+                referenced_files.append(get_scenario_file(scenario, name))
+            except File.DoesNotExist:
+                pass
 
         updated_files = []
 
-        # Process the uploaded CSV files 
+        # Process the uploaded CSV files (rows are counted while the upload is streamed to storage)
         for csv_file in csv_files:
-            # Check if the file already exists in the database
-            existing = File.objects.filter(name=csv_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing:
-                existing.references += 1
-                existing.save()
-                updated_files.append(existing)
-                logger.info(f"[UPDATE SCENARIO] Existing CSV file found: {csv_file.name} (references updated to {existing.references})")
-
-            # If it does not exist, read the content, count entries, and save it
-            else:
-                csv_content = csv_file.read().decode('utf-8')
-                csv_reader = csv.reader(StringIO(csv_content))
-                entry_count = sum(1 for _ in csv_reader) - 1
-
-                new_file = File.objects.create(
-                    name=csv_file.name,
-                    file_type='csv',
-                    entry_count=entry_count,
-                    content=ContentFile(csv_content.encode('utf-8'), name=csv_file.name),
-                    references=1
-                )
-                updated_files.append(new_file)
-                logger.info(f"[UPDATE SCENARIO] New CSV file saved: {csv_file.name} (entries: {entry_count})")
+            updated_files.append(store_uploaded_file(csv_file, 'csv', count_rows=True, log_prefix="[UPDATE SCENARIO]"))
 
         # Process the uploaded PCAP files
         for network_file in network_files:
-
-            # Check if the file already exists in the database
-            existing = File.objects.filter(name=network_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing:
-                existing.references += 1
-                existing.save()
-                updated_files.append(existing)
-                logger.info(f"[UPDATE SCENARIO] Existing PCAP file found: {network_file.name} (references updated to {existing.references})")
-
-            # If it does not exist, read the content and save it
-            else:
-                network_content = network_file.read()
-                new_file = File.objects.create(
-                    name=network_file.name,
-                    file_type='pcap',
-                    entry_count=0,
-                    content=ContentFile(network_content, name=network_file.name),
-                    references=1
-                )
-                updated_files.append(new_file)
-                logger.info(f"[UPDATE SCENARIO] New PCAP file saved: {network_file.name}")
+            updated_files.append(store_uploaded_file(network_file, 'pcap', log_prefix="[UPDATE SCENARIO]"))
 
         # Process the uploaded Log files
         for jsonl_file in jsonl_files:
+            updated_files.append(store_uploaded_file(jsonl_file, 'jsonl', log_prefix="[UPDATE SCENARIO]"))
 
-            # Check if the file already exists in the database
-            existing = File.objects.filter(name=jsonl_file.name).first()
-
-            # If it exists, increment the reference count
-            if existing:
-                existing.references += 1
-                existing.save()
-                updated_files.append(existing)
-                logger.info(f"[UPDATE SCENARIO] Existing JSONL file found: {jsonl_file.name} (references updated to {existing.references})")
-
-            # If it does not exist, read the content and save it
-            else:
-                log_content = jsonl_file.read()
-                new_file = File.objects.create(
-                    name=jsonl_file.name,
-                    file_type='jsonl',
-                    entry_count=0,
-                    content=ContentFile(log_content, name=jsonl_file.name),
-                    references=1
-                )
-                updated_files.append(new_file)
-                logger.info(f"[UPDATE SCENARIO] New JSONL file saved: {jsonl_file.name}")
-
-        # Combine referenced files and updated files
+        # Combine referenced files and updated files (an upload replaces the record with its name)
         all_files_to_keep = {f.name: f for f in referenced_files + updated_files}
+        kept_pks = {f.pk for f in all_files_to_keep.values()}
 
-        # Remove files that are no longer referenced in the scenarios in the database
         current_files = list(scenario.files.all())
+        current_pks = {f.pk for f in current_files}
+
+        # Re-uploading a file the scenario already holds must not add a reference
+        for updated_file in updated_files:
+            if updated_file.pk in current_pks:
+                release_file(updated_file, log_prefix="[UPDATE SCENARIO]")
+
+        # Release the files that are no longer referenced or were replaced by an upload
         for old_file in current_files:
-            if old_file.name not in all_files_to_keep:
-                old_file.references -= 1
-                if old_file.references <= 0:
-                    file_path = os.path.join(settings.MEDIA_ROOT, old_file.content.name)
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                    old_file.delete()
-                else:
-                    old_file.save()
+            if old_file.pk not in kept_pks:
+                release_file(old_file, log_prefix="[UPDATE SCENARIO]")
 
         scenario.files.set(all_files_to_keep.values())
 
@@ -728,17 +936,7 @@ def delete_scenario_by_uuid(request, uuid):
 
         # Delete the scenario's files. If a file's reference count reaches zero, delete it from disk.
         for file_instance in scenario.files.all():
-            file_instance.references -= 1
-            if file_instance.references <= 0:
-                file_path = os.path.join(settings.MEDIA_ROOT, file_instance.content.name)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"[DELETE SCENARIO] Deleted file from disk: {file_path}")
-                file_instance.delete()
-                logger.info(f"[DELETE SCENARIO] File record deleted from DB: {file_instance.name}")
-            else:
-                file_instance.save()
-                logger.info(f"[DELETE SCENARIO] Decremented reference for file: {file_instance.name}")
+            release_file(file_instance, log_prefix="[DELETE SCENARIO]")
 
         # Find the scenario model associated with the scenario
         scenario_model = ScenarioModel.objects.filter(scenario=scenario).first()
@@ -759,7 +957,8 @@ def delete_scenario_by_uuid(request, uuid):
             'shap_global_images',
             'shap_local_images',
             'lime_global_images',
-            'lime_local_images'
+            'lime_local_images',
+            ANOMALY_RESULTS_DIR
         ]
 
         scenario_uuid = str(scenario.uuid)
@@ -778,6 +977,9 @@ def delete_scenario_by_uuid(request, uuid):
                     except Exception as e:
                         logger.warning(f"Can't be deleted {file_to_delete}: {str(e)}")
 
+        # Release the artifacts kept in memory for production sessions
+        model_registry.discard(scenario_uuid)
+
         # Finally, delete the scenario itself
         scenario.delete()
         logger.info(f"[DELETE SCENARIO] Scenario deleted successfully: {scenario.name} (UUID: {uuid})")
@@ -794,19 +996,21 @@ def delete_scenario_by_uuid(request, uuid):
 def run_scenario_by_uuid(request, uuid):
 
     """
-    Executes a scenario by UUID for the authenticated user.
+    Starts the execution of a scenario by UUID for the authenticated user.
 
     Behavior:
-        - Marks the scenario as "Running".
-        - Creates or reuses the associated scenario model.
-        - Parses and executes the scenario design using execute_scenario().
-        - Updates the scenario's status to "Finished" or "Error" depending on execution.
-        - Increments the user's executed scenario counter on success.
+        - Rejects the request if the scenario is already running or the user has
+          reached `MAX_CONCURRENT_RUNS_PER_USER` active runs.
+        - Marks the scenario as "Running" and creates a ScenarioRun with every node pending.
+        - Dispatches the run to Celery (when `CELERY_BROKER_URL` is set) or to a local
+          thread pool; progress is polled with get_scenario_run_status_by_uuid().
+        - Reuses the cached outputs of unchanged nodes unless `force` is true.
 
     Returns:
-        - 200 OK if execution completes successfully.
-        - 400 Bad Request if an error occurred during execution.
+        - 202 Accepted with the run id once the run is queued.
         - 404 Not Found if the scenario does not exist or does not belong to the user.
+        - 409 Conflict if the scenario is already running.
+        - 429 Too Many Requests if the user has too many active runs.
     """
 
     # Get the user from the request
@@ -815,57 +1019,273 @@ def run_scenario_by_uuid(request, uuid):
     try:
         # Fetch the scenario by UUID and user
         scenario = Scenario.objects.get(uuid=uuid, user=user)
+    
+    # Return error if the scenario does not exist or the user does not have permission to run it
+    except Scenario.DoesNotExist:
+        return JsonResponse({'error': 'Scenario not found or without permits to run it'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Retrieve the design from the scenario and parse it
+    design = scenario.design
+    if isinstance(design, str):  
+        design = json.loads(design)
+
+    with transaction.atomic():
+        # Lock the user row so concurrent requests see each other's runs
+        type(user).objects.select_for_update().get(pk=user.pk)
+
+        _expire_stale_runs(user)
+        active = ScenarioRun.objects.filter(scenario__user=user, status__in=ScenarioRun.STATUS_ACTIVE)
+
+        if active.filter(scenario=scenario).exists():
+            return JsonResponse({'error': 'The scenario is already running'}, status=status.HTTP_409_CONFLICT)
+
+        if active.count() >= settings.MAX_CONCURRENT_RUNS_PER_USER:
+            return JsonResponse(
+                {'error': f'You can run at most {settings.MAX_CONCURRENT_RUNS_PER_USER} scenarios at the same time'},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+
+        run = ScenarioRun.objects.create(
+            scenario=scenario,
+            nodes={e["id"]: {"type": e.get("type"), "state": "pending", "elapsed": 0.0} for e in design.get("elements", [])},
+        )
 
         # Set the scenario status to "Running"
         scenario.status = "Running"
-
-        # Save the scenario to update its status
         scenario.save()
 
-        logger.info(f"[RUN SCENARIO] Scenario status updated to 'Running'")
+        # Tracked before the user lock is released, so a concurrent request does not expire it
+        if not settings.CELERY_BROKER_URL:
+            _local_runs.add(run.id)
 
-        # Create or get the scenario model for this scenario
-        scenario_model, created = ScenarioModel.objects.get_or_create(scenario=scenario)
+    logger.info(f"[RUN SCENARIO] Scenario status updated to 'Running' (run {run.id})")
 
-        if created:
-            logger.info(f"[RUN SCENARIO] Created new ScenarioModel for scenario: {scenario.name}")
-        else:
-            logger.info(f"[RUN SCENARIO] Using existing ScenarioModel for scenario: {scenario.name}")
+    # A forced run ignores the cached outputs of unchanged nodes
+    force = str(request.data.get('force', request.query_params.get('force', 'false'))).strip().lower() == 'true'
 
-        # Retrieve the design from the scenario and parse it
-        design = scenario.design
-        if isinstance(design, str):  
-            design = json.loads(design)
+    transaction.on_commit(lambda: dispatch_scenario_run(run.id, force=force))
 
-        # Execute the scenario using the execute_scenario function
-        result = execute_scenario(scenario_model, scenario, design)
+    # Return the run id so the client can poll its progress
+    return JsonResponse({
+        'message': 'Scenario run queued',
+        'run_id': run.id,
+    }, status=status.HTTP_202_ACCEPTED)
 
-        # Return error response if the execution result indicates an error
-        if result.get('error'):
-            scenario.status = "Error"
-            scenario.save()
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_run_status_by_uuid(request, uuid):
+
+    """
+    Returns the progress of the latest execution of a scenario.
+
+    Returns:
+        - 200 OK with the run status, error, per-node progress and timestamps.
+        - 404 Not Found if the scenario does not exist, does not belong to the user
+          or has never been run.
+    """
+
+    # Get the user from the request
+    user = request.user
+
+    run = ScenarioRun.objects.filter(scenario__uuid=uuid, scenario__user=user).order_by('-created').first()
+    if run is None:
+        return JsonResponse({'error': 'No execution found for this scenario'}, status=status.HTTP_404_NOT_FOUND)
+
+    return JsonResponse({
+        'run_id': run.id,
+        'status': run.status,
+        'error': run.error,
+        'nodes': run.nodes,
+        'created': run.created,
+        'started': run.started,
+        'finished': run.finished,
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scenario_run_profile_by_uuid(request, uuid):
+
+    """
+    Returns the per-node profile of a scenario execution.
+
+    Query parameters:
+        - execution (optional): Execution number. Defaults to the latest run.
+
+    Returns:
+        - 200 OK with the execution number and, for every executed node, its wall and
+          CPU time, process peak RSS, rows in/out, artifact size and cache usage.
+        - 404 Not Found if the scenario does not exist, does not belong to the user
+          or has no matching execution.
+    """
+
+    # Get the user from the request
+    user = request.user
+
+    runs = ScenarioRun.objects.filter(scenario__uuid=uuid, scenario__user=user)
+
+    execution = request.query_params.get('execution')
+    if execution is not None:
+        try:
+            runs = runs.filter(execution=int(execution))
+        except ValueError:
+            return JsonResponse({'error': 'execution must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+    run = runs.order_by('-created').first()
+    if run is None:
+        return JsonResponse({'error': 'No execution found for this scenario'}, status=status.HTTP_404_NOT_FOUND)
+
+    return JsonResponse({
+        'run_id': run.id,
+        'execution': run.execution,
+        'status': run.status,
+        'profile': run.profile,
+    }, status=status.HTTP_200_OK)
+
+# Serializes the nodes that draw explanation images with pyplot
+_plot_lock = threading.Lock()
+
+# Local pool used to execute scenarios when no Celery broker is configured
+_run_pool = None
+_local_runs = set()
+
+def dispatch_scenario_run(run_id, force=False):
+    """
+    Sends a scenario run to Celery, or to the local thread pool if no broker is configured.
+
+    Local runs must already be in `_local_runs` (run_scenario_by_uuid adds them while
+    it holds the user lock).
+
+    Args:
+        run_id (int): Id of the ScenarioRun to execute.
+        force (bool, optional): Rerun every node instead of reusing cached outputs. Defaults to False.
+    """
+
+    global _run_pool
+
+    if settings.CELERY_BROKER_URL:
+        run_scenario_task.delay(run_id, force)
+        return
+
+    if _run_pool is None:
+        _run_pool = ThreadPoolExecutor(max_workers=settings.SCENARIO_RUN_WORKERS, thread_name_prefix="scenario-run")
+    _run_pool.submit(run_scenario_task, run_id, force)
+
+def _expire_stale_runs(user):
+    """
+    Marks as failed the active runs of a user that the local pool no longer knows about.
+
+    Without a Celery broker, runs live in this process, so queued or running entries
+    that it does not track were interrupted by a server restart.
 
+    Args:
+        user (CustomUser): Owner of the runs.
+    """
+
+    if settings.CELERY_BROKER_URL:
+        return
+
+    stale = ScenarioRun.objects.filter(
+        scenario__user=user, status__in=ScenarioRun.STATUS_ACTIVE
+    ).exclude(id__in=_local_runs)
+
+    for run in stale.select_related('scenario'):
+        logger.warning(f"[RUN SCENARIO] Run {run.id} was interrupted by a server restart")
+        run.status = "Error"
+        run.error = "Execution interrupted by a server restart"
+        run.finished = timezone.now()
+        run.save()
+        run.scenario.status = "Error"
+        run.scenario.save(update_fields=["status"])
+
+@shared_task
+def run_scenario_task(run_id, force=False):
+    """
+    Executes a queued ScenarioRun and records its outcome.
+
+    Behavior:
+        - Creates or reuses the associated scenario model.
+        - Executes the design with execute_scenario(), recording per-node progress.
+        - Updates the run and the scenario to "Finished" or "Error".
+        - Increments the user's executed scenario counter on success.
+
+    Args:
+        run_id (int): Id of the ScenarioRun to execute.
+        force (bool, optional): Rerun every node instead of reusing cached outputs. Defaults to False.
+    """
+
+    try:
+        run = ScenarioRun.objects.select_related('scenario__user').get(pk=run_id)
+        scenario = run.scenario
+        progress = ScenarioRunProgress(run)
+
+        run.status = "Running"
+        run.started = timezone.now()
+        run.save(update_fields=["status", "started"])
+
+        scenario_model = None
+        try:
+            # Create or get the scenario model for this scenario
+            scenario_model, created = ScenarioModel.objects.get_or_create(scenario=scenario)
+
+            if created:
+                logger.info(f"[RUN SCENARIO] Created new ScenarioModel for scenario: {scenario.name}")
+            else:
+                logger.info(f"[RUN SCENARIO] Using existing ScenarioModel for scenario: {scenario.name}")
+
+            design = scenario.design
+            if isinstance(design, str):  
+                design = json.loads(design)
+
+            # Execute the scenario using the execute_scenario function
+            result = execute_scenario(scenario_model, scenario, design, progress=progress, use_cache=not force)
+        except Exception as e:
+            result = {"error": str(e)}
+
+        run.finished = timezone.now()
+        if scenario_model is not None:
+            run.execution = scenario_model.execution
+
+        # Record the error if the execution result indicates one
+        if result.get('error'):
+            progress.fail()
+            run.status = scenario.status = "Error"
+            run.error = result['error']
             logger.warning(f"[RUN SCENARIO] Scenario execution failed: {result['error']}")
-            return JsonResponse(result, status=status.HTTP_400_BAD_REQUEST)
 
         # If execution was successful, update the scenario status and increment user's executed scenarios
-        scenario.status = 'Finished'
-        scenario.save()
-        user.number_executed_scenarios += 1
-        user.save()
-        logger.info(f"[RUN SCENARIO] Scenario execution finished successfully.")
+        else:
+            run.status = scenario.status = "Finished"
+            type(scenario.user).objects.filter(pk=scenario.user_id).update(
+                number_executed_scenarios=F('number_executed_scenarios') + 1
+            )
+            logger.info(f"[RUN SCENARIO] Scenario execution finished successfully.")
 
-        # Return success response
-        return JsonResponse({
-            'message': 'Scenario run successfully'
-        }, status=status.HTTP_200_OK)
+        run.save(update_fields=["status", "error", "finished", "execution"])
+        scenario.save(update_fields=["status"])
 
-    # Return error if the scenario does not exist or the user does not have permission to run it
-    except Scenario.DoesNotExist:
-        return JsonResponse({'error': 'Scenario not found or without permits to run it'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        logger.error(f"[RUN SCENARIO] Error running scenario run {run_id}: {str(e)}")
+
+    finally:
+        _local_runs.discard(run_id)
+        connection.close()
+
+@shared_task
+def prune_anomalies_task(retention_days=None, archive=None):
+    """
+    Celery entry point of the production anomaly retention job.
+
+    Schedule it with Celery beat (or run `manage.py prune_anomalies` from cron).
+    See `prune_production_anomalies` for the details.
+    """
+
+    try:
+        return prune_production_anomalies(retention_days=retention_days, archive=archive)
+    finally:
+        connection.close()
 
 @shared_task
-def execute_scenario(scenario_model, scenario, design):
+def execute_scenario(scenario_model, scenario, design, progress=None, use_cache=True):
     try:
 
         logger.info(f"[EXECUTE SCENARIO] Starting execution for scenario: {scenario.name} (UUID: {scenario.uuid})")
@@ -941,22 +1361,48 @@ def execute_scenario(scenario_model, scenario, design):
         data_storage = {} 
         models = {}
 
-        # Process each element in the sorted order
-        for element_id in sorted_order:
+        # Outputs are freed once every downstream consumer has run
+        remaining_consumers = count_node_consumers(connections)
+
+        # Optional dtype compaction of the intermediate DataFrames
+        compact_outputs = settings.COMPACT_DTYPES
+
+        # Consumer counts are shared by nodes running in parallel
+        consumers_lock = threading.Lock()
+
+        # Cache keys of the executed nodes (None for nodes that are not cacheable)
+        node_keys = {}
+
+        # Nodes connected to each node, used to collect the preprocessing steps of a model
+        prev_map = defaultdict(list)
+        for conn in connections:
+            prev_map[conn["endId"]].append(conn["startId"])
+
+        def compute_node(element_id):
+            """
+            Computes the output of one element of the design into `data_storage` and `models`.
+
+            Returns:
+                dict or None: An error dict if the element failed, None otherwise.
+            """
+
             element = elements[element_id]
             el_type = element["type"]
-            logger.info(f"[EXECUTE SCENARIO] Processing element: {el_type} (ID: {element_id})")
 
             # Get the parameters for the element, defaulting to an empty dict if not present
             params = copy.deepcopy(element.get("parameters", {}))
             
             input_data = None
+            predecessor_id = None
             for conn in connections:
                 if conn["endId"] == element_id:
                     predecessor_id = conn["startId"]
                     input_data = data_storage.get(predecessor_id)
                     break 
 
+            # The input can be modified in place when no other node will read it
+            sole_consumer = predecessor_id is not None and remaining_consumers.get(predecessor_id) == 1
+
             # Case element type is CSV
             if el_type == "CSV":
                 logger.info("[EXECUTE SCENARIO] Processing CSV element")
@@ -964,14 +1410,6 @@ def execute_scenario(scenario_model, scenario, design):
                 # Get the CSV file name from parameters
                 csv_file_name = params.get("csvFileName")
 
-                # Get the file from the database
-                try:
-                    file = File.objects.get(name=csv_file_name)
-                    df = pd.read_csv(file.content)
-                except Exception as e:
-                    logger.error(f"[EXECUTE SCENARIO] Error loading CSV file: {str(e)}")
-                    return {"error": f"Error loading CSV: {str(e)}"}
-                
                 # Get the columns to keep from parameters
                 columns = params.get("columns", [])
                 selected_columns = []
@@ -983,10 +1421,17 @@ def execute_scenario(scenario_model, scenario, design):
                     selected_columns = [col for col, keep in columns.items() if keep]
                 
                 logger.info(f"[EXECUTE SCENARIO] Selected columns: {selected_columns}")
+
+                # Get the file from the database
+                try:
+                    file = get_scenario_file(scenario, csv_file_name)
+                except Exception as e:
+                    logger.error(f"[EXECUTE SCENARIO] Error loading CSV file: {str(e)}")
+                    return {"error": f"Error loading CSV: {str(e)}"}
                 
                 try:
-                    # Generate a dataframe with the selected columns
-                    df = df[selected_columns]
+                    # Load only the selected columns from the columnar copy of the CSV (built on first use)
+                    df = extract_features_cached(file.content.path, "csv", read_csv_columnar, columns=selected_columns)
                 except KeyError as e:
                     logger.error(f"[EXECUTE SCENARIO] Column not found in CSV: {str(e)}")
                     return {"error": f"Column not found in the CSV: {str(e)}"}
@@ -1014,16 +1459,17 @@ def execute_scenario(scenario_model, scenario, design):
 
                 # Check if the file exists in the database
                 try:
-                    file = File.objects.get(name=network_file_name)
-                    with open(file.content.path, 'rb') as f:
-                        # Extract features from the PCAP file based on the analysis mode
-                        if analysis_mode == "flow":
-                            logger.info("[EXECUTE SCENARIO] Extracting features by flow")
-                            df = extract_features_by_flow_from_pcap(f)
-                        else:
-                            logger.info("[EXECUTE SCENARIO] Extracting features by packet")
-                            df = extract_features_by_packet_from_pcap(f)
-                    logger.info(f"[EXECUTE SCENARIO] Extracted DataFrame: {df.head()}")
+                    file = get_scenario_file(scenario, network_file_name)
+                    extractor = extract_features_by_flow_from_pcap if analysis_mode == "flow" else extract_features_by_packet_from_pcap
+
+                    def extract_pcap(path):
+                        with open(path, 'rb') as f:
+                            return extractor(f)
+
+                    # Extract features from the PCAP file based on the analysis mode (cached by content hash)
+                    logger.info(f"[EXECUTE SCENARIO] Extracting features by {'flow' if analysis_mode == 'flow' else 'packet'}")
+                    df = extract_features_cached(file.content.path, "flow" if analysis_mode == "flow" else "packet", extract_pcap)
+                    logger.debug("[EXECUTE SCENARIO] Extracted DataFrame: %s", df.head())
                 
                 # Handle errors when loading the PCAP file
                 except Exception as e:
@@ -1046,26 +1492,27 @@ def execute_scenario(scenario_model, scenario, design):
 
                 try:
 
-                    file = File.objects.get(name=jsonl_file_name)
+                    file = get_scenario_file(scenario, jsonl_file_name)
                     file_path = file.content.path
 
-                    # Si el archivo contiene SOLO JSON por línea, esto basta:
-                    # df = pd.read_json(file_path, lines=True)
+                    def parse_jsonl(path):
+                        # Streaming parse into typed columns of the fixed syscall schema
+                        parsed, counts = load_syscall_jsonl(path)
+                        logger.info(
+                            f"[EXECUTE SCENARIO] JSONL lines: {counts['lines']}, "
+                            f"parsed: {counts['parsed']}, skipped: {counts['skipped']}"
+                        )
+                        return parsed
 
-                    # Versión robusta por si hubiera líneas no-JSON (se filtran):
-                    with open(file_path, "r", encoding="utf-8", errors="replace") as fh:
-                        only_json = "".join(line for line in fh if line.lstrip().startswith("{"))
-                    df = pd.read_json(io.StringIO(only_json), lines=True)
+                    # Parsed records are cached by content hash; rolling features are derived on top
+                    df = extract_features_cached(file_path, "jsonl", parse_jsonl)
 
-                    # (Opcional) asegurar orden de columnas si lo quieres fijo:
-                    expected_cols = [
-                        "window_start_ns","window_end_ns","read","write","openat","close","fstat",
-                        "mmap","mprotect","munmap","brk","rt_sigaction","rt_sigprocmask","ioctl",
-                        "poll","select","futex","nanosleep","sched_yield","total_syscalls"
-                    ]
-                    df = df.reindex(columns=expected_cols)
+                    # Append rolling multi-resolution features (same values as the live ring buffer)
+                    if str(params.get("rollingFeatures", "False")).strip().lower() == "true":
+                        df = add_rolling_syscall_features(df)
+                        logger.info("[EXECUTE SCENARIO] Rolling syscall features added")
 
-                    logger.info(df)
+                    logger.debug("[EXECUTE SCENARIO] JSONL DataFrame:\n%s", df)
 
                     # Ahora 'df' es el DataFrame que querías
                     logger.info(f"[EXECUTE SCENARIO] DataFrame shape: {df.shape}")
@@ -1111,7 +1558,7 @@ def execute_scenario(scenario_model, scenario, design):
                             raise ValueError(f"Error de tipo: {el_type} conectado a modelo {model_type}")
 
                         model_data = models.get(model_id)
-                        logger.info(f"[EXECUTE SCENARIO] Model data: {model_data}")
+                        logger.debug("[EXECUTE SCENARIO] Model data: %s", model_data)
 
                         if model_data:
                             # Calculate metrics based on the model type
@@ -1157,7 +1604,8 @@ def execute_scenario(scenario_model, scenario, design):
                     X_train, X_test, y_train, y_test = train_test_split(
                         X, y,
                         train_size=train_size,
-                        test_size=test_size
+                        test_size=test_size,
+                        random_state=splitter_params.get("random_state")
                     )
                     
 
@@ -1167,7 +1615,7 @@ def execute_scenario(scenario_model, scenario, design):
                         "test": (X_test, y_test)
                     }
 
-                    logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                    logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                 # Return error if there is an issue with the DataSplitter
                 except Exception as e:
@@ -1214,12 +1662,12 @@ def execute_scenario(scenario_model, scenario, design):
                     if isinstance(output_data, pd.DataFrame):
                         logger.info("CustomCode detected as processing function")
                         data_storage[element_id] = output_data
-                        logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                        logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                     elif isinstance(output_data, dict) and "train" in output_data and "test" in output_data:
                         logger.info("CustomCode detected as splitter function")
                         data_storage[element_id] = output_data
-                        logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                        logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                     else:
                         return {"error": "The function must return a DataFrame or a dict with 'train' and 'test' keys"}
@@ -1255,6 +1703,10 @@ def execute_scenario(scenario_model, scenario, design):
                     transformer = cls(**extract_parameters(element_def["properties"], params))
                     
                     if input_data is not None:
+                        # Other nodes may read the same input, so target columns are popped from a view
+                        if not sole_consumer:
+                            input_data = input_data.copy(deep=False)
+
                         '''
                         for col in input_data.columns:
                             if input_data[col].dtype == 'object':
@@ -1283,16 +1735,18 @@ def execute_scenario(scenario_model, scenario, design):
                                 logger.info(f"[EXECUTE SCENARIO] [TRAINING] Columns used for fitting in {el_type}: {numeric_cols}")
                                 
                                 transformed = transformer.fit_transform(input_data[numeric_cols])
-                                output_data = input_data.copy()
+                                output_data = input_data if sole_consumer else input_data.copy()
                                 output_data[numeric_cols] = transformed
 
 
                             elif applies_to == "categorical":
                                 categorical_cols = input_data.select_dtypes(exclude=['number']).columns
-                                output_data = pd.get_dummies(input_data, columns=categorical_cols)
+                                # The fitted vocabulary is saved as the step, so live rows get the same columns
+                                transformer = FixedVocabularyEncoder()
+                                output_data = transformer.fit_transform(input_data, categorical_cols)
 
                             else:  
-                                output_data = input_data.copy()
+                                output_data = input_data if sole_consumer else input_data.copy()
                                 output_data[input_data.columns] = transformer.fit_transform(input_data)
 
                             for col_name, col_data in original_targets.items():
@@ -1306,13 +1760,15 @@ def execute_scenario(scenario_model, scenario, design):
                                 logger.info(f"[EXECUTE SCENARIO] [TRAINING] Columns used for fitting in {el_type}: {numeric_cols}")
                                 
                                 transformed = transformer.fit_transform(input_data[numeric_cols])
-                                output_data = input_data.copy()
+                                output_data = input_data if sole_consumer else input_data.copy()
                                 output_data[numeric_cols] = transformed
 
 
                             elif applies_to == "categorical":
                                 categorical_cols = input_data.select_dtypes(exclude=['number']).columns
-                                output_data = pd.get_dummies(input_data, columns=categorical_cols)
+                                # The fitted vocabulary is saved as the step, so live rows get the same columns
+                                transformer = FixedVocabularyEncoder()
+                                output_data = transformer.fit_transform(input_data, categorical_cols)
 
                             else:
                                 output_data = pd.DataFrame(
@@ -1324,17 +1780,15 @@ def execute_scenario(scenario_model, scenario, design):
                         model_dir = os.path.join(settings.MEDIA_ROOT, 'models_storage')
                         os.makedirs(model_dir, exist_ok=True)
                         step_path = os.path.join(model_dir, f"{step_id}.pkl")
-                        joblib.dump(model, step_path)
-
-                        joblib.dump(transformer, step_path)
+                        dump_artifact(transformer, step_path)
                         logger.info(f"Saved: {step_path}")
 
                         # Store the transformed data in the data storage
                         data_storage[element_id] = output_data
-                        logger.info(f"[EXECUTE SCENARIO] Initial input data: {input_data.head()}")
-                        logger.info(f"[EXECUTE SCENARIO] Transformed output data: {output_data.head()}")
+                        logger.debug("[EXECUTE SCENARIO] Initial input data: %s", input_data.head())
+                        logger.debug("[EXECUTE SCENARIO] Transformed output data: %s", output_data.head())
 
-                        logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                        logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                 # Case category is model and input data is available
                 elif category == "model" and input_data is not None:
@@ -1454,8 +1908,8 @@ def execute_scenario(scenario_model, scenario, design):
                         # Case the model is a classic model
                         else:
                             logger.info(f"[EXECUTE SCENARIO] Training classic model: {el_type}")
-                            logger.info(f"[EXECUTE SCENARIO] Concatenated training data:\n{X_train_concat}")
-                            logger.info(f"[EXECUTE SCENARIO] Concatenated testing data:\n{X_test_concat}")
+                            logger.debug("[EXECUTE SCENARIO] Concatenated training data:\n%s", X_train_concat)
+                            logger.debug("[EXECUTE SCENARIO] Concatenated testing data:\n%s", X_test_concat)
 
 
                             # Fit the model with the concatenated training data
@@ -1476,7 +1930,7 @@ def execute_scenario(scenario_model, scenario, design):
                             # Store the concatenated training data
                             data_storage[element_id] = X_train_concat
 
-                            logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                            logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                     # Case the model is an anomaly detection model
                     elif element_def.get("model_type") == "anomalyDetection":
@@ -1511,7 +1965,7 @@ def execute_scenario(scenario_model, scenario, design):
                         if input_copy.empty:
                             return {"error": "There are no numerical columns after preprocessing"}
                         
-                        logger.info(f"[EXECUTE SCENARIO] Preprocessed data for anomaly detection:\n{input_copy}")
+                        logger.debug("[EXECUTE SCENARIO] Preprocessed data for anomaly detection:\n%s", input_copy)
 
                         # Fit the model with the input data
                         model.fit(input_copy)
@@ -1523,27 +1977,27 @@ def execute_scenario(scenario_model, scenario, design):
                         os.makedirs(model_dir, exist_ok=True)
                         step_path = os.path.join(model_dir, f"{step_id}.pkl")
 
-                        joblib.dump({
+                        # Predict anomalies
+                        predictions = model.predict(input_copy)
+                        y_pred = [1 if x == -1 else 0 for x in predictions]
+                        logger.debug("[EXECUTE SCENARIO] Predictions: %s", y_pred)
+
+                        # The training data is stored apart (memory-mapped in production) and the
+                        # bundle only keeps a summarized background for the explainers
+                        save_training_data(input_copy, step_path)
+                        dump_artifact({
                             "model": model,
-                            "X_train": input_copy
+                            "feature_names": list(input_copy.columns),
+                            "background": summarize_background(input_copy, labels=y_pred),
+                            "compiled": compile_model(model, input_copy) if settings.COMPILE_PIPELINES else None,
+                            # Preprocessing steps compiled once here instead of at every production session
+                            "stages": compile_steps(collect_pipeline_steps(elements, prev_map, element_id, scenario.uuid, model_dir)),
                         }, step_path)
 
                         logger.info(f"[EXECUTE SCENARIO] Model saved at: {step_path}")
 
-                        # Predict anomalies
-                        predictions = model.predict(input_copy)
-                        y_pred = [1 if x == -1 else 0 for x in predictions]
-                        logger.info(f"[EXECUTE SCENARIO] Predictions: {y_pred}")
-
                         # Save anomaly metrics
-                        for column in input_copy.columns:
-                            feature_values = input_copy[column].values
-                            anomalies = [i for i, (val, pred) in enumerate(zip(feature_values, y_pred)) if pred == 1]
-
-                            save_anomaly_metrics(scenario_model, el_type, column, feature_values, anomalies, 
-                                                 scenario_model.execution, production=False, anomaly_details=None,
-                                                 global_shap_images=[], local_shap_images=[], global_lime_images=[], 
-                                                 local_lime_images=[])
+                        save_training_anomaly_metrics(scenario_model, el_type, input_copy, y_pred, scenario_model.execution)
 
                         # Store the model and results
                         models[element_id] = {
@@ -1556,7 +2010,7 @@ def execute_scenario(scenario_model, scenario, design):
                         # Store the input data for future use
                         data_storage[element_id] = input_copy
 
-                        logger.info(f"[EXECUTE SCENARIO] Current data storage: {data_storage}")
+                        logger.debug("[EXECUTE SCENARIO] Current data storage: %s", data_storage)
 
                         logger.info(f"[EXECUTE SCENARIO] Anomaly detection model trained and saved")
 
@@ -1568,7 +2022,7 @@ def execute_scenario(scenario_model, scenario, design):
                     if input_data is None:
                         return {"error": f"No input data found for node {el_type}"}
                     
-                    logger.info(f"[EXECUTE SCENARIO] Input data for explainability: {input_data}")
+                    logger.debug("[EXECUTE SCENARIO] Input data for explainability: %s", input_data)
 
                     # Get the parameters for the explainer
                     explainer_type = params.get("explainer_type", "").strip()
@@ -1619,7 +2073,7 @@ def execute_scenario(scenario_model, scenario, design):
                             elif input_data is None:
                                 return {"error": f"No input data found for node {el_type}"}
 
-                            logger.info(f"[EXECUTE SCENARIO] Calculating SHAP values with data: {input_data}")
+                            logger.debug("[EXECUTE SCENARIO] Calculating SHAP values with data: %s", input_data)
 
                             background_size = 50
                             explain_size = 200 
@@ -2137,6 +2591,155 @@ def execute_scenario(scenario_model, scenario, design):
                     except Exception as e:
                         return {"error": f"Failed to apply explainer '{explainer_type}' on '{el_type}': {str(e)}"}
 
+        def run_node(element_id):
+            """
+            Executes one element of the design, reusing its cached output when it is unchanged.
+
+            Returns:
+                dict or None: An error dict if the element failed, None otherwise.
+            """
+
+            element = elements[element_id]
+            el_type = element["type"]
+            logger.info(f"[EXECUTE SCENARIO] Processing element: {el_type} (ID: {element_id})")
+
+            if progress is not None:
+                progress.start(element_id, el_type)
+
+            profiler = NodeProfiler(rows_in=sum(count_output_rows(data_storage.get(p)) for p in predecessors[element_id]))
+            started_at = time.time()
+
+            node_key = cache_key_for(element_id)
+            node_keys[element_id] = node_key
+            category = element_types.get(el_type, {}).get("category", "")
+            cacheable = node_key is not None and (el_type in CACHED_NODE_TYPES or category in ("preprocessing", "model"))
+
+            # Preprocessing and anomaly detection nodes also write an artifact used in production
+            artifact_path = os.path.join(settings.MEDIA_ROOT, 'models_storage', f"{element_id}_{scenario.uuid}.pkl")
+
+            cached = load_node_output(node_key, artifact_path) if cacheable and use_cache else None
+            if cached is not None:
+                logger.info(f"[EXECUTE SCENARIO] Reusing cached output of element {el_type} (ID: {element_id})")
+                if cached["data"] is not None:
+                    data_storage[element_id] = cached["data"]
+                if cached["model"] is not None:
+                    models[element_id] = cached["model"]
+
+                    # Training anomalies are saved again for this execution
+                    if el_type in anomaly_types:
+                        save_training_anomaly_metrics(scenario_model, el_type, cached["model"]["X_train"],
+                                                      cached["model"]["y_pred"], scenario_model.execution)
+            else:
+                result = compute_node(element_id)
+                if result:
+                    return result
+
+                if cacheable:
+                    written = os.path.exists(artifact_path) and os.path.getmtime(artifact_path) >= started_at
+                    try:
+                        save_node_output(node_key, {"data": data_storage.get(element_id), "model": models.get(element_id)},
+                                         artifact_path if written else None)
+                    except Exception as e:
+                        logger.warning(f"[EXECUTE SCENARIO] Output of element {element_id} could not be cached: {str(e)}")
+
+            # Compact the DataFrame produced by data and preprocessing nodes
+            if compact_outputs and element_id not in models and isinstance(data_storage.get(element_id), pd.DataFrame):
+                data_storage[element_id] = compact_dataframe(data_storage[element_id])
+
+            written = os.path.exists(artifact_path) and os.path.getmtime(artifact_path) >= started_at
+            profile = profiler.stop(
+                rows_out=count_output_rows(data_storage.get(element_id)),
+                artifact_path=artifact_path if written else None,
+                cached=cached is not None,
+            )
+            logger.info(f"[EXECUTE SCENARIO] Element {el_type} (ID: {element_id}) profile: {profile}")
+
+            # Free the outputs of the predecessors whose consumers have all run
+            with consumers_lock:
+                for source_id in predecessors[element_id]:
+                    remaining_consumers[source_id] -= 1
+                    if remaining_consumers[source_id] == 0:
+                        data_storage.pop(source_id, None)
+                        models.pop(source_id, None)
+                        logger.debug(f"[EXECUTE SCENARIO] Released output of element {source_id}")
+
+                # Nodes without consumers do not need to keep their output
+                if not remaining_consumers.get(element_id):
+                    data_storage.pop(element_id, None)
+                    models.pop(element_id, None)
+
+            if progress is not None:
+                progress.finish(element_id, profile)
+
+        def run_node_in_pool(element_id):
+            # Explainability nodes draw with pyplot, which is not thread-safe
+            try:
+                if element_types.get(elements[element_id]["type"], {}).get("category") == "explainability":
+                    with _plot_lock:
+                        return run_node(element_id)
+                return run_node(element_id)
+            finally:
+                connection.close()
+
+        def cache_key_for(element_id):
+            # The key covers the scenario, the node, the keys of its inputs and, for data nodes,
+            # the file content. Unseeded random nodes have no key, so neither do their descendants
+            element = elements[element_id]
+            if not node_is_deterministic(element, element_types.get(element["type"])):
+                return None
+
+            upstream = []
+            for conn in connections:
+                if conn["endId"] == element_id:
+                    if node_keys.get(conn["startId"]) is None:
+                        return None
+                    upstream.append([conn.get("startOutput"), node_keys[conn["startId"]]])
+
+            file_hash = None
+            file_param = DATA_NODE_FILE_PARAMS.get(element["type"])
+            if file_param:
+                try:
+                    file_hash = scenario_file_hash(scenario, element.get("parameters", {}).get(file_param))
+                except Exception:
+                    return None
+
+            return node_cache_key(element, element_types.get(element["type"]), upstream, file_hash, scenario.uuid)
+
+        predecessors = {node: {conn["startId"] for conn in connections if conn["endId"] == node} for node in sorted_order}
+        workers = max(1, settings.SCENARIO_NODE_WORKERS)
+
+        # Process each element in the sorted order
+        if workers == 1:
+            for element_id in sorted_order:
+                result = run_node(element_id)
+                if result:
+                    return result
+
+        # Process every element as soon as all its predecessors have finished
+        else:
+            logger.info(f"[EXECUTE SCENARIO] Running independent branches with {workers} workers")
+
+            waiting = list(sorted_order)
+            running = {}
+            done = set()
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scenario-node") as pool:
+                while waiting or running:
+                    ready = [node for node in waiting if predecessors[node] <= done]
+                    for node in ready:
+                        waiting.remove(node)
+                        running[pool.submit(run_node_in_pool, node)] = node
+
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        node = running.pop(future)
+                        result = future.result()
+                        if result:
+                            # Nodes not started yet are skipped; running ones finish before returning
+                            for pending in running:
+                                pending.cancel()
+                            return result
+                        done.add(node)
+
         return {"message": "Execution successful"}
 
     except Exception as e:
@@ -2214,11 +2817,48 @@ def play_scenario_production_by_uuid(request, uuid):
                     )
                     break
             logger.info(f"[PRODUCTION EXECUTION] Analysis mode detected: {analysis_mode}")
+
+            # Optional protocol scope pushed down to the kernel as a BPF filter, and the
+            # packet decoder (tshark dissection or the in-process pcap stream decoder)
+            capture_protocols = None
+            packet_source = "tshark"
+            for element in design.get("elements", []):
+                if element.get("type") == "Network":
+                    network_params = element.get("parameters", {})
+                    scope = str(network_params.get("captureProtocols", "all")).strip().lower()
+                    capture_protocols = None if scope in ("", "all") else scope.split("+")
+                    source = str(network_params.get("packetSource", "tshark")).strip().lower()
+                    packet_source = source if source in ("tshark", "dumpcap") else "tshark"
+                    break
+            logger.info(f"[PRODUCTION EXECUTION] Packet source: {packet_source}")
         else:
             # For JSONL source, we map to "syscalls" in this branch
             analysis_mode = "syscalls"
             logger.info(f"[PRODUCTION EXECUTION] Analysis mode detected: {analysis_mode}")
 
+            # Optional per-process windows (keyed by pid or comm, top-K busiest processes)
+            syscall_key = None
+            syscall_top_k = 10
+            for element in design.get("elements", []):
+                if element.get("type") == "JSONL":
+                    jsonl_params = element.get("parameters", {})
+                    process_key = str(jsonl_params.get("processKey", "none")).strip().lower()
+                    syscall_key = process_key if process_key in ("pid", "comm") else None
+                    try:
+                        syscall_top_k = int(jsonl_params.get("topK", 10))
+                    except (TypeError, ValueError):
+                        syscall_top_k = 10
+                    break
+            logger.info(f"[PRODUCTION EXECUTION] Syscall process key: {syscall_key} (top {syscall_top_k})")
+
+        # Optional feature agent on the host (compact columnar batches instead of the raw capture)
+        use_agent = False
+        for element in design.get("elements", []):
+            if element.get("type") == source_type:
+                use_agent = str(element.get("parameters", {}).get("featureAgent", "False")).strip().lower() == "true"
+                break
+        logger.info(f"[PRODUCTION EXECUTION] Feature agent: {use_agent}")
+
         # 5) Build pipelines from design (returns List[PipelineDef])
         scenario_model = ScenarioModel.objects.get(scenario=scenario)
         execution = scenario_model.execution
@@ -2293,9 +2933,15 @@ def play_scenario_production_by_uuid(request, uuid):
                 interface=interface,
                 sudo=True,
             )
+            # Capture filter and snaplen derived from the features the pipelines use
+            capture_filter, snaplen = derive_capture_pushdown(pipelines, protocols=capture_protocols)
             cap = CaptureConfig(
                 mode=analysis_mode,  # "flow" or "packet"
-                run_env="docker"
+                run_env="docker",
+                capture_filter=capture_filter,
+                snaplen=snaplen,
+                agent=use_agent,
+                packet_source=packet_source
             )
         else:
             # Syscalls mode with bpftrace
@@ -2310,7 +2956,10 @@ def play_scenario_production_by_uuid(request, uuid):
             cap = CaptureConfig(
                 mode=analysis_mode,  # "syscalls"
                 run_env="docker",
-                bpftrace_script_path = user_config.bpftrace_script_path or ""
+                bpftrace_script_path = user_config.bpftrace_script_path or "",
+                syscall_key=syscall_key,
+                syscall_top_k=syscall_top_k,
+                agent=use_agent
             )
 
         # 8) Application-level callbacks (they know about Scenario, DB, etc.)
@@ -2460,7 +3109,10 @@ def delete_anomaly(request, uuid, anomaly_id):
                 except Exception as e:
                     logger.warning(f"[DELETE ANOMALY] Could not delete {full_path_shap}: {str(e)}")
 
-        # Delete the anomaly metric
+        # Delete the anomaly metric and remove it from the rollups
+        if anomaly.production:
+            description = anomaly.anomalies.get('anomaly_indices') if isinstance(anomaly.anomalies, dict) else None
+            update_anomaly_rollups(scenario_model, anomaly.model_name, description, date=anomaly.date, delta=-1)
         anomaly.delete()
 
         logger.info(f"[DELETE ANOMALY] Anomaly ID {anomaly_id} deleted from database.")
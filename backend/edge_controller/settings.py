@@ -206,4 +206,33 @@ EMAIL_PORT = config("EMAIL_PORT", cast=str, default='587')
 EMAIL_HOST_USER = config("EMAIL_HOST_USER", cast=str, default=None)
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD", cast=str, default=None)
 EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool, default=True)
-EMAIL_USE_SSL = config("EMAIL_USE_SSL", cast=bool, default=False)
\ No newline at end of file
+EMAIL_USE_SSL = config("EMAIL_USE_SSL", cast=bool, default=False)
+
+# Scenario executions
+# Runs are sent to Celery when a broker is configured, otherwise to a local thread pool
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", cast=str, default=None)
+SCENARIO_RUN_WORKERS = config("SCENARIO_RUN_WORKERS", cast=int, default=2)
+MAX_CONCURRENT_RUNS_PER_USER = config("MAX_CONCURRENT_RUNS_PER_USER", cast=int, default=1)
+# Threads used to run independent branches of a design in parallel (1 = sequential, the default)
+SCENARIO_NODE_WORKERS = config("SCENARIO_NODE_WORKERS", cast=int, default=1)
+
+# Downcast numeric columns and categorize repetitive text columns of intermediate results
+COMPACT_DTYPES = config("COMPACT_DTYPES", cast=bool, default=False)
+
+# Maximum size of the cache of node outputs reused by unchanged parts of a design
+NODE_CACHE_MAX_BYTES = config("NODE_CACHE_MAX_BYTES", cast=int, default=2 * 1024 ** 3)
+
+# Maximum size of the model artifacts kept in memory for production sessions
+MODEL_REGISTRY_MAX_BYTES = config("MODEL_REGISTRY_MAX_BYTES", cast=int, default=1024 ** 3)
+
+# Background given to SHAP/LIME in production: k-means centroids ('kmeans') or a stratified 'sample'
+EXPLAINER_BACKGROUND_SIZE = config("EXPLAINER_BACKGROUND_SIZE", cast=int, default=100)
+EXPLAINER_BACKGROUND_METHOD = config("EXPLAINER_BACKGROUND_METHOD", cast=str, default="kmeans")
+
+# Export trained models to a compiled backend (NumPy, or ONNX when installed) for live scoring
+COMPILE_PIPELINES = config("COMPILE_PIPELINES", cast=bool, default=True)
+
+# Retention of production anomalies (see the prune_anomalies command)
+ANOMALY_RETENTION_DAYS = config("ANOMALY_RETENTION_DAYS", cast=int, default=30)
+ANOMALY_ARCHIVE = config("ANOMALY_ARCHIVE", cast=bool, default=True)
+ANOMALY_ROLLUP_RETENTION_DAYS = config("ANOMALY_ROLLUP_RETENTION_DAYS", cast=int, default=365)
@@ -0,0 +1,159 @@
+"""Container-side helpers for the host feature agent (command builder and frame decoder)."""
+
+import shlex
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List
+
+import numpy as np
+
+from .capture_config import CaptureConfig
+from .ssh_config import SSHConfig
+from .syscall_features import SYSCALL_COLUMNS
+
+# Header of every frame written by feature_agent.py: magic + uint32 payload length
+FRAME_MAGIC = b"NAB1"
+_HEADER = struct.Struct("<4sI")
+
+# Dtype codes used in the frames (array module codes) and their NumPy equivalents
+_DTYPES = {b"q": np.dtype("<i8"), b"d": np.dtype("<f8"), b"I": np.dtype("<u4")}
+
+# Dictionary-encoded text column: words followed by uint32 codes
+_TEXT = b"S"
+
+_AGENT_SOURCE = Path(__file__).with_name("feature_agent.py")
+
+
+def build_agent_cmd(ssh: SSHConfig, capture: CaptureConfig) -> List[str]:
+    """
+    Builds the command that starts the feature agent for the configured capture mode.
+
+    In docker mode the agent source is sent inline to the host with
+    `ssh user@host python3 -c <source>`, so nothing has to be installed there;
+    the bpftrace script of syscalls mode is read here and sent inline the same way.
+    In host mode the agent file is executed directly with `python3`.
+
+    Args:
+        ssh (SSHConfig): SSH configuration (host, username, interface, binary paths, sudo).
+        capture (CaptureConfig): Capture configuration (mode, run_env, extra_args, script path).
+
+    Returns:
+        List[str]: The command as a list of arguments for `subprocess.Popen`.
+
+    Raises:
+        ValueError: If the capture mode or `run_env` is not supported.
+        OSError: If the bpftrace script cannot be read in docker mode.
+    """
+
+    mode = capture.mode.strip().lower()
+    if mode not in ("packet", "flow", "syscalls"):
+        raise ValueError(f"Capture mode not supported: {capture.mode!r}")
+    run_env = capture.run_env.lower()
+    if run_env not in ("docker", "host"):
+        raise ValueError(f"run_env unknown: {capture.run_env} (Expected 'docker' o 'host')")
+
+    args = [
+        "--mode", mode,
+        "--interface", ssh.interface,
+        "--tshark", ssh.tshark_path,
+        "--dumpcap", getattr(ssh, "dumpcap_path", "/usr/bin/dumpcap"),
+        "--bpftrace", ssh.bpftrace_path,
+        "--interval", str(capture.agent_interval),
+    ]
+    if mode != "syscalls" and capture.capture_filter:
+        args += ["--filter", capture.capture_filter]
+    if mode != "syscalls" and capture.snaplen:
+        args += ["--snaplen", str(int(capture.snaplen))]
+    if mode == "syscalls":
+        # The script lives next to the backend, so in docker mode its text is sent instead of its path
+        if run_env == "docker" and capture.bpftrace_script_path:
+            args += ["--program", Path(capture.bpftrace_script_path).read_text(encoding="utf-8")]
+        else:
+            args += ["--script", capture.bpftrace_script_path or ""]
+        args += ["--columns", ",".join(SYSCALL_COLUMNS)]
+    if capture.extra_args:
+        args += ["--", *capture.extra_args]
+
+    prefix = ["sudo", "-n"] if ssh.sudo else []
+
+    if run_env == "docker":
+        remote = prefix + ["python3", "-c", _AGENT_SOURCE.read_text(encoding="utf-8")] + args
+        return ["ssh", f"{ssh.username}@{ssh.host}", " ".join(shlex.quote(x) for x in remote)]
+    return prefix + ["python3", str(_AGENT_SOURCE)] + args
+
+
+def decode_batch(payload: bytes) -> Dict[str, np.ndarray]:
+    """
+    Decodes the compressed payload of one agent frame into NumPy columns.
+
+    Args:
+        payload (bytes): Frame payload (without the 8-byte header).
+
+    Returns:
+        Dict[str, np.ndarray]: One array per feature column, in the order sent by the agent.
+        Text columns are object arrays (None for empty values).
+
+    Raises:
+        ValueError: If the payload is malformed or uses an unknown dtype code.
+    """
+
+    raw = zlib.decompress(payload)
+    nrows, ncols = struct.unpack_from("<IH", raw, 0)
+    offset = 6
+
+    columns: Dict[str, np.ndarray] = {}
+    for _ in range(ncols):
+        name_len = raw[offset]
+        name = raw[offset + 1:offset + 1 + name_len].decode("utf-8")
+        offset += 1 + name_len
+        code = raw[offset:offset + 1]
+        offset += 1
+        if code == _TEXT:
+            (nwords,) = struct.unpack_from("<I", raw, offset)
+            offset += 4
+            words = []
+            for _ in range(nwords):
+                (word_len,) = struct.unpack_from("<H", raw, offset)
+                words.append(raw[offset + 2:offset + 2 + word_len].decode("utf-8") or None)
+                offset += 2 + word_len
+            codes = np.frombuffer(raw, dtype=_DTYPES[b"I"], count=nrows, offset=offset)
+            columns[name] = np.array(words, dtype=object)[codes]
+            offset += nrows * 4
+            continue
+        if code not in _DTYPES:
+            raise ValueError(f"Unknown dtype code in agent frame: {code!r}")
+        dtype = _DTYPES[code]
+        columns[name] = np.frombuffer(raw, dtype=dtype, count=nrows, offset=offset)
+        offset += nrows * dtype.itemsize
+
+    if offset != len(raw):
+        raise ValueError(f"Malformed agent frame: {len(raw) - offset} trailing bytes")
+    return columns
+
+
+def iter_batches(stream: BinaryIO) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Reads agent frames from a binary stream until EOF.
+
+    Args:
+        stream (BinaryIO): Binary stdout of the agent process.
+
+    Yields:
+        Dict[str, np.ndarray]: Decoded columns of every frame.
+
+    Raises:
+        ValueError: If the stream gets out of sync (bad magic).
+    """
+
+    while True:
+        header = stream.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return
+        magic, length = _HEADER.unpack(header)
+        if magic != FRAME_MAGIC:
+            raise ValueError(f"Unexpected agent frame header: {magic!r}")
+        payload = stream.read(length)
+        if len(payload) < length:
+            return
+        yield decode_batch(payload)
@@ -18,7 +18,14 @@ class CaptureConfig:
         ek: bool = True,
         run_env: str = "docker",
         extra_args: Optional[List[str]] = None,
-        bpftrace_script_path: Optional[str] = None
+        bpftrace_script_path: Optional[str] = None,
+        syscall_key: Optional[str] = None,
+        syscall_top_k: int = 10,
+        agent: bool = False,
+        agent_interval: float = 1.0,
+        capture_filter: Optional[str] = None,
+        snaplen: Optional[int] = None,
+        packet_source: str = "tshark"
     ):
         
         """
@@ -35,6 +42,23 @@ class CaptureConfig:
                 tshark or bpftrace. Defaults to an empty list.
             bpftrace_script_path (str, optional): Absolute path to the bpftrace script
                 when running in syscall capture mode. Defaults to None.
+            syscall_key (str, optional): Enables per-process syscall windows keyed by
+                "pid" or "comm". A bpftrace program is generated and `bpftrace_script_path`
+                is ignored. Defaults to None (host-wide counters).
+            syscall_top_k (int, optional): Number of busiest processes kept per window
+                in per-process mode. Defaults to 10.
+            agent (bool, optional): Runs the feature agent (`feature_agent.py`) on the
+                host instead of the raw capture, receiving compact binary batches of
+                feature columns. Defaults to False.
+            agent_interval (float, optional): Maximum seconds between two agent batches.
+                Defaults to 1.0.
+            capture_filter (str, optional): BPF capture filter passed to tshark/dumpcap
+                with `-f` (see `derive_capture_pushdown`). Defaults to None.
+            snaplen (int, optional): Bytes kept per packet, passed with `-s`.
+                Defaults to None (full packets).
+            packet_source (str, optional): Packet mode source: "tshark" (EK JSON dissection)
+                or "dumpcap" (raw pcap stream decoded in-process by `pcap_stream`).
+                Defaults to "tshark".
         """
 
         self.mode = mode
@@ -42,3 +66,10 @@ class CaptureConfig:
         self.run_env = run_env
         self.extra_args = extra_args or []
         self.bpftrace_script_path = bpftrace_script_path
+        self.syscall_key = syscall_key
+        self.syscall_top_k = syscall_top_k
+        self.agent = agent
+        self.agent_interval = agent_interval
+        self.capture_filter = capture_filter
+        self.snaplen = snaplen
+        self.packet_source = packet_source
@@ -0,0 +1,136 @@
+"""Fixed-vocabulary one-hot encoding shared by training and the live handlers."""
+
+import logging
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('backend')
+
+
+class FixedVocabularyEncoder:
+    """
+    One-hot encoder whose output columns are fixed when it is fitted.
+
+    The output has the layout of `pd.get_dummies(df, columns=columns)`: the other
+    columns first, then one boolean column `<column>_<value>` per value seen during
+    training, with values sorted. Values are compared as strings, so a port read as
+    `"443"` or `443` gets the same column. Missing and unseen values, and columns
+    absent from the frame, encode as all False, so a single live row yields the same
+    columns as the training data.
+    """
+
+    # Frames up to this size are looked up value by value instead of through a pd.Index
+    SMALL_FRAME_ROWS = 64
+
+    def __init__(self):
+        self.vocabulary: Dict[str, List[str]] = {}
+        self.feature_names_out_: List[str] = []
+        self._indexes: Dict[str, pd.Index] = {}
+        self._lookups: Dict[str, Dict[str, int]] = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_indexes"] = {}
+        state["_lookups"] = {}
+        return state
+
+    @staticmethod
+    def _values(df: pd.DataFrame, col: str):
+        """Returns the values of `col` as strings and their missing mask."""
+
+        values = df[col].to_numpy()
+        return values.astype(str), pd.isna(values)
+
+    def fit(self, df: pd.DataFrame, columns: Sequence[str]) -> "FixedVocabularyEncoder":
+        """
+        Learns the vocabulary of every categorical column.
+
+        Args:
+            df (pd.DataFrame): Training data.
+            columns (Sequence[str]): Columns to encode.
+
+        Returns:
+            FixedVocabularyEncoder: The fitted encoder.
+        """
+
+        self.vocabulary = {}
+        for col in columns:
+            values, missing = self._values(df, col)
+            self.vocabulary[str(col)] = sorted(np.unique(values[~missing]).tolist())
+        self.feature_names_out_ = [
+            f"{col}_{value}" for col, values in self.vocabulary.items() for value in values
+        ]
+        self._indexes, self._lookups = {}, {}
+        logger.info(f"[CATEGORICAL ENCODING] Vocabulary sizes: { {c: len(v) for c, v in self.vocabulary.items()} }")
+        return self
+
+    def _codes(self, df: pd.DataFrame, col: str) -> np.ndarray:
+        """Returns the position in the vocabulary of every value of `col`, or -1."""
+
+        values, missing = self._values(df, col)
+        if len(values) <= self.SMALL_FRAME_ROWS:
+            if col not in self._lookups:
+                self._lookups[col] = {value: i for i, value in enumerate(self.vocabulary[col])}
+            lookup = self._lookups[col]
+            codes = np.fromiter((lookup.get(v, -1) for v in values), dtype=np.intp, count=len(values))
+        else:
+            if col not in self._indexes:
+                self._indexes[col] = pd.Index(self.vocabulary[col])
+            codes = self._indexes[col].get_indexer(values)
+        codes[missing] = -1
+        return codes
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Encodes the categorical columns of `df` with the fitted vocabulary.
+
+        Args:
+            df (pd.DataFrame): Rows to encode (one or many).
+
+        Returns:
+            pd.DataFrame: The other columns of `df` followed by the one-hot columns.
+        """
+
+        encoded = np.zeros((len(df), len(self.feature_names_out_)), dtype=bool)
+        rows = np.arange(len(df))
+
+        offset = 0
+        for col, values in self.vocabulary.items():
+            if col in df.columns and values:
+                codes = self._codes(df, col)
+                found = codes >= 0
+                encoded[rows[found], offset + codes[found]] = True
+            offset += len(values)
+
+        rest = [col for col in df.columns if col not in self.vocabulary]
+        return pd.concat(
+            [df[rest], pd.DataFrame(encoded, columns=self.feature_names_out_, index=df.index)],
+            axis=1,
+        )
+
+    def fit_transform(self, df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+        """Fits the encoder on `columns` of `df` and encodes `df`."""
+
+        return self.fit(df, columns).transform(df)
+
+
+def encode_categorical(df: pd.DataFrame, encoder: Any) -> pd.DataFrame:
+    """
+    Applies a OneHotEncoding step to a frame.
+
+    Steps saved before the vocabulary was persisted hold an unfitted OneHotEncoder;
+    for them the frame is encoded with `pd.get_dummies`, as it always was.
+
+    Args:
+        df (pd.DataFrame): Rows to encode.
+        encoder (Any): The saved step.
+
+    Returns:
+        pd.DataFrame: The encoded rows.
+    """
+
+    if isinstance(encoder, FixedVocabularyEncoder):
+        return encoder.transform(df)
+    return pd.get_dummies(df)
@@ -14,11 +14,13 @@ from .pipeline_def import PipelineDef
 from .explainability_config import ExplainabilityConfig
 from .production_handle import ProductionHandle
 from .utils import _build_capture_cmd
+from .agent_stream import build_agent_cmd
 
 from . import (
         handler_packet_traffic_anomalies,
         handler_flow_traffic_anomalies,
-        handler_syscalls_anomalies
+        handler_syscalls_anomalies,
+        handler_agent_anomalies
     )
 
 from .callbacks import _callbacks, _emit_status, _emit_error
@@ -32,8 +34,11 @@ logger = logging.getLogger('backend')
 # Handlers: expected names (change them if they are different in your project)
 # =============================================================================
 _HANDLER_PACKET_NAME = "handle_packet_traffic_anomalies"
+_HANDLER_PCAP_PACKET_NAME = "handle_pcap_packet_anomalies"
 _HANDLER_FLOW_NAME   = "handle_flow_traffic_anomalies"
 _HANDLER_SYSCALLS_NAME = "handle_syscalls_anomalies"
+_HANDLER_PROCESS_SYSCALLS_NAME = "handle_process_syscalls_anomalies"
+_HANDLER_AGENT_NAME = "handle_agent_anomalies"
 
 def _get_handler(fn_name: str) -> Callable[..., Any]:
     """
@@ -57,8 +62,11 @@ def _get_handler(fn_name: str) -> Callable[..., Any]:
 
     mapping = {
         _HANDLER_PACKET_NAME: handler_packet_traffic_anomalies.handle_packet_traffic_anomalies,
+        _HANDLER_PCAP_PACKET_NAME: handler_packet_traffic_anomalies.handle_pcap_packet_anomalies,
         _HANDLER_FLOW_NAME: handler_flow_traffic_anomalies.handle_flow_traffic_anomalies,
-        _HANDLER_SYSCALLS_NAME: handler_syscalls_anomalies.handle_syscalls_anomalies
+        _HANDLER_SYSCALLS_NAME: handler_syscalls_anomalies.handle_syscalls_anomalies,
+        _HANDLER_PROCESS_SYSCALLS_NAME: handler_syscalls_anomalies.handle_process_syscalls_anomalies,
+        _HANDLER_AGENT_NAME: handler_agent_anomalies.handle_agent_anomalies
     }
 
     if fn_name not in mapping:
@@ -136,25 +144,53 @@ def run_live_production(
 
     logger.info(capture.__dict__)
 
-    cmd = _build_capture_cmd(ssh, capture)
+    mode = (capture.mode or "").strip().lower()
 
-    logger.info(f"[run_live_production] Capture command: {' '.join(cmd)}")
-    _emit_status(f"Launching capture: {' '.join(cmd)}")
+    # The feature agent does not implement per-process syscall windows
+    use_agent = capture.agent and not (mode == "syscalls" and capture.syscall_key)
+    if capture.agent and not use_agent:
+        logger.warning("[run_live_production] Feature agent not available for per-process syscalls, using raw capture")
 
-    proc = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
-        start_new_session=True,
-    )
+    cmd = build_agent_cmd(ssh, capture) if use_agent else _build_capture_cmd(ssh, capture)
 
-    mode = (capture.mode or "").strip().lower()
-    if mode == "packet":
+    # The agent source is inlined in the SSH command, so only log its head
+    cmd_str = " ".join(cmd)
+    logger.info(f"[run_live_production] Capture command: {cmd_str[:300]}")
+    _emit_status(f"Launching capture: {cmd_str[:300]}")
+
+    pcap_packets = mode == "packet" and not use_agent and (capture.packet_source or "").lower() == "dumpcap"
+
+    if use_agent or pcap_packets:
+        # Binary frames / pcap stream: no text decoding or line buffering
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+    else:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+
+    handler_kwargs: Dict[str, Any] = {}
+    if use_agent and mode in ("packet", "flow", "syscalls"):
+        handler = _get_handler(_HANDLER_AGENT_NAME)
+        handler_kwargs = {"mode": mode}
+    elif pcap_packets:
+        handler = _get_handler(_HANDLER_PCAP_PACKET_NAME)
+    elif mode == "packet":
         handler = _get_handler(_HANDLER_PACKET_NAME)
     elif mode == "flow":
         handler = _get_handler(_HANDLER_FLOW_NAME)
+    elif mode == "syscalls" and capture.syscall_key:
+        handler = _get_handler(_HANDLER_PROCESS_SYSCALLS_NAME)
+        handler_kwargs = {"key": capture.syscall_key, "top_k": capture.syscall_top_k}
     elif mode == "syscalls":
         handler = _get_handler(_HANDLER_SYSCALLS_NAME)
     else:
@@ -170,6 +206,7 @@ def run_live_production(
                 execution=execution,
                 explainability=explainability,
                 scenario_uuid=session_id,
+                **handler_kwargs,
             )
         except Exception as e:
             logger.exception("[run_live_production] Fatal error")
@@ -0,0 +1,250 @@
+"""
+Host-side feature agent for live production.
+
+This script runs on the monitored host (launched over SSH by `agent_stream`)
+and replaces the verbose capture output with compact binary batches that hold
+only the feature columns used by the models. It depends on the Python standard
+library only, so it can be shipped inline with `python3 -c`.
+
+Supported modes:
+- **packet**: `tshark -T fields` → time, length, src, dst, src_port, dst_port, protocol, ttl.
+- **flow**: dumpcap | argus | ra → the columns of `df_from_ra_csv_lines`.
+- **syscalls**: bpftrace JSON lines → the columns given with `--columns`. The
+  bpftrace program is read from `--script` (a path on the host) or given inline
+  with `--program`.
+
+Frame format (all integers little-endian):
+    b"NAB1" | uint32 payload length | zlib(payload)
+    payload = uint32 nrows | uint16 ncols | ncols x column
+    column  = uint8 name length | name (utf-8) | dtype code (b"q", b"d", b"I" or b"S") | values
+    values  = raw values, or for b"S" (dictionary-encoded text):
+              uint32 nwords | nwords x (uint16 length | utf-8) | uint32 codes
+
+IPv4 and IPv6 addresses are sent as dictionary-encoded text ("" when missing),
+protocols as IANA codes (-1 when unknown) and missing values as NaN in float columns.
+"""
+
+import argparse
+import array
+import json
+import queue
+import shlex
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+FRAME_MAGIC = b"NAB1"
+
+PACKET_FIELDS = [
+    "frame.time_epoch", "frame.len", "ip.src", "ip.dst", "ip.proto", "ip.ttl",
+    "ipv6.nxt", "ipv6.hlim", "tcp.srcport", "udp.srcport", "tcp.dstport", "udp.dstport",
+    "ipv6.src", "ipv6.dst",
+]
+
+PACKET_SCHEMA = [
+    ("time", "d"), ("length", "q"), ("src", "S"), ("dst", "S"),
+    ("src_port", "q"), ("dst_port", "q"), ("protocol", "q"), ("ttl", "d"),
+]
+
+RA_FIELDS = "saddr,sport,daddr,dport,proto,pkts,bytes,dur,sttl,dttl"
+
+FLOW_SCHEMA = [
+    ("src", "S"), ("src_port", "q"), ("dst", "S"), ("dst_port", "q"), ("protocol", "q"),
+    ("packet_count", "q"), ("total_bytes", "q"), ("avg_packet_size", "d"),
+    ("flow_duration", "d"), ("avg_ttl", "d"),
+]
+
+NAN = float("nan")
+
+
+def _address(value):
+    return (value or "").strip()
+
+
+def _int(value, default=-1):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def _proto_code(value):
+    value = (value or "").strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        return socket.getprotobyname(value.lower())
+    except OSError:
+        return -1
+
+
+def parse_packet_line(line):
+    """Parses one tab-separated `tshark -T fields` line into a packet row."""
+
+    f = line.rstrip("\n").split("\t")
+    if len(f) < len(PACKET_FIELDS):
+        return None
+    t, length, src, dst, proto, ttl, nxt, hlim, tsp, usp, tdp, udp_, src6, dst6 = f[:len(PACKET_FIELDS)]
+    if nxt:
+        proto, ttl = nxt, hlim
+    return (
+        _float(t), _int(length, 0), _address(src or src6), _address(dst or dst6),
+        _int(tsp or usp), _int(tdp or udp_), _int(proto) if proto else -1,
+        _float(ttl) if ttl else NAN,
+    )
+
+
+def parse_flow_line(line):
+    """Parses one `ra -c ,` CSV line into a flow row (same features as df_from_ra_csv_lines)."""
+
+    f = line.strip().split(",")
+    if len(f) < 10 or "srcaddr" in line.lower():
+        return None
+    saddr, sport, daddr, dport, proto, pkts, nbytes, dur, sttl, dttl = f[:10]
+    pkts, nbytes = _int(pkts, 0), _int(nbytes, 0)
+    ttls = [v for v in (_float(sttl), _float(dttl)) if v == v]
+    return (
+        _address(saddr), _int(sport), _address(daddr), _int(dport), _proto_code(proto),
+        pkts, nbytes, nbytes / pkts if pkts else 0.0,
+        _float(dur) if dur else 0.0, sum(ttls) / len(ttls) if ttls else NAN,
+    )
+
+
+def make_syscall_parser(columns):
+    """Returns a parser for bpftrace JSON lines restricted to `columns` (int64)."""
+
+    def parse(line):
+        try:
+            data = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        return tuple(_int(data.get(c), 0) for c in columns)
+
+    return parse
+
+
+def encode_batch(schema, rows):
+    """Encodes rows as one length-prefixed, compressed columnar frame."""
+
+    parts = [struct.pack("<IH", len(rows), len(schema))]
+    for j, (name, code) in enumerate(schema):
+        column = [r[j] for r in rows]
+        if code == "S":
+            # Text is sent once per distinct value, followed by uint32 codes
+            words = {}
+            values = array.array("I", [words.setdefault(v, len(words)) for v in column])
+            encoded = [w.encode("utf-8") for w in words]
+            prefix = struct.pack("<I", len(encoded)) + b"".join(struct.pack("<H", len(w)) + w for w in encoded)
+        else:
+            values, prefix = array.array(code, column), b""
+        if sys.byteorder == "big":
+            values.byteswap()
+        raw_name = name.encode("utf-8")
+        parts += [struct.pack("<B", len(raw_name)), raw_name, code.encode("ascii"), prefix, values.tobytes()]
+    payload = zlib.compress(b"".join(parts), 1)
+    return FRAME_MAGIC + struct.pack("<I", len(payload)) + payload
+
+
+def _capture_cmd(args):
+    pushdown = (["-f", args.filter] if args.filter else []) + (["-s", str(args.snaplen)] if args.snaplen else [])
+    if args.mode == "packet":
+        cmd = [args.tshark, "-l", "-n", "-i", args.interface, *pushdown, "-T", "fields",
+               "-E", "separator=/t", "-E", "occurrence=f"]
+        for field in PACKET_FIELDS:
+            cmd += ["-e", field]
+        return cmd + args.extra
+    if args.mode == "flow":
+        dumpcap = [args.dumpcap, "-P", "-i", args.interface, "-q", *pushdown] + args.extra
+        dumpcap = " ".join(shlex.quote(x) for x in dumpcap)
+        pipeline = (
+            f"{dumpcap} -w - "
+            f"| stdbuf -oL argus -X -B ARGUS_FLOW_STATUS_INTERVAL=1 -e 127.0.0.1 -r - -w - "
+            f"| stdbuf -oL ra -r - -n -c , -s {RA_FIELDS}"
+        )
+        return ["bash", "-c", "set -o pipefail; " + pipeline]
+    program = ["-e", args.program] if args.program else [args.script]
+    return [args.bpftrace, "-q", *program] + args.extra
+
+
+def _reader(stream, lines):
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streams compact feature batches to stdout.")
+    parser.add_argument("--mode", choices=["packet", "flow", "syscalls"], required=True)
+    parser.add_argument("--interface", default="eth0")
+    parser.add_argument("--tshark", default="/usr/bin/tshark")
+    parser.add_argument("--dumpcap", default="/usr/bin/dumpcap")
+    parser.add_argument("--bpftrace", default="/usr/bin/bpftrace")
+    parser.add_argument("--script", default="")
+    parser.add_argument("--program", default="")
+    parser.add_argument("--columns", default="")
+    parser.add_argument("--filter", default="")
+    parser.add_argument("--snaplen", type=int, default=0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--max-rows", type=int, default=4096)
+    parser.add_argument("extra", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.mode == "packet":
+        schema, parse = PACKET_SCHEMA, parse_packet_line
+    elif args.mode == "flow":
+        schema, parse = FLOW_SCHEMA, parse_flow_line
+    else:
+        columns = [c for c in args.columns.split(",") if c]
+        schema, parse = [(c, "q") for c in columns], make_syscall_parser(columns)
+
+    proc = subprocess.Popen(_capture_cmd(args), stdout=subprocess.PIPE, text=True, bufsize=1)
+    lines = queue.Queue()
+    threading.Thread(target=_reader, args=(proc.stdout, lines), daemon=True).start()
+
+    out = sys.stdout.buffer
+    rows = []
+    deadline = time.monotonic() + args.interval
+    try:
+        while True:
+            try:
+                line = lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                line = ""
+            if line is None:
+                break
+            if line:
+                row = parse(line)
+                if row is not None:
+                    rows.append(row)
+            if rows and (len(rows) >= args.max_rows or time.monotonic() >= deadline):
+                out.write(encode_batch(schema, rows))
+                out.flush()
+                rows = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + args.interval
+        if rows:
+            out.write(encode_batch(schema, rows))
+            out.flush()
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+    return proc.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+from typing import List, Optional
+import pandas as pd
+import logging
+from netanoms_runtime.pipeline_def import PipelineDef
+from netanoms_runtime.explainability_config import ExplainabilityConfig
+from netanoms_runtime.utils import get_next_anomaly_index, PROTOCOL_MAP
+from netanoms_runtime.agent_stream import iter_batches
+from netanoms_runtime.syscall_features import SyscallWindowRing, pipeline_feature_names
+from netanoms_runtime.handler_flow_traffic_anomalies import _score_traffic_frame
+from netanoms_runtime.handler_syscalls_anomalies import _score_syscall_frame
+
+from .state import thread_controls
+
+logger = logging.getLogger('backend')
+
+"""Handler for real-time anomaly detection on batches sent by the host feature agent."""
+
+def handle_agent_anomalies(
+    proc,
+    pipelines: List["PipelineDef"],
+    *,
+    explainability: Optional["ExplainabilityConfig"] = None,
+    execution: int = 1,
+    scenario_uuid: Optional[str] = None,
+    mode: str = "packet",
+) -> None:
+    """
+    Handles real-time prediction on the columnar batches produced by `feature_agent.py`.
+
+    The agent parses packets, flows or syscall windows on the host, so every batch
+    already holds the feature columns as NumPy arrays. Network batches are scored
+    with the same code as the flow handler (IPs arrive as text and protocols are
+    restored to the names used by descriptions and alert counters), and syscall batches
+    with the same code as the syscall handler, including rolling features.
+
+    Args:
+        proc: The subprocess running the agent (binary stdout).
+        pipelines: List of PipelineDef objects to evaluate.
+        explainability: Optional explainability configuration (SHAP or LIME).
+        execution: Execution number linked to this run.
+        scenario_uuid: The unique identifier for this scenario instance.
+        mode: Capture mode of the agent ("packet", "flow" or "syscalls").
+    """
+
+    image_counter = get_next_anomaly_index(scenario_uuid)
+
+    ring = SyscallWindowRing()
+    rolling_cols = {
+        pipe.id: [c for c in ring.feature_names if c in pipeline_feature_names(pipe.model, pipe.steps)]
+        for pipe in pipelines
+    }
+    needed_rolling = [c for c in ring.feature_names if any(c in cols for cols in rolling_cols.values())]
+
+    for columns in iter_batches(proc.stdout):
+        if not thread_controls.get(scenario_uuid, True):
+            break
+
+        try:
+            df = pd.DataFrame(columns)
+            if df.empty:
+                continue
+
+            logger.debug(f"[HANDLE AGENT] Received batch: {len(df)} rows")
+
+            if mode == "syscalls":
+                records = df.to_dict("records")
+                df_copy = df.copy()
+                if needed_rolling:
+                    derived = [ring.push(record) for record in records]
+                    df = pd.concat([df, pd.DataFrame(derived, index=df.index)[needed_rolling]], axis=1)
+
+                image_counter = _score_syscall_frame(
+                    df, df_copy, records, pipelines,
+                    explainability=explainability,
+                    execution=execution,
+                    scenario_uuid=scenario_uuid,
+                    image_counter=image_counter,
+                    rolling_cols=rolling_cols,
+                    needed_rolling=needed_rolling,
+                )
+            else:
+                image_counter = _score_traffic_frame(
+                    _network_frame(df), pipelines,
+                    explainability=explainability,
+                    execution=execution,
+                    scenario_uuid=scenario_uuid,
+                    image_counter=image_counter,
+                )
+
+        except Exception as e:
+            logger.error(f"[HANDLE AGENT] Error processing batch: {e}")
+            continue
+
+    rc = proc.poll()
+    try:
+        err = proc.stderr.read() if getattr(proc, "stderr", None) else b""
+    except Exception:
+        err = b""
+    if isinstance(err, (bytes, bytearray)):
+        err = err.decode("utf-8", errors="replace")
+    logger.info(f"[HANDLE AGENT] Agent stream closed (returncode={rc}, execution={execution}). stderr:\n{err}")
+
+
+def _network_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Restores the textual protocol column expected by the network handlers.
+
+    IPv4 and IPv6 addresses already arrive as text (None when missing).
+
+    Args:
+        df (pd.DataFrame): Agent batch with IANA protocol codes.
+
+    Returns:
+        pd.DataFrame: The same rows with protocol names.
+    """
+
+    if "protocol" in df.columns:
+        df["protocol"] = [PROTOCOL_MAP.get(str(p), str(p)) if p >= 0 else "UNKNOWN" for p in df["protocol"]]
+    return df
@@ -1,5 +1,6 @@
 from typing import List, Optional
 import json
+import time
 import pandas as pd
 import numpy as np
 import logging
@@ -11,6 +12,8 @@ from netanoms_runtime.utils import (get_next_anomaly_index, save_shap_bar_local,
                                     PROTOCOL_MAP, PROTOCOL_REVERSE_MAP)
 
 from netanoms_runtime.callbacks import save_anomaly_metrics
+from netanoms_runtime.pcap_stream import iter_pcap_records, PacketBatch, TimedPipeReader
+from netanoms_runtime.handler_flow_traffic_anomalies import _score_traffic_frame
 
 from .state import thread_controls, ip_anomaly_counter, port_anomaly_counter
 
@@ -127,27 +130,12 @@ def handle_packet_traffic_anomalies(
             for pipe in pipelines:
                 model_id = pipe.id
                 model_instance = pipe.model
-                steps = pipe.steps
                 X_train = pipe.X_train
 
                 df_proc = df.copy()
                 
-                # Apply preprocessing steps
-                for step_type, transformer in steps:
-                    if step_type in ["StandardScaler", "MinMaxScaler", "Normalizer", "KNNImputer", "PCA"]:
-                        expected_cols = transformer.feature_names_in_
-                        logger.info(f"[HANDLE PACKET] Transformer {step_type} expects columns: {expected_cols}")
-                        
-                        df_proc_transformable = df_proc.reindex(columns=expected_cols, fill_value=0)
-
-                        df_proc_transformed = transformer.transform(df_proc_transformable)
-
-                        df_proc_transformed = pd.DataFrame(df_proc_transformed, columns=expected_cols, index=df_proc.index)
-
-                        df_proc[expected_cols] = df_proc_transformed
-
-                    elif step_type == "OneHotEncoding":
-                        df_proc = pd.get_dummies(df_proc)
+                # Apply preprocessing steps (linear steps are fused into one transform)
+                df_proc = pipe.transform(df_proc)
 
                 # Convert IP addresses to integers and protocols to codes
                 for ip_col in ['src', 'dst']:
@@ -170,7 +158,7 @@ def handle_packet_traffic_anomalies(
                 logger.info("[HANDLE PACKET] Columns: %s", df_proc.columns.tolist())
 
                 # Predict anomalies (-1 → anomaly → 1, 1 → normal → 0)
-                preds = model_instance.predict(df_proc)
+                preds = pipe.predict(df_proc)
                 preds = [1 if x == -1 else 0 for x in preds]
 
                 df_proc["anomaly"] = preds
@@ -554,4 +542,86 @@ def handle_packet_traffic_anomalies(
 
         except Exception as e:
             logger.error(f"[HANDLE PACKET] Error processing line: {line.strip()} - {e}")
-            continue
\ No newline at end of file
+            continue
+
+
+def handle_pcap_packet_anomalies(
+    proc,
+    pipelines: List["PipelineDef"],
+    *,
+    explainability: Optional["ExplainabilityConfig"] = None,
+    execution: int = 1,
+    scenario_uuid: Optional[str] = None,
+    batch_size: int = 1024,
+    interval: float = 1.0,
+) -> None:
+    """
+    Processes packets from a raw pcap stream (`dumpcap -w -`) and detects anomalies.
+
+    Frames are decoded in-process with `pcap_stream` (Ethernet/IPv4/IPv6/TCP/UDP
+    headers only) into a `PacketBatch`, which is scored as a whole when it is full
+    or when its oldest packet has waited `interval` seconds, even if no other packet
+    arrives (the pipe is read with a timeout). Rows use the same schema as the tshark
+    EK path, so models trained with `extract_features_by_packet_from_pcap` apply as is.
+
+    Args:
+        proc (subprocess.Popen): Running dumpcap process (binary stdout).
+        pipelines (list): List of PipelineDef objects to evaluate.
+        explainability: Optional explainability configuration (SHAP or LIME).
+        execution: Execution number linked to this run.
+        scenario_uuid (str): Unique scenario ID.
+        batch_size (int): Maximum number of packets scored together.
+        interval (float): Maximum seconds a decoded packet waits before being scored.
+    """
+
+    image_counter = get_next_anomaly_index(scenario_uuid)
+    batch = PacketBatch(batch_size)
+    first_arrival = None
+
+    def flush():
+        nonlocal image_counter, first_arrival
+
+        df = batch.to_frame()
+        batch.clear()
+        first_arrival = None
+
+        try:
+            image_counter = _score_traffic_frame(
+                df, pipelines,
+                explainability=explainability,
+                execution=execution,
+                scenario_uuid=scenario_uuid,
+                image_counter=image_counter,
+                log_prefix="[HANDLE PACKET]",
+            )
+        except Exception as e:
+            logger.error(f"[HANDLE PACKET] Error processing batch of {len(df)} packets - {e}")
+
+    def timeout():
+        # Seconds until the oldest waiting packet must be scored; with none waiting, the stop flag
+        # is checked every `interval` seconds
+        if first_arrival is None:
+            return interval
+        return max(0.0, first_arrival + interval - time.time())
+
+    def on_idle():
+        # No packet arrived in time: score the waiting ones without waiting for the next packet
+        if batch.size and time.time() - first_arrival >= interval:
+            flush()
+        return thread_controls.get(scenario_uuid, True)
+
+    try:
+        for record in iter_pcap_records(TimedPipeReader(proc.stdout, timeout, on_idle)):
+            if not thread_controls.get(scenario_uuid, True):
+                break
+
+            batch.append(*record)
+            if first_arrival is None:
+                first_arrival = time.time()
+            if batch.full() or time.time() - first_arrival >= interval:
+                flush()
+
+    except ValueError as e:
+        logger.error(f"[HANDLE PACKET] Invalid pcap stream: {e}")
+
+    logger.info(f"[HANDLE PACKET] pcap stream closed (returncode={proc.poll()}, execution={execution})")
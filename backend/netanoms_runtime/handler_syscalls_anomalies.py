@@ -1,4 +1,5 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+from collections import OrderedDict
 import json
 import pandas as pd
 import numpy as np
@@ -9,6 +10,9 @@ from netanoms_runtime.utils import (get_next_anomaly_index, save_shap_bar_local,
                                     save_lime_bar_local, build_anomaly_description)
 
 from netanoms_runtime.callbacks import save_anomaly_metrics
+from netanoms_runtime.syscall_features import (SyscallWindowRing, ProcessWindowParser,
+                                               pipeline_feature_names, parse_syscall_line,
+                                               SYSCALL_COLUMNS)
 
 from .state import thread_controls
 
@@ -28,11 +32,16 @@ def handle_syscalls_anomalies(
     Handles real-time syscall-based anomaly prediction and explainability.
 
     This function continuously reads JSON lines from the `proc.stdout` stream,
-    converts them into a pandas DataFrame, applies the configured preprocessing
+    parses them into the fixed syscall schema with `parse_syscall_line` (the same
+    parser used to load JSONL datasets), converts them into a pandas DataFrame, applies the configured preprocessing
     pipelines, and runs anomaly detection models. For each detected anomaly, it
     optionally generates SHAP or LIME explanations (when an explainability node
     is connected in the design) and persists the results using `save_anomaly_metrics`.
 
+    Recent windows are kept in a `SyscallWindowRing`, so pipelines trained with the
+    rolling syscall features (5s/30s/60s sums, rates, deltas and ratios) receive them
+    incrementally. The ring is only fed when at least one pipeline expects those columns.
+
     Args:
         proc: The subprocess capturing the traffic.
         pipelines: List of tuples (element_id, model, steps, X_train).
@@ -46,6 +55,14 @@ def handle_syscalls_anomalies(
     
     image_counter = get_next_anomaly_index(scenario_uuid)
 
+    # Rolling features are only derived when a pipeline was trained with them
+    ring = SyscallWindowRing()
+    rolling_cols = {
+        pipe.id: [c for c in ring.feature_names if c in pipeline_feature_names(pipe.model, pipe.steps)]
+        for pipe in pipelines
+    }
+    needed_rolling = [c for c in ring.feature_names if any(c in cols for cols in rolling_cols.values())]
+
     # Keep processing while the thread control flag is True
     while thread_controls.get(scenario_uuid, True):
         # Read a line from the subprocess output
@@ -55,330 +72,459 @@ def handle_syscalls_anomalies(
             continue
 
         try:
-            try:
-                data = json.loads(line)
-                logger.info(f"[HANDLE PACKET] Received data: {data}")
-            except json.JSONDecodeError:
-                continue 
+            # Same fixed-schema parser as the JSONL training loader
+            values = parse_syscall_line(line)
+            if values is None:
+                continue
+            data = dict(zip(SYSCALL_COLUMNS, values))
+            logger.debug(f"[HANDLE PACKET] Received data: {data}")
+
+            row_data = dict(data)
+            if needed_rolling:
+                derived = ring.push(data)
+                row_data.update({c: derived[c] for c in needed_rolling})
 
-            df = pd.DataFrame([data])
+            df = pd.DataFrame([row_data])
 
-            df_copy = df.copy() 
+            df_copy = pd.DataFrame([data])
             
             if df.empty:
                 continue
 
-            # Process each pipeline: preprocessing + model inference
-            for pipe in pipelines:
-                model_id = pipe.id
-                model_instance = pipe.model
-                steps = pipe.steps
-                X_train = pipe.X_train
-
-                df_proc = df.copy()
-                
-                # Apply preprocessing steps
-                for step_type, transformer in steps:
-                    if step_type in ["StandardScaler", "MinMaxScaler", "Normalizer", "KNNImputer", "PCA"]:
-                        expected_cols = transformer.feature_names_in_
-                        logger.info(f"[HANDLE PACKET] Transformer {step_type} expects columns: {expected_cols}")
-                        
-                        df_proc_transformable = df_proc.reindex(columns=expected_cols, fill_value=0)
+            image_counter = _score_syscall_frame(
+                df, df_copy, [data], pipelines,
+                explainability=explainability,
+                execution=execution,
+                scenario_uuid=scenario_uuid,
+                image_counter=image_counter,
+                rolling_cols=rolling_cols,
+                needed_rolling=needed_rolling,
+            )
 
-                        df_proc_transformed = transformer.transform(df_proc_transformable)
+        except Exception as e:
+            logger.error(f"[HANDLE PACKET] Error processing line: {line.strip()} - {e}")
+            continue
 
-                        df_proc_transformed = pd.DataFrame(df_proc_transformed, columns=expected_cols, index=df_proc.index)
 
-                        df_proc[expected_cols] = df_proc_transformed
+def handle_process_syscalls_anomalies(
+    proc,
+    pipelines: List["PipelineDef"],
+    *,
+    explainability: Optional["ExplainabilityConfig"] = None,
+    execution: int = 1,
+    scenario_uuid: Optional[str] = None,
+    key: str = "pid",
+    top_k: int = 10,
+) -> None:
+    """
+    Handles real-time syscall anomaly prediction with per-process windows.
 
-                    elif step_type == "OneHotEncoding":
-                        df_proc = pd.get_dummies(df_proc)
+    This function reads the output of the script generated by
+    `build_process_bpftrace_script`, rebuilds every 1-second window as one record
+    per process (only the `top_k` busiest ones are kept), and scores all processes
+    of the window with a single predict call per pipeline. The process key column
+    (`pid` or `comm`) is kept for anomaly descriptions but not passed to the models.
 
-                
-                logger.info("[HANDLE PACKET] Processed DataFrame before prediction:")
-                logger.info("[HANDLE PACKET] Columns: %s", df_proc.columns.tolist())
+    Args:
+        proc: The subprocess running the generated bpftrace program.
+        pipelines: List of PipelineDef objects to evaluate.
+        explainability: Optional explainability configuration (SHAP or LIME).
+        execution: Execution number linked to this run.
+        scenario_uuid: The unique identifier for this scenario instance.
+        key: Process key used by the script ("pid" or "comm").
+        top_k: Maximum number of processes scored per window.
+    """
 
-                # Predict anomalies (-1 → anomaly → 1, 1 → normal → 0)
-                preds = model_instance.predict(df_proc)
-                preds = [1 if x == -1 else 0 for x in preds]
+    image_counter = get_next_anomaly_index(scenario_uuid)
+    parser = ProcessWindowParser(key=key, top_k=top_k)
+
+    # One ring per process; the least recently seen ones are evicted to bound memory
+    rings: "OrderedDict[object, SyscallWindowRing]" = OrderedDict()
+    max_rings = 4 * parser.top_k
+    feature_names = SyscallWindowRing().feature_names
+    rolling_cols = {
+        pipe.id: [c for c in feature_names if c in pipeline_feature_names(pipe.model, pipe.steps)]
+        for pipe in pipelines
+    }
+    needed_rolling = [c for c in feature_names if any(c in cols for cols in rolling_cols.values())]
 
-                df_proc["anomaly"] = preds
-                df["anomaly"] = preds
+    # Keep processing while the thread control flag is True
+    while thread_controls.get(scenario_uuid, True):
+        # Read a line from the subprocess output
+        line = proc.stdout.readline()
 
-                logger.info(f"[HANDLE PACKET] {model_instance.__class__.__name__} → Anomalies detected: {sum(preds)}")
+        if not line:
+            continue
 
-                # Continue only if anomalies were detected
-                df_anomalous = df_proc[df_proc["anomaly"] == 1]
+        try:
+            records = parser.feed(line)
+            if not records:
+                continue
 
-                if not df_anomalous.empty:
-                    logger.info("[HANDLE PACKET] Explaining detected anomalies...")
+            logger.debug(f"[HANDLE PROCESS SYSCALLS] Window with {len(records)} processes")
+
+            rows = []
+            for record in records:
+                row_data = {k: v for k, v in record.items() if k != key}
+                if needed_rolling:
+                    proc_key = record[key]
+                    ring = rings.pop(proc_key, None) or SyscallWindowRing()
+                    rings[proc_key] = ring
+                    if len(rings) > max_rings:
+                        rings.popitem(last=False)
+                    derived = ring.push(record)
+                    row_data.update({c: derived[c] for c in needed_rolling})
+                rows.append(row_data)
+
+            df = pd.DataFrame(rows)
+            df_copy = pd.DataFrame(records)
+
+            image_counter = _score_syscall_frame(
+                df, df_copy, records, pipelines,
+                explainability=explainability,
+                execution=execution,
+                scenario_uuid=scenario_uuid,
+                image_counter=image_counter,
+                rolling_cols=rolling_cols,
+                needed_rolling=needed_rolling,
+            )
 
-                    
-                    # If no explainability node (SHAP or LIME) is connected
-                    if explainability is None or explainability.kind == "none":
-                        logger.info("[HANDLE PACKET] No explainability node connected.")
+        except Exception as e:
+            logger.error(f"[HANDLE PROCESS SYSCALLS] Error processing line: {line.strip()} - {e}")
+            continue
 
-                        # Remove the 'anomaly' column from the anomalous DataFrame
-                        anomalous_data = df_anomalous.drop(columns=["anomaly"])
 
-                        for i, row in anomalous_data.iterrows():
+def _score_syscall_frame(
+    df: pd.DataFrame,
+    df_copy: pd.DataFrame,
+    records: List[dict],
+    pipelines: List["PipelineDef"],
+    *,
+    explainability: Optional["ExplainabilityConfig"],
+    execution: int,
+    scenario_uuid: Optional[str],
+    image_counter: int,
+    rolling_cols: Dict[str, List[str]],
+    needed_rolling: List[str],
+) -> int:
+    """
+    Runs every pipeline over a frame of syscall windows and reports the anomalies found.
 
-                            # Construct a simple textual description of the anomaly
-                            anomaly_description = build_anomaly_description(row)
+    The frame holds one row per window (host-wide mode) or one row per process of the
+    same window (per-process mode). Each pipeline is applied once to the whole frame,
+    and every anomalous row is saved through `save_anomaly_metrics`, optionally with
+    a SHAP or LIME explanation.
 
+    Args:
+        df (pd.DataFrame): Model input rows, including any rolling features.
+        df_copy (pd.DataFrame): Original rows (same index) used for anomaly descriptions.
+        records (List[dict]): Raw records aligned with the frame index, stored as anomaly details.
+        pipelines (List[PipelineDef]): Pipelines to evaluate.
+        explainability (ExplainabilityConfig, optional): Explainability configuration.
+        execution (int): Execution number linked to this run.
+        scenario_uuid (str, optional): Scenario identifier used for image names.
+        image_counter (int): Next anomaly index used for explanation images.
+        rolling_cols (Dict[str, List[str]]): Rolling columns expected by each pipeline id.
+        needed_rolling (List[str]): Rolling columns present in `df`.
+
+    Returns:
+        int: The next anomaly index after processing the frame.
+    """
 
-                        logger.info("[HANDLE PACKET] Saving anomaly without explanation.")
-                        logger.info("[HANDLE PACKET] Description: %s", anomaly_description)
+    # Process each pipeline: preprocessing + model inference (one predict call per frame)
+    for pipe in pipelines:
+        model_id = pipe.id
+        model_instance = pipe.model
+        X_train = pipe.X_train
 
-                        save_anomaly_metrics(
-                            model_name=model_instance.__class__.__name__,
-                            feature_name="",
-                            feature_values="",
-                            anomalies=anomaly_description,
-                            execution=execution,
-                            production=True,
-                            anomaly_details=json.dumps(data, indent=2),
-                            global_shap_images=[],
-                            local_shap_images=[],
-                            global_lime_images=[],
-                            local_lime_images=[] 
-                        )
+        # Keep only the rolling columns this pipeline was trained with
+        df_proc = df.drop(columns=[c for c in needed_rolling if c not in rolling_cols[model_id]])
+        
+        # Apply preprocessing steps (linear steps are fused into one transform)
+        df_proc = pipe.transform(df_proc)
 
-                        continue
-                    
-                    # An explainability node (SHAP or LIME) is connected
-                    else:
-                        logger.info(f"[HANDLE PACKET] Explainability node found.")
+        
+        logger.info("[HANDLE PACKET] Processed DataFrame before prediction:")
+        logger.info("[HANDLE PACKET] Columns: %s", df_proc.columns.tolist())
 
-                        kind = explainability.kind
+        # Predict anomalies (-1 → anomaly → 1, 1 → normal → 0)
+        preds = pipe.predict(df_proc)
+        preds = [1 if x == -1 else 0 for x in preds]
 
-                        # Determine explainer type and class
-                        explainer_module_path = explainability.module or (
-                            "shap" if kind == "shap" else "lime"
-                        )
+        df_proc["anomaly"] = preds
+        df["anomaly"] = preds
 
-                        explainer_type = explainability.explainer_class
-                        explainer_kwargs = explainability.explainer_kwargs or {}
+        logger.info(f"[HANDLE PACKET] {model_instance.__class__.__name__} → Anomalies detected: {sum(preds)}")
 
+        # Continue only if anomalies were detected
+        df_anomalous = df_proc[df_proc["anomaly"] == 1]
 
-                            # Validate configuration before attempting explanation
-                        if not explainer_module_path or not explainer_type:
-                            logger.warning(f"[HANDLE PACKET] Missing configuration for explainability node of type {kind}")
-                        else:
+        if not df_anomalous.empty:
+            logger.info("[HANDLE PACKET] Explaining detected anomalies...")
+
+            
+            # If no explainability node (SHAP or LIME) is connected
+            if explainability is None or explainability.kind == "none":
+                logger.info("[HANDLE PACKET] No explainability node connected.")
+
+                # Remove the 'anomaly' column from the anomalous DataFrame
+                anomalous_data = df_anomalous.drop(columns=["anomaly"])
+
+                for i, row in anomalous_data.iterrows():
+
+                    # Construct a simple textual description of the anomaly
+                    anomaly_description = build_anomaly_description(df_copy.loc[i])
+
+                    logger.info("[HANDLE PACKET] Saving anomaly without explanation.")
+                    logger.info("[HANDLE PACKET] Description: %s", anomaly_description)
+
+                    save_anomaly_metrics(
+                        model_name=model_instance.__class__.__name__,
+                        feature_name="",
+                        feature_values="",
+                        anomalies=anomaly_description,
+                        execution=execution,
+                        production=True,
+                        anomaly_details=json.dumps(records[i], indent=2),
+                        global_shap_images=[],
+                        local_shap_images=[],
+                        global_lime_images=[],
+                        local_lime_images=[] 
+                    )
+
+                continue
+            
+            # An explainability node (SHAP or LIME) is connected
+            else:
+                logger.info(f"[HANDLE PACKET] Explainability node found.")
+
+                kind = explainability.kind
+
+                # Determine explainer type and class
+                explainer_module_path = explainability.module or (
+                    "shap" if kind == "shap" else "lime"
+                )
+
+                explainer_type = explainability.explainer_class
+                explainer_kwargs = explainability.explainer_kwargs or {}
+
+
+                    # Validate configuration before attempting explanation
+                if not explainer_module_path or not explainer_type:
+                    logger.warning(f"[HANDLE PACKET] Missing configuration for explainability node of type {kind}")
+                else:
 
-                            # Prepare input data and isolate anomalous rows
-                            input_data = df_proc.drop(columns=["anomaly"])
-                            anomalous_data = df_anomalous.drop(columns=["anomaly"])
+                    # Prepare input data and isolate anomalous rows
+                    input_data = df_proc.drop(columns=["anomaly"])
+                    anomalous_data = df_anomalous.drop(columns=["anomaly"])
 
-                            def clean_for_json(obj):
+                    def clean_for_json(obj):
+                        """
+                        Recursively clean an object to ensure it's safe for JSON serialization.
+                        
+                        - Replaces NaN and infinite floats with 0.0
+                        - Replaces None with 0.0
+                        - Handles nested dictionaries recursively
+
+                        Parameters:
+                            obj (Any): The input object to clean (can be dict, float, None, or any other type)
+
+                        Returns:
+                            Any: The cleaned object, safe for JSON serialization.
+                        """
+
+                        # If the object is a dictionary, clean each key-value pair recursively
+                        if isinstance(obj, dict):
+                            return {k: clean_for_json(v) for k, v in obj.items()}
+                        elif isinstance(obj, float):
+                            if np.isnan(obj) or np.isinf(obj):
+                                return 0.0
+                        elif obj is None:
+                            return 0.0 
+                        return obj
+
+                    try:
+                        import importlib
+
+                        expl_mod = importlib.import_module(explainer_module_path)
+                        explainer_class = getattr(expl_mod, explainer_type)
+                    except Exception as e:
+                        logger.warning(
+                            "[HANDLE PACKET] Could not import explainer %s.%s: %s",
+                            explainer_module_path,
+                            explainer_type,
+                            e,
+                        )
+                        explainer_class = None
+
+                    logger.info(f"kind: {kind}, explainer_type: {explainer_type}")
+
+                    for i, row in anomalous_data.iterrows():
+                        row_df = row.to_frame().T 
+
+                        # === SHAP Explanation ===
+                        if kind == "shap":
+                            if explainer_type == "KernelExplainer":
+                                def anomaly_score(X):
+                                    """
+                                    Computes the anomaly score using the model's decision function.
+
+                                    This function is designed to be compatible with explainability tools like LIME.
+                                    It converts the input to a pandas DataFrame if it is a NumPy array, ensuring that
+                                    column names align with those used during training.
+
+                                    Args:
+                                        X (np.ndarray or pd.DataFrame): The input data for which to compute the anomaly scores.
+
+                                    Returns:
+                                        np.ndarray: The reshaped anomaly scores as a column vector.
+                                    """
+                                    if isinstance(X, np.ndarray):
+                                        X = pd.DataFrame(X, columns=X_train.columns)
+                                    scores = model_instance.decision_function(X)
+                                    return scores
+
+                                explainer = explainer_class(anomaly_score, X_train)
+
+                            elif explainer_type in ["LinearExplainer", "TreeExplainer", "DeepExplainer"]:
+                                explainer = explainer_class(model_instance, X_train)
+
+                            else:
+                                explainer = explainer_class(model_instance)
+
+                            shap_values = explainer(row_df)
+
+                            logger.info(f"[HANDLE PACKET] SHAP input: {row_df.columns}")
+                            logger.info(f"[HANDLE PACKET] SHAP training columns: {X_train.columns}")
+
+                            # Extract top contributing feature
+                            contribs = shap_values[0].values 
+                            shap_contribs = sorted(
+                                zip(contribs, row.values, row.index),
+                                key=lambda x: abs(x[0]),
+                                reverse=True
+                            )
+
+                            top_feature = shap_contribs[0]
+                            feature_name = top_feature[2]
+
+                            # Construct a detailed anomaly description
+                            if i in df_copy.index:
+                                original_row = df_copy.loc[i]
+                            else:
+                                original_row = row  # fallback si no coincide
+                            anomaly_description = build_anomaly_description(original_row)
+
+                            feature_values = row.apply(lambda x: x.item() if hasattr(x, "item") else x).to_dict()
+
+                            logger.info(f"[HANDLE PACKET] SHAP anomaly #{i}, top feature: {feature_name}")
+                            logger.info(f"[HANDLE PACKET] Generating anomaly record with index: {image_counter}")
+
+                            anomaly_details = "\n".join([
+                                f"{k}: {v}" for k, v in feature_values.items()
+                            ])
+
+                            logger.info("[HANDLE PACKET] Anomaly details: %s", anomaly_details)
+
+                            shap_paths = [save_shap_bar_local(shap_values[0], scenario_uuid, image_counter)]
+
+                            logger.info(f"[HANDLE PACKET] Anomaly with index: {image_counter} generated")
+
+                            # Save the anomaly metrics with SHAP explanations
+                            save_anomaly_metrics(
+                                model_name=model_instance.__class__.__name__,
+                                feature_name=feature_name,
+                                feature_values=clean_for_json(feature_values),
+                                anomalies=anomaly_description,
+                                execution=execution,
+                                production=True,
+                                anomaly_details=json.dumps(records[i], indent=2),
+                                global_shap_images=[],
+                                local_shap_images=shap_paths,
+                                global_lime_images=[],
+                                local_lime_images=[]
+                            )
+
+                            # Increase index for next anomaly
+                            image_counter += 1
+
+                        # === LIME Explanation ===
+                        elif kind == "lime":
+                            logger.info(f"[HANDLE PACKET] Explaining row {i} with LIME...")
+
+                            explainer = explainer_class(
+                                training_data=X_train.values,
+                                feature_names=X_train.columns.tolist(),
+                                mode="regression"
+                            )
+
+                            def anomaly_score(X):
                                 """
-                                Recursively clean an object to ensure it's safe for JSON serialization.
-                                
-                                - Replaces NaN and infinite floats with 0.0
-                                - Replaces None with 0.0
-                                - Handles nested dictionaries recursively
+                                Computes the anomaly score using the model's decision function.
+
+                                This function is designed to be compatible with explainability tools like LIME.
+                                It converts the input to a pandas DataFrame if it is a NumPy array, ensuring that
+                                column names align with those used during training.
 
-                                Parameters:
-                                    obj (Any): The input object to clean (can be dict, float, None, or any other type)
+                                Args:
+                                    X (np.ndarray or pd.DataFrame): The input data for which to compute the anomaly scores.
 
                                 Returns:
-                                    Any: The cleaned object, safe for JSON serialization.
+                                    np.ndarray: The reshaped anomaly scores as a column vector.
                                 """
+                                if isinstance(X, np.ndarray):
+                                    X = pd.DataFrame(X, columns=X_train.columns)
+                                return model_instance.decision_function(X).reshape(-1, 1)
+
+                            # Generate local explanation for the current row
+                            exp = explainer.explain_instance(
+                                row.values,
+                                anomaly_score,
+                                num_features=10
+                            )
+
+                            # Sort contributions by absolute value and get most relevant feature
+                            sorted_contribs = sorted(exp.as_list(), key=lambda x: abs(x[1]), reverse=True)
+                            feature_name = sorted_contribs[0][0] 
+
+                            if i in df_copy.index:
+                                original_row = df_copy.loc[i]
+                            else:
+                                original_row = row  # fallback si no coincide
+                            anomaly_description = build_anomaly_description(original_row)
+
+                            # Convert row to dictionary, applying .item() when needed
+                            feature_values = row.apply(lambda x: x.item() if hasattr(x, "item") else x).to_dict()
+
+                            # Format full anomaly details for display or database
+                            anomaly_details = "\n".join([
+                                f"{k}: {v}" for k, v in feature_values.items()
+                            ])
+
+                            # Save local explanation as LIME bar chart
+                            lime_path = [save_lime_bar_local(exp, scenario_uuid, image_counter)]
+
+                            logger.info("[HANDLE PACKET] Anomaly details: %s", anomaly_details)
+
+                            # Save the anomaly metrics with LIME explanations
+                            save_anomaly_metrics(
+                                model_name=model_instance.__class__.__name__,
+                                feature_name=feature_name,
+                                feature_values=clean_for_json(feature_values),
+                                anomalies=anomaly_description,
+                                execution=execution,
+                                production=True,
+                                anomaly_details=json.dumps(records[i], indent=2),
+                                global_shap_images=[],
+                                local_shap_images=[],
+                                global_lime_images=[],
+                                local_lime_images=lime_path
+                            )
+
+                            # Increase index for next anomaly
+                            image_counter += 1
 
-                                # If the object is a dictionary, clean each key-value pair recursively
-                                if isinstance(obj, dict):
-                                    return {k: clean_for_json(v) for k, v in obj.items()}
-                                elif isinstance(obj, float):
-                                    if np.isnan(obj) or np.isinf(obj):
-                                        return 0.0
-                                elif obj is None:
-                                    return 0.0 
-                                return obj
-
-                            try:
-                                import importlib
-
-                                expl_mod = importlib.import_module(explainer_module_path)
-                                explainer_class = getattr(expl_mod, explainer_type)
-                            except Exception as e:
-                                logger.warning(
-                                    "[HANDLE PACKET] Could not import explainer %s.%s: %s",
-                                    explainer_module_path,
-                                    explainer_type,
-                                    e,
-                                )
-                                explainer_class = None
-
-                            logger.info(f"kind: {kind}, explainer_type: {explainer_type}")
-
-                            for i, row in anomalous_data.iterrows():
-                                row_df = row.to_frame().T 
-
-                                # === SHAP Explanation ===
-                                if kind == "shap":
-                                    if explainer_type == "KernelExplainer":
-                                        def anomaly_score(X):
-                                            """
-                                            Computes the anomaly score using the model's decision function.
-
-                                            This function is designed to be compatible with explainability tools like LIME.
-                                            It converts the input to a pandas DataFrame if it is a NumPy array, ensuring that
-                                            column names align with those used during training.
-
-                                            Args:
-                                                X (np.ndarray or pd.DataFrame): The input data for which to compute the anomaly scores.
-
-                                            Returns:
-                                                np.ndarray: The reshaped anomaly scores as a column vector.
-                                            """
-                                            if isinstance(X, np.ndarray):
-                                                X = pd.DataFrame(X, columns=X_train.columns)
-                                            scores = model_instance.decision_function(X)
-                                            return scores
-
-                                        explainer = explainer_class(anomaly_score, X_train)
-
-                                    elif explainer_type in ["LinearExplainer", "TreeExplainer", "DeepExplainer"]:
-                                        explainer = explainer_class(model_instance, X_train)
-
-                                    else:
-                                        explainer = explainer_class(model_instance)
-
-                                    shap_values = explainer(row_df)
-
-                                    logger.info(f"[HANDLE PACKET] SHAP input: {row_df.columns}")
-                                    logger.info(f"[HANDLE PACKET] SHAP training columns: {X_train.columns}")
-
-                                    # Extract top contributing feature
-                                    contribs = shap_values[0].values 
-                                    shap_contribs = sorted(
-                                        zip(contribs, row.values, row.index),
-                                        key=lambda x: abs(x[0]),
-                                        reverse=True
-                                    )
-
-                                    top_feature = shap_contribs[0]
-                                    feature_name = top_feature[2]
-
-                                    # Construct a detailed anomaly description
-                                    if i in df_copy.index:
-                                        original_row = df_copy.loc[i]
-                                    else:
-                                        original_row = row  # fallback si no coincide
-                                    anomaly_description = build_anomaly_description(original_row)
-
-                                    feature_values = row.apply(lambda x: x.item() if hasattr(x, "item") else x).to_dict()
-
-                                    logger.info(f"[HANDLE PACKET] SHAP anomaly #{i}, top feature: {feature_name}")
-                                    logger.info(f"[HANDLE PACKET] Generating anomaly record with index: {image_counter}")
-
-                                    anomaly_details = "\n".join([
-                                        f"{k}: {v}" for k, v in feature_values.items()
-                                    ])
-
-                                    logger.info("[HANDLE PACKET] Anomaly details: %s", anomaly_details)
-
-                                    shap_paths = [save_shap_bar_local(shap_values[0], scenario_uuid, image_counter)]
-
-                                    logger.info(f"[HANDLE PACKET] Anomaly with index: {image_counter} generated")
-
-                                    # Save the anomaly metrics with SHAP explanations
-                                    save_anomaly_metrics(
-                                        model_name=model_instance.__class__.__name__,
-                                        feature_name=feature_name,
-                                        feature_values=clean_for_json(feature_values),
-                                        anomalies=anomaly_description,
-                                        execution=execution,
-                                        production=True,
-                                        anomaly_details=json.dumps(data, indent=2),
-                                        global_shap_images=[],
-                                        local_shap_images=shap_paths,
-                                        global_lime_images=[],
-                                        local_lime_images=[]
-                                    )
-
-                                    # Increase index for next anomaly
-                                    image_counter += 1
-
-                                # === LIME Explanation ===
-                                elif kind == "lime":
-                                    logger.info(f"[HANDLE PACKET] Explaining row {i} with LIME...")
-
-                                    explainer = explainer_class(
-                                        training_data=X_train.values,
-                                        feature_names=X_train.columns.tolist(),
-                                        mode="regression"
-                                    )
-
-                                    def anomaly_score(X):
-                                        """
-                                        Computes the anomaly score using the model's decision function.
-
-                                        This function is designed to be compatible with explainability tools like LIME.
-                                        It converts the input to a pandas DataFrame if it is a NumPy array, ensuring that
-                                        column names align with those used during training.
-
-                                        Args:
-                                            X (np.ndarray or pd.DataFrame): The input data for which to compute the anomaly scores.
-
-                                        Returns:
-                                            np.ndarray: The reshaped anomaly scores as a column vector.
-                                        """
-                                        if isinstance(X, np.ndarray):
-                                            X = pd.DataFrame(X, columns=X_train.columns)
-                                        return model_instance.decision_function(X).reshape(-1, 1)
-
-                                    # Generate local explanation for the current row
-                                    exp = explainer.explain_instance(
-                                        row.values,
-                                        anomaly_score,
-                                        num_features=10
-                                    )
-
-                                    # Sort contributions by absolute value and get most relevant feature
-                                    sorted_contribs = sorted(exp.as_list(), key=lambda x: abs(x[1]), reverse=True)
-                                    feature_name = sorted_contribs[0][0] 
-
-                                    if i in df_copy.index:
-                                        original_row = df_copy.loc[i]
-                                    else:
-                                        original_row = row  # fallback si no coincide
-                                    anomaly_description = build_anomaly_description(original_row)
-
-                                    # Convert row to dictionary, applying .item() when needed
-                                    feature_values = row.apply(lambda x: x.item() if hasattr(x, "item") else x).to_dict()
-
-                                    # Format full anomaly details for display or database
-                                    anomaly_details = "\n".join([
-                                        f"{k}: {v}" for k, v in feature_values.items()
-                                    ])
-
-                                    # Save local explanation as LIME bar chart
-                                    lime_path = [save_lime_bar_local(exp, scenario_uuid, image_counter)]
-
-                                    logger.info("[HANDLE PACKET] Anomaly details: %s", anomaly_details)
-
-                                    # Save the anomaly metrics with LIME explanations
-                                    save_anomaly_metrics(
-                                        model_name=model_instance.__class__.__name__,
-                                        feature_name=feature_name,
-                                        feature_values=clean_for_json(feature_values),
-                                        anomalies=anomaly_description,
-                                        execution=execution,
-                                        production=True,
-                                        anomaly_details=json.dumps(data, indent=2),
-                                        global_shap_images=[],
-                                        local_shap_images=[],
-                                        global_lime_images=[],
-                                        local_lime_images=lime_path
-                                    )
-
-                                    # Increase index for next anomaly
-                                    image_counter += 1
-
-                                else:
-                                    logger.warning(f"[HANDLE PACKET ]Explainability kind not supported yet: {kind}")
+                        else:
+                            logger.warning(f"[HANDLE PACKET ]Explainability kind not supported yet: {kind}")
 
-        except Exception as e:
-            logger.error(f"[HANDLE PACKET] Error processing line: {line.strip()} - {e}")
-            continue
\ No newline at end of file
+    return image_counter
@@ -0,0 +1,589 @@
+"""In-process pcap/pcapng decoder producing packet feature batches."""
+
+import os
+import select
+import socket
+import struct
+from typing import BinaryIO, Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Link-layer types handled by `decode_headers`
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+# Columns of a packet row, identical to the tshark EK path of the packet handler
+PACKET_COLUMNS = ["time", "length", "src", "dst", "src_port", "dst_port", "protocol", "ttl"]
+
+# Columns of a flow row (5-tuple aggregation of packet rows)
+FLOW_COLUMNS = [
+    "src", "src_port", "dst", "dst_port", "protocol",
+    "packet_count", "total_bytes", "avg_packet_size", "flow_duration", "avg_ttl",
+]
+
+# Bytes of each frame decoded with NumPy (L2 + IPv6 ext. headers + L4); the few frames
+# whose headers go further are decoded one by one with `decode_headers`
+_HEADER_BYTES = 256
+
+# Protocol numbers mapped to names (kept in sync with utils.PROTOCOL_MAP)
+PROTOCOL_NAMES = {
+    1: "ICMP", 2: "IGMP", 6: "TCP", 17: "UDP", 41: "IPv6", 47: "GRE",
+    50: "ESP", 51: "AH", 58: "ICMPv6", 89: "OSPF", 132: "SCTP",
+}
+
+_ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+_ETH_IPV4 = 0x0800
+_ETH_IPV6 = 0x86DD
+
+# IPv6 extension headers walked to reach the TCP/UDP header
+_IPV6_EXT = (0, 43, 60)
+_IPV6_FRAGMENT = 44
+
+_PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+_PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+
+# Decoded header fields: src, dst, protocol number, ttl/hop limit, src port, dst port
+Headers = Tuple[Optional[str], Optional[str], int, int, int, int]
+_NO_HEADERS: Headers = (None, None, -1, -1, -1, -1)
+
+
+def _ipv4_str(b: bytes) -> str:
+    return "%d.%d.%d.%d" % (b[0], b[1], b[2], b[3])
+
+
+def _ports(data: bytes, off: int, proto: int) -> Tuple[int, int]:
+    if proto in (6, 17) and len(data) >= off + 4:
+        return struct.unpack_from("!HH", data, off)
+    return -1, -1
+
+
+def _decode_ip(data: bytes, off: int) -> Headers:
+    if len(data) < off + 1:
+        return _NO_HEADERS
+    version = data[off] >> 4
+
+    if version == 4 and len(data) >= off + 20:
+        ihl = (data[off] & 0x0F) * 4
+        frag_offset = struct.unpack_from("!H", data, off + 6)[0] & 0x1FFF
+        proto = data[off + 9]
+        sport, dport = _ports(data, off + ihl, proto) if frag_offset == 0 else (-1, -1)
+        return (_ipv4_str(data[off + 12:off + 16]), _ipv4_str(data[off + 16:off + 20]),
+                proto, data[off + 8], sport, dport)
+
+    if version == 6 and len(data) >= off + 40:
+        proto = nxt = data[off + 6]
+        src = socket.inet_ntop(socket.AF_INET6, data[off + 8:off + 24])
+        dst = socket.inet_ntop(socket.AF_INET6, data[off + 24:off + 40])
+        l4 = off + 40
+        # The reported protocol is the first next header (ipv6.nxt); ports follow the chain
+        while nxt in _IPV6_EXT and len(data) >= l4 + 2:
+            nxt, l4 = data[l4], l4 + (data[l4 + 1] + 1) * 8
+        if nxt == _IPV6_FRAGMENT and len(data) >= l4 + 8:
+            if struct.unpack_from("!H", data, l4 + 2)[0] & 0xFFF8:
+                return src, dst, proto, data[off + 7], -1, -1
+            nxt, l4 = data[l4], l4 + 8
+        sport, dport = _ports(data, l4, nxt)
+        return src, dst, proto, data[off + 7], sport, dport
+
+    return _NO_HEADERS
+
+
+def decode_headers(linktype: int, data: bytes) -> Headers:
+    """
+    Decodes the L3/L4 header fields of one captured frame.
+
+    Ethernet (with VLAN tags), Linux cooked (SLL/SLL2) and raw IP link types are
+    supported. For IPv6 the protocol is the first next header and the TTL is the
+    hop limit, as in the tshark EK path.
+
+    Args:
+        linktype (int): Link-layer type of the capture interface.
+        data (bytes): Captured bytes of the frame (possibly truncated by snaplen).
+
+    Returns:
+        Headers: (src, dst, protocol, ttl, src_port, dst_port). Missing values are
+        None for addresses and -1 for numbers.
+    """
+
+    try:
+        if linktype == LINKTYPE_ETHERNET:
+            off, ethertype = 14, struct.unpack_from("!H", data, 12)[0]
+            while ethertype in _ETH_VLAN:
+                ethertype, off = struct.unpack_from("!H", data, off + 2)[0], off + 4
+        elif linktype == LINKTYPE_LINUX_SLL:
+            off, ethertype = 16, struct.unpack_from("!H", data, 14)[0]
+        elif linktype == LINKTYPE_LINUX_SLL2:
+            off, ethertype = 20, struct.unpack_from("!H", data, 0)[0]
+        elif linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+            return _decode_ip(data, 0)
+        else:
+            return _NO_HEADERS
+    except struct.error:
+        return _NO_HEADERS
+
+    if ethertype not in (_ETH_IPV4, _ETH_IPV6):
+        return _NO_HEADERS
+    return _decode_ip(data, off)
+
+
+def _read_exact(stream: BinaryIO, n: int) -> Optional[bytes]:
+    buf = stream.read(n)
+    while buf is not None and 0 < len(buf) < n:
+        more = stream.read(n - len(buf))
+        if not more:
+            return None
+        buf += more
+    return buf if buf and len(buf) == n else None
+
+
+class TimedPipeReader:
+    """
+    Reads a pipe like a binary stream, calling `on_idle` whenever no data arrived in time.
+
+    Each read waits with `select` for at most `timeout()` seconds; when it expires,
+    `on_idle()` is called and the wait starts again, so work that depends on time
+    (e.g. scoring a batch of packets every second) runs even while no packet comes.
+    When `on_idle()` returns False the read returns b"", which ends the stream.
+    """
+
+    def __init__(self, stream: BinaryIO, timeout: Callable[[], Optional[float]], on_idle: Callable[[], bool]):
+        """
+        Initializes a new TimedPipeReader instance.
+
+        Args:
+            stream (BinaryIO): Pipe to read (e.g. the stdout of `dumpcap -w -`), not read elsewhere.
+            timeout (Callable[[], Optional[float]]): Seconds to wait for data (None: no limit).
+            on_idle (Callable[[], bool]): Called when the wait expires; returns whether to keep reading.
+        """
+
+        self.fd = stream.fileno()
+        self.timeout = timeout
+        self.on_idle = on_idle
+
+    def read(self, n: int) -> bytes:
+        """Returns up to `n` bytes, as soon as some are available (b"" at the end of the stream)."""
+
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], self.timeout())
+            if ready:
+                return os.read(self.fd, n)
+            if not self.on_idle():
+                return b""
+
+
+def iter_pcap_records(stream: BinaryIO) -> Iterator[Tuple[int, float, int, bytes]]:
+    """
+    Reads packet records from a pcap or pcapng byte stream until EOF.
+
+    Args:
+        stream (BinaryIO): Binary stream, e.g. the stdout of `dumpcap -w -` or an open file.
+
+    Yields:
+        Tuple[int, float, int, bytes]: (linktype, epoch timestamp, original length, captured bytes).
+
+    Raises:
+        ValueError: If the stream does not start with a pcap or pcapng header.
+    """
+
+    magic = _read_exact(stream, 4)
+    if magic is None:
+        return
+
+    if magic in _PCAP_MAGIC:
+        endian, resolution = _PCAP_MAGIC[magic]
+        header = _read_exact(stream, 20)
+        if header is None:
+            return
+        linktype = struct.unpack(endian + "HHiIII", header)[5] & 0x0FFFFFFF
+        rec = struct.Struct(endian + "IIII")
+        while True:
+            head = _read_exact(stream, 16)
+            if head is None:
+                return
+            ts_sec, ts_frac, caplen, origlen = rec.unpack(head)
+            data = _read_exact(stream, caplen) if caplen else b""
+            if data is None:
+                return
+            yield linktype, ts_sec + ts_frac * resolution, origlen, data
+
+    if magic != _PCAPNG_SHB:
+        raise ValueError(f"Not a pcap/pcapng stream (magic {magic!r})")
+
+    endian = "<"
+    interfaces = []  # (linktype, ts resolution in seconds, snaplen) per interface id
+    block_type = magic
+    while True:
+        raw_len = _read_exact(stream, 4)
+        if raw_len is None:
+            return
+
+        if block_type == _PCAPNG_SHB:
+            # Byte-order magic decides the endianness of the whole section
+            bom = _read_exact(stream, 4)
+            if bom is None:
+                return
+            endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+            interfaces = []
+            body = _read_exact(stream, struct.unpack(endian + "I", raw_len)[0] - 12)
+        else:
+            body = _read_exact(stream, struct.unpack(endian + "I", raw_len)[0] - 8)
+        if body is None:
+            return
+        btype = struct.unpack(endian + "I", block_type)[0]
+        body = body[:-4]  # trailing block length
+
+        if btype == 1:  # Interface Description Block
+            linktype, _, snaplen = struct.unpack_from(endian + "HHI", body, 0)
+            resolution = 1e-6
+            opt = 8
+            while opt + 4 <= len(body):
+                code, length = struct.unpack_from(endian + "HH", body, opt)
+                if code == 0:
+                    break
+                if code == 9 and length >= 1:  # if_tsresol
+                    value = body[opt + 4]
+                    resolution = 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+                opt += 4 + (length + 3) // 4 * 4
+            interfaces.append((linktype, resolution, snaplen))
+
+        elif btype == 6 and interfaces:  # Enhanced Packet Block
+            iface, ts_high, ts_low, caplen, origlen = struct.unpack_from(endian + "IIIII", body, 0)
+            linktype, resolution, _ = interfaces[iface] if iface < len(interfaces) else interfaces[0]
+            yield linktype, ((ts_high << 32) | ts_low) * resolution, origlen, body[20:20 + caplen]
+
+        elif btype == 3 and interfaces:  # Simple Packet Block (no timestamp)
+            # The captured length is the original length truncated to the interface snaplen (0: no limit)
+            origlen = struct.unpack_from(endian + "I", body, 0)[0]
+            linktype, _, snaplen = interfaces[0]
+            yield linktype, 0.0, origlen, body[4:4 + (min(origlen, snaplen) if snaplen else origlen)]
+
+        block_type = _read_exact(stream, 4)
+        if block_type is None:
+            return
+
+
+def _protocol_names(codes: np.ndarray) -> np.ndarray:
+    """Maps protocol numbers to names like the EK path (unknown numbers as text, -1 as "UNKNOWN")."""
+
+    unique, inverse = np.unique(codes, return_inverse=True)
+    names = np.array([PROTOCOL_NAMES.get(c, str(c)) if c >= 0 else "UNKNOWN" for c in unique.tolist()], dtype=object)
+    return names[inverse.ravel()]
+
+
+class PacketBatch:
+    """
+    Preallocated NumPy columns for a batch of decoded packets.
+
+    Rows are appended in place; `to_frame` returns a DataFrame with the packet row
+    schema (`PACKET_COLUMNS`) used by the tshark EK path and by training.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initializes a new PacketBatch instance.
+
+        Args:
+            capacity (int, optional): Maximum number of packets in the batch. Defaults to 1024.
+        """
+
+        self.capacity = max(1, int(capacity))
+        self.time = np.zeros(self.capacity, dtype=np.float64)
+        self.length = np.zeros(self.capacity, dtype=np.int64)
+        self.src = np.empty(self.capacity, dtype=object)
+        self.dst = np.empty(self.capacity, dtype=object)
+        self.src_port = np.full(self.capacity, -1, dtype=np.int64)
+        self.dst_port = np.full(self.capacity, -1, dtype=np.int64)
+        self.protocol = np.full(self.capacity, -1, dtype=np.int64)
+        self.ttl = np.full(self.capacity, np.nan, dtype=np.float64)
+        self.size = 0
+
+    def append(self, linktype: int, ts: float, origlen: int, data: bytes) -> None:
+        """
+        Decodes one captured frame and stores it as the next row.
+
+        Args:
+            linktype (int): Link-layer type of the capture interface.
+            ts (float): Epoch timestamp of the frame.
+            origlen (int): Original (wire) length of the frame.
+            data (bytes): Captured bytes of the frame.
+        """
+
+        i = self.size
+        src, dst, proto, ttl, sport, dport = decode_headers(linktype, data)
+        self.time[i] = ts
+        self.length[i] = origlen
+        self.src[i] = src
+        self.dst[i] = dst
+        self.protocol[i] = proto
+        self.ttl[i] = ttl if ttl >= 0 else np.nan
+        self.src_port[i] = sport
+        self.dst_port[i] = dport
+        self.size += 1
+
+    def full(self) -> bool:
+        """Returns True when no more rows fit in the batch."""
+
+        return self.size >= self.capacity
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Builds a DataFrame with the stored rows.
+
+        Protocol numbers are mapped to names like the EK path (unknown numbers are kept
+        as text, non-IP frames become "UNKNOWN").
+
+        Returns:
+            pd.DataFrame: One row per packet with the columns in `PACKET_COLUMNS`.
+        """
+
+        n = self.size
+        return pd.DataFrame({
+            "time": self.time[:n].copy(),
+            "length": self.length[:n].copy(),
+            "src": self.src[:n].copy(),
+            "dst": self.dst[:n].copy(),
+            "src_port": self.src_port[:n].copy(),
+            "dst_port": self.dst_port[:n].copy(),
+            "protocol": _protocol_names(self.protocol[:n]),
+            "ttl": self.ttl[:n].copy(),
+        }, columns=PACKET_COLUMNS)
+
+    def clear(self) -> None:
+        """Empties the batch so its arrays can be reused."""
+
+        self.src[:self.size] = None
+        self.dst[:self.size] = None
+        self.size = 0
+
+
+def _header_matrix(frames: Sequence[bytes], width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the first `width` bytes of every frame as the rows of a zero-padded matrix, and the frame lengths."""
+
+    lengths = np.array(list(map(len, frames)), dtype=np.int64)
+    padded = b"".join([f[:width].ljust(width, b"\0") for f in frames])
+    return np.frombuffer(padded, dtype=np.uint8).reshape(len(frames), width), lengths
+
+
+def _address_strings(addresses: np.ndarray, family: int) -> np.ndarray:
+    """Formats rows of 4 or 16 address bytes, formatting each distinct address once."""
+
+    if not len(addresses):
+        return np.empty(0, dtype=object)
+    packed = np.ascontiguousarray(addresses).view(f"V{addresses.shape[1]}").ravel()
+    unique, inverse = np.unique(packed, return_inverse=True)
+    text = np.array([socket.inet_ntop(family, u.tobytes()) for u in unique], dtype=object)
+    return text[inverse.ravel()]
+
+
+def decode_headers_batch(linktypes: np.ndarray, frames: Sequence[bytes]) -> Tuple[np.ndarray, ...]:
+    """
+    Decodes the L3/L4 header fields of many captured frames at once.
+
+    Gives the same fields as calling `decode_headers` on every frame: the first
+    bytes of the frames are copied into a matrix and every header field is read
+    for all the frames with NumPy indexing. Frames whose headers do not fit in
+    those bytes (long VLAN or IPv6 extension header chains) are decoded with
+    `decode_headers`.
+
+    Args:
+        linktypes (np.ndarray): Link-layer type of the interface of every frame.
+        frames (Sequence[bytes]): Captured bytes of every frame.
+
+    Returns:
+        Tuple[np.ndarray, ...]: (src, dst, protocol, ttl, src_port, dst_port) arrays, with
+        None for missing addresses and -1 for missing numbers.
+    """
+
+    n = len(frames)
+    width = _HEADER_BYTES
+    data, lengths = _header_matrix(frames, width)
+    rows = np.arange(n)
+    linktypes = np.asarray(linktypes, dtype=np.int64)
+
+    # Rows whose headers continue after the first `width` bytes
+    overflow = np.zeros(n, dtype=bool)
+
+    def has(active, pos, size):
+        # Rows of `active` whose frame holds `size` bytes at `pos`
+        need = pos + size
+        overflow[active & (need > width) & (lengths >= need)] = True
+        return active & (lengths >= need) & ~overflow
+
+    def u8(pos):
+        return data[rows, np.clip(pos, 0, width - 1)].astype(np.int64)
+
+    def u16(pos):
+        return (u8(pos) << 8) | u8(pos + 1)
+
+    # Link layer: offset of the IP header and its ethertype
+    off = np.zeros(n, dtype=np.int64)
+    ethertype = np.full(n, -1, dtype=np.int64)
+    for linktype, type_pos, ip_off in ((LINKTYPE_ETHERNET, 12, 14), (LINKTYPE_LINUX_SLL, 14, 16),
+                                       (LINKTYPE_LINUX_SLL2, 0, 20)):
+        ok = has(linktypes == linktype, type_pos, 2)
+        ethertype[ok] = u16(np.full(n, type_pos))[ok]
+        off[ok] = ip_off
+
+    vlan = np.isin(ethertype, _ETH_VLAN) & (linktypes == LINKTYPE_ETHERNET)
+    while vlan.any():
+        ok = has(vlan, off + 2, 2)
+        next_type = u16(off + 2)
+        ethertype[vlan & ~ok] = -1
+        ethertype[ok] = next_type[ok]
+        off[ok] += 4
+        vlan = ok & np.isin(ethertype, _ETH_VLAN)
+
+    ip = np.isin(ethertype, (_ETH_IPV4, _ETH_IPV6)) | np.isin(linktypes, (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6))
+    ip = has(ip, off, 1)
+    version = u8(off) >> 4
+
+    protocol = np.full(n, -1, dtype=np.int64)
+    ttl = np.full(n, -1, dtype=np.int64)
+    l4 = np.zeros(n, dtype=np.int64)
+    l4_protocol = np.full(n, -1, dtype=np.int64)
+
+    # IPv4: ports only for the first fragment
+    v4 = has(ip & (version == 4), off, 20)
+    protocol[v4] = u8(off + 9)[v4]
+    ttl[v4] = u8(off + 8)[v4]
+    l4[v4] = (off + (u8(off) & 0x0F) * 4)[v4]
+    first_fragment = v4 & ((u16(off + 6) & 0x1FFF) == 0)
+    l4_protocol[first_fragment] = protocol[first_fragment]
+
+    # IPv6: the reported protocol is the first next header; ports follow the chain
+    v6 = has(ip & (version == 6), off, 40)
+    protocol[v6] = u8(off + 6)[v6]
+    ttl[v6] = u8(off + 7)[v6]
+    l4[v6] = off[v6] + 40
+    nxt = np.where(v6, protocol, -1)
+
+    chain = has(v6 & np.isin(nxt, _IPV6_EXT), l4, 2)
+    while chain.any():
+        next_header, header_len = u8(l4), (u8(l4 + 1) + 1) * 8
+        nxt[chain] = next_header[chain]
+        l4[chain] += header_len[chain]
+        chain = has(chain & np.isin(nxt, _IPV6_EXT), l4, 2)
+
+    fragment = has(v6 & (nxt == _IPV6_FRAGMENT), l4, 8)
+    later_fragment = fragment & ((u16(l4 + 2) & 0xFFF8) != 0)
+    first_fragment = fragment & ~later_fragment
+    nxt[first_fragment] = u8(l4)[first_fragment]
+    l4[first_fragment] += 8
+    unfragmented = v6 & ~later_fragment
+    l4_protocol[unfragmented] = nxt[unfragmented]
+
+    src_port = np.full(n, -1, dtype=np.int64)
+    dst_port = np.full(n, -1, dtype=np.int64)
+    ports = has(np.isin(l4_protocol, (6, 17)), l4, 4)
+    src_port[ports] = u16(l4)[ports]
+    dst_port[ports] = u16(l4 + 2)[ports]
+
+    src = np.full(n, None, dtype=object)
+    dst = np.full(n, None, dtype=object)
+    for rows_ip, family, size, src_pos, dst_pos in ((v4, socket.AF_INET, 4, 12, 16), (v6, socket.AF_INET6, 16, 8, 24)):
+        idx = np.flatnonzero(rows_ip)
+        cols = np.arange(size)
+        src[idx] = _address_strings(data[idx[:, None], off[idx, None] + src_pos + cols], family)
+        dst[idx] = _address_strings(data[idx[:, None], off[idx, None] + dst_pos + cols], family)
+
+    # Frames whose headers do not fit in the matrix
+    for i in np.flatnonzero(overflow).tolist():
+        src[i], dst[i], protocol[i], ttl[i], src_port[i], dst_port[i] = decode_headers(int(linktypes[i]), frames[i])
+
+    return src, dst, protocol, ttl, src_port, dst_port
+
+
+def _decode_records(records: List[Tuple[int, float, int, bytes]]) -> List[np.ndarray]:
+    """Returns the columns of the packet rows of `records`, in the order of `PACKET_COLUMNS`."""
+
+    frames = [record[3] for record in records]
+    linktypes = np.array([record[0] for record in records], dtype=np.int64)
+    src, dst, protocol, ttl, src_port, dst_port = decode_headers_batch(linktypes, frames)
+    return [
+        np.array([record[1] for record in records], dtype=np.float64),
+        np.array([record[2] for record in records], dtype=np.int64),
+        src,
+        dst,
+        src_port,
+        dst_port,
+        _protocol_names(protocol),
+        np.where(ttl >= 0, ttl, np.nan).astype(np.float64),
+    ]
+
+
+def extract_packet_features(stream: BinaryIO, chunk_size: int = 16_384) -> pd.DataFrame:
+    """
+    Extracts one feature row per packet from a pcap/pcapng file.
+
+    This is the training counterpart of the live `dumpcap` packet source: the rows
+    have the semantics of `decode_headers`, the decoder used live. Records are read
+    in chunks of `chunk_size` packets, whose headers are decoded together by
+    `decode_headers_batch` in the calling process.
+
+    Args:
+        stream (BinaryIO): Open binary pcap/pcapng file.
+        chunk_size (int, optional): Packets decoded together. Defaults to 16384.
+
+    Returns:
+        pd.DataFrame: One row per packet with the columns in `PACKET_COLUMNS`.
+
+    Raises:
+        ValueError: If the file is not a pcap/pcapng capture.
+    """
+
+    chunks: List[List[np.ndarray]] = []
+    chunk: List[Tuple[int, float, int, bytes]] = []
+    for record in iter_pcap_records(stream):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            chunks.append(_decode_records(chunk))
+            chunk = []
+    if chunk:
+        chunks.append(_decode_records(chunk))
+
+    if not chunks:
+        return pd.DataFrame(columns=PACKET_COLUMNS)
+
+    # A single frame is built, so the column types do not depend on the chunks
+    return pd.DataFrame({
+        col: np.concatenate([columns[i] for columns in chunks]) for i, col in enumerate(PACKET_COLUMNS)
+    }, columns=PACKET_COLUMNS)
+
+
+def aggregate_flows(packets: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aggregates packet rows into flows keyed by (src, src_port, dst, dst_port, protocol).
+
+    Args:
+        packets (pd.DataFrame): Packet rows as returned by `extract_packet_features`.
+
+    Returns:
+        pd.DataFrame: One row per flow with the columns in `FLOW_COLUMNS`.
+    """
+
+    if packets.empty:
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+
+    keys = ["src", "src_port", "dst", "dst_port", "protocol"]
+    grouped = packets.groupby(keys, dropna=False, sort=False)
+    flows = grouped.agg(
+        packet_count=("length", "size"),
+        total_bytes=("length", "sum"),
+        avg_packet_size=("length", "mean"),
+        first=("time", "min"),
+        last=("time", "max"),
+        avg_ttl=("ttl", "mean"),
+    ).reset_index()
+
+    flows["flow_duration"] = flows["last"] - flows["first"]
+    return flows[FLOW_COLUMNS]
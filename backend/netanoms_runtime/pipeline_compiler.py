@@ -0,0 +1,594 @@
+"""Compiled inference backends for the models and preprocessing steps of production pipelines."""
+
+import importlib.util
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree, KDTree
+
+from .categorical_encoding import encode_categorical
+
+logger = logging.getLogger('backend')
+
+# Rows of the training data used to check that a compiled model is equivalent
+EQUIVALENCE_SAMPLE_SIZE = 2000
+
+# Preprocessing steps applied by the live handlers (other step types are ignored)
+TRANSFORM_STEPS = ("StandardScaler", "MinMaxScaler", "Normalizer", "KNNImputer", "PCA")
+
+
+class CompiledModel:
+    """
+    Base class of the compiled forms of a trained model.
+
+    Subclasses implement `_predict` on a float64 matrix whose columns follow
+    `feature_names`, the order the original model was fitted with.
+    """
+
+    kind = "numpy"
+
+    def __init__(self, feature_names: Sequence[str]):
+        self.feature_names = list(feature_names)
+
+    def accepts(self, df: pd.DataFrame) -> bool:
+        """Returns whether `df` has exactly the columns the model was fitted with."""
+
+        return len(df.columns) == len(self.feature_names) and set(df.columns) == set(self.feature_names)
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Predicts the rows of `df` like the original model's `predict`.
+
+        Args:
+            df (pd.DataFrame): Preprocessed rows with the fitted feature columns.
+
+        Returns:
+            np.ndarray: Predictions.
+        """
+
+        return self._predict(df[self.feature_names].to_numpy(dtype=np.float64))
+
+    def _predict(self, X: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class LinearModel(CompiledModel):
+    """
+    NumPy evaluator of linear models: `X @ coef.T + intercept`.
+
+    The decision is mapped to labels like scikit-learn does for the original estimator:
+    regressors return it as is, binary classifiers compare it with 0 and multiclass
+    ones take the argmax, and one-class models return 1 (inlier) or -1 (outlier).
+    """
+
+    def __init__(self, feature_names, coef, intercept, mode, classes=None):
+        super().__init__(feature_names)
+        self.coef = np.atleast_2d(np.asarray(coef, dtype=np.float64))
+        self.intercept = np.asarray(intercept, dtype=np.float64).ravel()
+        self.mode = mode
+        self.classes = None if classes is None else np.asarray(classes)
+
+    def _predict(self, X):
+        decision = X @ self.coef.T + self.intercept
+        if self.mode == "regressor":
+            return decision.ravel() if decision.shape[1] == 1 else decision
+        if self.mode == "outlier":
+            return np.where(decision.ravel() > 0, 1, -1)
+        if decision.shape[1] == 1:
+            return self.classes[(decision.ravel() > 0).astype(np.int64)]
+        return self.classes[np.argmax(decision, axis=1)]
+
+
+class OneClassSVMModel(CompiledModel):
+    """NumPy evaluator of `OneClassSVM` for the linear, rbf, poly and sigmoid kernels."""
+
+    def __init__(self, feature_names, support_vectors, dual_coef, intercept, kernel, gamma, coef0, degree):
+        super().__init__(feature_names)
+        self.support_vectors = np.asarray(support_vectors, dtype=np.float64)
+        self.dual_coef = np.asarray(dual_coef, dtype=np.float64).ravel()
+        self.intercept = float(np.asarray(intercept).ravel()[0])
+        self.kernel = kernel
+        self.gamma = float(gamma)
+        self.coef0 = float(coef0)
+        self.degree = int(degree)
+        self.sv_norms = np.einsum("ij,ij->i", self.support_vectors, self.support_vectors)
+
+    def _predict(self, X):
+        dot = X @ self.support_vectors.T
+        if self.kernel == "rbf":
+            sq_dist = np.einsum("ij,ij->i", X, X)[:, None] - 2 * dot + self.sv_norms
+            K = np.exp(-self.gamma * np.maximum(sq_dist, 0))
+        elif self.kernel == "poly":
+            K = (self.gamma * dot + self.coef0) ** self.degree
+        elif self.kernel == "sigmoid":
+            K = np.tanh(self.gamma * dot + self.coef0)
+        else:
+            K = dot
+        decision = K @ self.dual_coef + self.intercept
+        return np.where(decision > 0, 1, -1)
+
+
+class OnnxModel(CompiledModel):
+    """
+    Model converted to ONNX with skl2onnx and run with onnxruntime on CPU.
+
+    Only the serialized model is pickled; the inference session is created on first use.
+    """
+
+    kind = "onnx"
+
+    def __init__(self, feature_names, onnx_bytes):
+        super().__init__(feature_names)
+        self.onnx_bytes = onnx_bytes
+        self._session = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_session"] = None
+        return state
+
+    def _predict(self, X):
+        if self._session is None:
+            import onnxruntime
+
+            self._session = onnxruntime.InferenceSession(self.onnx_bytes, providers=["CPUExecutionProvider"])
+        inputs = {self._session.get_inputs()[0].name: X.astype(np.float32)}
+        label = self._session.run([self._session.get_outputs()[0].name], inputs)[0]
+        return np.asarray(label).ravel()
+
+
+def _numpy_model(model: Any, feature_names: Sequence[str]) -> Optional[CompiledModel]:
+    """Builds the NumPy evaluator of `model`, or returns None if its type is not supported."""
+
+    name = type(model).__name__
+
+    if name == "OneClassSVM":
+        kernel = model.kernel if isinstance(model.kernel, str) else None
+        if kernel not in ("linear", "rbf", "poly", "sigmoid"):
+            return None
+        return OneClassSVMModel(
+            feature_names, model.support_vectors_, model.dual_coef_, model.intercept_,
+            kernel, model._gamma, model.coef0, model.degree,
+        )
+
+    if name == "SGDOneClassSVM":
+        return LinearModel(feature_names, model.coef_, -np.asarray(model.offset_), "outlier")
+
+    if name in ("LinearRegression", "Ridge", "Lasso", "ElasticNet", "SGDRegressor"):
+        return LinearModel(feature_names, model.coef_, model.intercept_, "regressor")
+
+    if name in ("LogisticRegression", "RidgeClassifier", "SGDClassifier", "LinearSVC"):
+        return LinearModel(feature_names, model.coef_, model.intercept_, "classifier", model.classes_)
+
+    return None
+
+
+def _onnx_model(model: Any, feature_names: Sequence[str], X: np.ndarray) -> Optional[CompiledModel]:
+    """Converts `model` to ONNX if skl2onnx and onnxruntime are installed and support it."""
+
+    if importlib.util.find_spec("onnxruntime") is None:
+        return None
+    try:
+        from skl2onnx import to_onnx
+    except ImportError:
+        return None
+
+    try:
+        onx = to_onnx(model, X[:1].astype(np.float32), target_opset={"": 17, "ai.onnx.ml": 3})
+    except Exception as e:
+        logger.info(f"[PIPELINE COMPILER] {type(model).__name__} can't be converted to ONNX: {e}")
+        return None
+    return OnnxModel(feature_names, onx.SerializeToString())
+
+
+def _equivalent(compiled: CompiledModel, expected: np.ndarray, X: np.ndarray) -> bool:
+    """Checks that the compiled model reproduces the predictions of the original one."""
+
+    try:
+        actual = compiled._predict(X)
+    except Exception as e:
+        logger.warning(f"[PIPELINE COMPILER] Compiled {compiled.kind} model failed: {e}")
+        return False
+
+    expected = np.asarray(expected)
+    if actual.shape != expected.shape:
+        return False
+    if np.issubdtype(expected.dtype, np.floating):
+        return bool(np.allclose(actual, expected, rtol=1e-6, atol=1e-8))
+    return bool(np.array_equal(actual, expected))
+
+
+def compile_model(model: Any, X_train: pd.DataFrame) -> Optional[CompiledModel]:
+    """
+    Exports a trained model to a compiled form for low-latency live scoring.
+
+    A NumPy evaluator is used for linear models and OneClassSVM, and ONNX (when
+    skl2onnx and onnxruntime are installed) for the other models. The compiled
+    model is only returned if it predicts exactly like the original model on a
+    sample of the training data.
+
+    Args:
+        model (Any): Trained scikit-learn model.
+        X_train (pd.DataFrame): Data the model was fitted with.
+
+    Returns:
+        Optional[CompiledModel]: The compiled model, or None if no backend supports
+        the model or the equivalence check fails.
+    """
+
+    feature_names = list(getattr(model, "feature_names_in_", X_train.columns))
+    if not hasattr(model, "predict") or list(X_train.columns) != feature_names:
+        return None
+
+    sample = X_train if len(X_train) <= EQUIVALENCE_SAMPLE_SIZE else X_train.sample(EQUIVALENCE_SAMPLE_SIZE, random_state=42)
+    X = sample.to_numpy(dtype=np.float64)
+    if np.isnan(X).any():
+        return None
+
+    try:
+        expected = model.predict(sample)
+    except Exception:
+        return None
+
+    for build in (lambda: _numpy_model(model, feature_names), lambda: _onnx_model(model, feature_names, X)):
+        compiled = build()
+        if compiled is None:
+            continue
+        if _equivalent(compiled, expected, X):
+            logger.info(f"[PIPELINE COMPILER] {type(model).__name__} compiled with the {compiled.kind} backend")
+            return compiled
+        logger.warning(f"[PIPELINE COMPILER] {compiled.kind} backend of {type(model).__name__} is not equivalent, discarded")
+
+    return None
+
+
+class AffineStage:
+    """
+    Consecutive linear preprocessing steps folded into a single `x @ W + b`.
+
+    `columns` is the ordered union of the columns of the folded steps; a step
+    leaves the columns it does not transform unchanged (identity block). Frames
+    with missing values are transformed step by step, because a NaN would spread
+    through the matrix product to every output column.
+    """
+
+    def __init__(self, columns: List[str], W: np.ndarray, b: np.ndarray, steps: List[Tuple[str, Any]]):
+        self.columns = columns
+        self.W = W
+        self.b = b
+        self.steps = steps
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        X = df.reindex(columns=self.columns, fill_value=0).to_numpy(dtype=np.float64)
+        if np.isnan(X).any():
+            for step in self.steps:
+                df = _apply_step(df, *step)
+            return df
+
+        df[self.columns] = pd.DataFrame(X @ self.W + self.b, columns=self.columns, index=df.index)
+        return df
+
+
+class IndexedKNNImputer:
+    """
+    KNNImputer that finds the donors with prebuilt KD-tree/BallTree indexes instead of
+    a brute-force distance search over the whole fitted training set.
+
+    For a row whose present features are P, the `nan_euclidean` distance to a training
+    row complete on P is `sqrt(n_features / |P|) * ||x_P - y_P||`, so an exact tree over
+    the P columns of those rows returns the same neighbors. One index is built per
+    (present features, imputed column) pair the first time it is needed and cached.
+    The few training rows with missing values in P are compared by brute force and
+    merged with the tree neighbors. Only rows with missing values are imputed; the
+    others are returned unchanged, like KNNImputer does.
+    """
+
+    # Above this number of present features a BallTree is used instead of a KDTree
+    KDTREE_MAX_DIMS = 15
+    # Number of (present features, column) indexes kept in memory
+    MAX_INDEXES = 256
+
+    def __init__(self, imputer: Any):
+        self.imputer = imputer
+        self.feature_names_in_ = imputer.feature_names_in_
+        self.n_neighbors = int(imputer.n_neighbors)
+        self.weights = imputer.weights
+        self.fit_X = np.asarray(imputer._fit_X, dtype=np.float64)
+        self.mask_fit_X = np.asarray(imputer._mask_fit_X, dtype=bool)
+        self.col_means = np.ma.array(self.fit_X, mask=self.mask_fit_X).mean(axis=0).data
+        self._indexes: "OrderedDict[Tuple[Tuple[int, ...], int], Tuple[Any, np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def _index(self, present: Tuple[int, ...], col: int) -> Tuple[Any, np.ndarray, np.ndarray]:
+        """Returns the (tree, tree rows, brute-force rows) of the donors of `col` for rows with `present` features."""
+
+        key = (present, col)
+        if key in self._indexes:
+            self._indexes.move_to_end(key)
+            return self._indexes[key]
+
+        donors = ~self.mask_fit_X[:, col]
+        complete = ~self.mask_fit_X[:, list(present)].any(axis=1)
+        tree_rows = np.flatnonzero(donors & complete)
+        brute_rows = np.flatnonzero(donors & ~complete)
+
+        tree = None
+        if tree_rows.size:
+            tree_cls = KDTree if len(present) <= self.KDTREE_MAX_DIMS else BallTree
+            tree = tree_cls(self.fit_X[np.ix_(tree_rows, list(present))])
+
+        self._indexes[key] = (tree, tree_rows, brute_rows)
+        if len(self._indexes) > self.MAX_INDEXES:
+            self._indexes.popitem(last=False)
+        return self._indexes[key]
+
+    def _impute_column(self, X: np.ndarray, present: Tuple[int, ...], col: int) -> np.ndarray:
+        """Imputes `col` for the rows of X, which all have the `present` features."""
+
+        n_features = self.fit_X.shape[1]
+        tree, tree_rows, brute_rows = self._index(present, col)
+        k = min(self.n_neighbors, tree_rows.size + brute_rows.size)
+        Xp = X[:, list(present)]
+
+        dists, rows = [], []
+        if tree is not None:
+            d, i = tree.query(Xp, k=min(k, tree_rows.size))
+            dists.append(d * np.sqrt(n_features / len(present)))
+            rows.append(tree_rows[i])
+        if brute_rows.size:
+            Y = self.fit_X[np.ix_(brute_rows, list(present))]
+            common = ~np.isnan(Y)
+            counts = common.sum(axis=1)
+            sq = np.where(common[None, :, :], (Xp[:, None, :] - np.nan_to_num(Y)[None, :, :]) ** 2, 0.0).sum(axis=2)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                d = np.where(counts > 0, np.sqrt(sq * n_features / counts), np.nan)
+            dists.append(d)
+            rows.append(np.broadcast_to(brute_rows, d.shape))
+
+        dist = np.hstack(dists)
+        donor_rows = np.hstack(rows)
+        dist = np.where(np.isnan(dist), np.inf, dist)
+        nearest = np.argsort(dist, axis=1, kind="stable")[:, :k]
+        dist = np.take_along_axis(dist, nearest, axis=1)
+        values = self.fit_X[np.take_along_axis(donor_rows, nearest, axis=1), col]
+
+        valid = np.isfinite(dist)
+        if self.weights == "distance":
+            with np.errstate(divide="ignore"):
+                w = np.where(valid, 1.0 / dist, 0.0)
+            exact = np.isinf(w)
+            w = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), w)
+        else:
+            w = valid.astype(np.float64)
+
+        total = w.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            imputed = (w * values).sum(axis=1) / total
+        # Rows without a defined distance to any donor take the column mean
+        return np.where(valid.any(axis=1), imputed, self.col_means[col])
+
+    def transform(self, X: Any) -> np.ndarray:
+        """
+        Imputes the missing values of X like the original KNNImputer.
+
+        Args:
+            X (Any): Frame or matrix with the fitted feature columns, in order.
+
+        Returns:
+            np.ndarray: X with its missing values imputed.
+        """
+
+        X = np.array(X, dtype=np.float64)
+        mask = np.isnan(X)
+        rows = np.flatnonzero(mask.any(axis=1))
+        if not rows.size:
+            return X
+
+        # Rows with the same missing features share the indexes
+        patterns, inverse = np.unique(mask[rows], axis=0, return_inverse=True)
+        for p, pattern in enumerate(patterns):
+            group = rows[inverse.ravel() == p]
+            present = tuple(np.flatnonzero(~pattern).tolist())
+            for col in np.flatnonzero(pattern):
+                if present:
+                    X[group, col] = self._impute_column(X[group], present, col)
+                else:
+                    X[group, col] = self.col_means[col]
+        return X
+
+
+def index_knn_imputer(imputer: Any) -> Optional[IndexedKNNImputer]:
+    """
+    Builds the IndexedKNNImputer of a fitted KNNImputer.
+
+    Only the default `nan_euclidean` metric with uniform or distance weights is
+    supported, and the indexed imputer is only returned if it imputes like the
+    original one on training rows with random missing values (perturbed to avoid
+    ties, where both may pick different but equally near donors).
+
+    Args:
+        imputer (Any): Fitted KNNImputer.
+
+    Returns:
+        Optional[IndexedKNNImputer]: The indexed imputer, or None if not supported.
+    """
+
+    if (
+        getattr(imputer, "metric", None) != "nan_euclidean"
+        or imputer.weights not in ("uniform", "distance")
+        or not np.isnan(imputer.missing_values)
+        or imputer.add_indicator
+        or not np.all(imputer._valid_mask)
+        or getattr(imputer, "feature_names_in_", None) is None
+    ):
+        return None
+
+    indexed = IndexedKNNImputer(imputer)
+
+    rng = np.random.default_rng(0)
+    fit_X = indexed.fit_X
+    sample = fit_X[rng.choice(len(fit_X), size=min(64, len(fit_X)), replace=False)]
+    scale = np.nan_to_num(np.nanstd(fit_X, axis=0)) + 1e-3
+    sample = sample + rng.normal(size=sample.shape) * scale * 1e-2
+    sample[rng.random(sample.shape) < 0.2] = np.nan
+
+    columns = list(imputer.feature_names_in_)
+    try:
+        expected = imputer.transform(pd.DataFrame(sample, columns=columns))
+        actual = indexed.transform(sample)
+        if np.allclose(actual, expected, rtol=1e-6, atol=1e-8, equal_nan=True):
+            logger.info(f"[PIPELINE COMPILER] KNNImputer indexed over {len(fit_X)} training rows")
+            return indexed
+    except Exception as e:
+        logger.warning(f"[PIPELINE COMPILER] Indexed KNNImputer failed: {e}")
+
+    logger.warning("[PIPELINE COMPILER] Indexed KNNImputer is not equivalent, brute-force search kept")
+    return None
+
+
+def _apply_step(df: pd.DataFrame, step_type: str, transformer: Any) -> pd.DataFrame:
+    """Applies one preprocessing step the way the live handlers always did."""
+
+    if step_type in TRANSFORM_STEPS:
+        expected_cols = transformer.feature_names_in_
+        logger.debug(f"[PIPELINE COMPILER] Transformer {step_type} expects columns: {expected_cols}")
+
+        transformed = transformer.transform(df.reindex(columns=expected_cols, fill_value=0))
+        df[expected_cols] = pd.DataFrame(transformed, columns=expected_cols, index=df.index)
+
+    elif step_type == "OneHotEncoding":
+        df = encode_categorical(df, transformer)
+
+    return df
+
+
+def _affine_params(step_type: str, transformer: Any) -> Optional[Tuple[List[str], np.ndarray, np.ndarray]]:
+    """
+    Returns the (columns, W, b) of a linear step, or None if the step is not linear.
+
+    StandardScaler, MinMaxScaler without clipping and PCA keeping every component
+    are linear. Normalizer and KNNImputer are not.
+    """
+
+    columns = getattr(transformer, "feature_names_in_", None)
+    if columns is None:
+        return None
+    columns = [str(c) for c in columns]
+    n = len(columns)
+
+    if step_type == "StandardScaler":
+        mean = transformer.mean_ if transformer.with_mean else np.zeros(n)
+        scale = transformer.scale_ if transformer.with_std else np.ones(n)
+        return columns, np.diag(1.0 / scale), -mean / scale
+
+    if step_type == "MinMaxScaler" and not getattr(transformer, "clip", False):
+        return columns, np.diag(transformer.scale_), np.asarray(transformer.min_, dtype=np.float64)
+
+    if step_type == "PCA" and transformer.components_.shape == (n, n):
+        W = transformer.components_.T.astype(np.float64)
+        if transformer.whiten:
+            W = W / np.sqrt(transformer.explained_variance_)
+        return columns, W, -transformer.mean_ @ W
+
+    return None
+
+
+def _fuse(run: List[Tuple[str, Any, Tuple[List[str], np.ndarray, np.ndarray]]]) -> Optional[AffineStage]:
+    """Folds a run of linear steps into one AffineStage, checking it against step-by-step application."""
+
+    columns: List[str] = []
+    for _, _, (step_cols, _, _) in run:
+        columns += [c for c in step_cols if c not in columns]
+    position = {c: i for i, c in enumerate(columns)}
+
+    W = np.eye(len(columns))
+    b = np.zeros(len(columns))
+    for _, _, (step_cols, step_W, step_b) in run:
+        idx = [position[c] for c in step_cols]
+        M = np.eye(len(columns))
+        M[np.ix_(idx, idx)] = step_W
+        offset = np.zeros(len(columns))
+        offset[idx] = step_b
+        W, b = W @ M, b @ M + offset
+
+    steps = [(step_type, transformer) for step_type, transformer, _ in run]
+    stage = AffineStage(columns, W, b, steps)
+
+    # Equivalence check on random rows
+    sample = pd.DataFrame(np.random.default_rng(0).normal(size=(16, len(columns))), columns=columns)
+    expected = sample.copy()
+    for step in steps:
+        expected = _apply_step(expected, *step)
+    try:
+        actual = stage.apply(sample.copy())
+        if np.allclose(actual[columns].to_numpy(), expected[columns].to_numpy(), rtol=1e-7, atol=1e-9):
+            return stage
+    except Exception as e:
+        logger.warning(f"[PIPELINE COMPILER] Fused stage failed: {e}")
+
+    logger.warning(f"[PIPELINE COMPILER] Fused {[s for s, _ in steps]} is not equivalent, applied step by step")
+    return None
+
+
+def compile_steps(steps: Sequence[Tuple[str, Any]]) -> List[Any]:
+    """
+    Compiles the preprocessing steps of a pipeline for live scoring.
+
+    Runs of consecutive linear steps (see `_affine_params`) are folded into one
+    AffineStage, so a frame is reindexed and copied once for the whole run instead of
+    once per step. Non-linear steps such as Normalizer, KNNImputer or OneHotEncoding
+    are kept as (step type, transformer) and applied step by step; KNNImputer is
+    replaced by its IndexedKNNImputer when supported.
+
+    Args:
+        steps (Sequence[Tuple[str, Any]]): (step type, fitted transformer) pairs, in order.
+
+    Returns:
+        List[Any]: AffineStage objects and (step type, transformer) pairs, in order.
+    """
+
+    stages: List[Any] = []
+    run: List[Tuple[str, Any, Tuple[List[str], np.ndarray, np.ndarray]]] = []
+
+    def flush():
+        if len(run) == 1:
+            stages.append(run[0][:2])
+        elif run:
+            fused = _fuse(run)
+            stages.extend([fused] if fused is not None else [step[:2] for step in run])
+        run.clear()
+
+    for step_type, transformer in steps:
+        if step_type == "KNNImputer":
+            transformer = index_knn_imputer(transformer) or transformer
+        params = _affine_params(step_type, transformer) if step_type in TRANSFORM_STEPS else None
+        if params is not None:
+            run.append((step_type, transformer, params))
+        else:
+            flush()
+            stages.append((step_type, transformer))
+    flush()
+
+    return stages
+
+
+def apply_stages(df: pd.DataFrame, stages: Sequence[Any]) -> pd.DataFrame:
+    """
+    Applies compiled preprocessing stages to a frame.
+
+    Args:
+        df (pd.DataFrame): Frame to transform (modified in place when possible).
+        stages (Sequence[Any]): Output of `compile_steps`.
+
+    Returns:
+        pd.DataFrame: The transformed frame.
+    """
+
+    for stage in stages:
+        if isinstance(stage, AffineStage):
+            df = stage.apply(df)
+        else:
+            df = _apply_step(df, *stage)
+    return df
@@ -1,6 +1,8 @@
 from typing import Any, List, Optional 
 from dataclasses import dataclass
 
+from .pipeline_compiler import apply_stages, compile_steps
+
 @dataclass
 class PipelineDef:
     """
@@ -12,6 +14,11 @@ class PipelineDef:
     - The trained model object.
     - The preprocessing / feature-transformation steps applied before inference.
     - Optional training data used for explanations, retraining, or analysis.
+    - An optional compiled form of the model (see `pipeline_compiler`), used
+      transparently by `predict` when present.
+    - The preprocessing steps compiled once, with consecutive linear steps folded
+      into a single affine transform, used by `transform`. They are compiled when
+      the model is trained and saved with it; older artifacts are compiled here.
     """
 
     def __init__(
@@ -19,7 +26,9 @@ class PipelineDef:
         id: str,
         model: Any,
         steps: List[tuple],
-        X_train: Optional[Any] = None
+        X_train: Optional[Any] = None,
+        compiled: Optional[Any] = None,
+        stages: Optional[List[Any]] = None
     ):
 
         """
@@ -30,9 +39,42 @@ class PipelineDef:
             model (Any): Trained predictive model.
             steps (List[Tuple]): Preprocessing / transformation steps.
             X_train (Any, optional): Optional training dataset.
+            compiled (CompiledModel, optional): Compiled form of the model.
+            stages (List[Any], optional): `compile_steps(steps)` computed beforehand.
+                Defaults to None (compiled now).
         """
 
         self.id = id
         self.model = model
         self.steps = steps 
-        self.X_train = X_train
\ No newline at end of file
+        self.X_train = X_train
+        self.compiled = compiled
+        self.stages = stages if stages is not None else compile_steps(steps)
+
+    def transform(self, df: Any) -> Any:
+        """
+        Applies the preprocessing steps to a frame of live rows.
+
+        Args:
+            df (pd.DataFrame): Rows to preprocess (modified in place when possible).
+
+        Returns:
+            pd.DataFrame: The preprocessed rows.
+        """
+
+        return apply_stages(df, self.stages)
+
+    def predict(self, X: Any) -> Any:
+        """
+        Predicts the preprocessed rows `X`, with the compiled model when it accepts them.
+
+        Args:
+            X (Any): Preprocessed rows (DataFrame with the fitted feature columns).
+
+        Returns:
+            Any: Predictions of the model.
+        """
+
+        if self.compiled is not None and self.compiled.accepts(X):
+            return self.compiled.predict(X)
+        return self.model.predict(X)
@@ -0,0 +1,455 @@
+"""Rolling multi-resolution features for bpftrace syscall windows."""
+
+import json
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Window markers emitted by the bpftrace script for every 1-second record
+SYSCALL_WINDOW_MARKERS = ["window_start_ns", "window_end_ns"]
+
+# Per-syscall counters emitted by the bpftrace script (whitelist 1-gram)
+SYSCALL_COUNTERS = [
+    "read", "write", "openat", "close", "fstat",
+    "mmap", "mprotect", "munmap", "brk", "rt_sigaction",
+    "rt_sigprocmask", "ioctl", "poll", "select", "futex",
+    "nanosleep", "sched_yield",
+]
+
+# Full fixed schema of a syscall record, in the order emitted by bpftrace
+SYSCALL_COLUMNS = SYSCALL_WINDOW_MARKERS + SYSCALL_COUNTERS + ["total_syscalls"]
+
+# Storage dtype of each schema column (per-window counters always fit in int32)
+SYSCALL_DTYPES = {col: np.int64 for col in SYSCALL_WINDOW_MARKERS + ["total_syscalls"]}
+SYSCALL_DTYPES.update({col: np.int32 for col in SYSCALL_COUNTERS})
+
+# Rolling horizons, expressed in number of 1-second windows
+DEFAULT_HORIZONS = (5, 30, 60)
+
+# Supported keys for per-process syscall windows
+PROCESS_KEYS = ("pid", "comm")
+
+# Tracepoint used for each counter (userland fstat is newfstatat on most kernels)
+SYSCALL_TRACEPOINTS = {name: name for name in SYSCALL_COUNTERS}
+SYSCALL_TRACEPOINTS["fstat"] = "newfstatat"
+
+# Lines printed by the per-process script: maps, window header and window end
+_MAP_LINE = re.compile(r"^@(c|tot)\[(.+)\]:\s*(\d+)$")
+
+
+def parse_syscall_line(line: str) -> Optional[List[int]]:
+    """
+    Parses one JSON line emitted by the bpftrace script into the fixed syscall schema.
+
+    Keys outside `SYSCALL_COLUMNS` are ignored and missing counters are read as zero,
+    like in `SyscallWindowRing.push`.
+
+    Args:
+        line (str): A line of bpftrace output or of a JSONL dataset.
+
+    Returns:
+        Optional[List[int]]: The values in `SYSCALL_COLUMNS` order, or None if the line is
+        not a JSON object or holds a non-numeric value.
+    """
+
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    values = []
+    for col in SYSCALL_COLUMNS:
+        try:
+            values.append(int(data.get(col) or 0))
+        except (TypeError, ValueError, OverflowError):
+            return None
+    return values
+
+
+def load_syscall_jsonl(path: str, chunk_size: int = 65536) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Loads a JSONL syscall dataset line by line into typed columns of the fixed schema.
+
+    Lines are parsed with `parse_syscall_line` into a preallocated buffer of
+    `chunk_size` rows; every full buffer is converted to the dtypes in
+    `SYSCALL_DTYPES`, so peak memory stays close to the size of the result
+    instead of a multiple of the file size. Malformed lines are skipped and counted.
+
+    Args:
+        path (str): Path of the JSONL file.
+        chunk_size (int, optional): Number of rows parsed per buffer. Defaults to 65536.
+
+    Returns:
+        Tuple[pd.DataFrame, Dict[str, int]]: The records with the `SYSCALL_COLUMNS` schema,
+        and the counts of non-empty `lines`, `parsed` records and `skipped` lines.
+    """
+
+    buffer = np.empty((chunk_size, len(SYSCALL_COLUMNS)), dtype=np.int64)
+    chunks: Dict[str, List[np.ndarray]] = {col: [] for col in SYSCALL_COLUMNS}
+    counts = {"lines": 0, "parsed": 0, "skipped": 0}
+
+    def flush(n: int) -> None:
+        for j, col in enumerate(SYSCALL_COLUMNS):
+            chunks[col].append(buffer[:n, j].astype(SYSCALL_DTYPES[col]))
+
+    n = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            counts["lines"] += 1
+            values = parse_syscall_line(line)
+            if values is None:
+                counts["skipped"] += 1
+                continue
+            try:
+                buffer[n] = values
+            except OverflowError:
+                counts["skipped"] += 1
+                continue
+            n += 1
+            counts["parsed"] += 1
+            if n == chunk_size:
+                flush(n)
+                n = 0
+    if n or not counts["parsed"]:
+        flush(n)
+
+    df = pd.DataFrame({col: np.concatenate(chunks[col]) for col in SYSCALL_COLUMNS}, columns=SYSCALL_COLUMNS)
+    return df, counts
+
+
+def rolling_feature_names(horizons: Sequence[int] = DEFAULT_HORIZONS) -> List[str]:
+    """
+    Returns the names of the derived rolling columns, in a stable order.
+
+    For every counter (including `total_syscalls`) the following columns are produced:
+    - `<col>_sum_<h>s`: sum over the last `h` windows.
+    - `<col>_rate_<h>s`: mean per window over the last `h` windows.
+    - `<col>_delta`: difference with the previous window.
+    For every syscall counter, `<col>_ratio` is its share of `total_syscalls`.
+
+    Args:
+        horizons (Sequence[int], optional): Rolling horizons in windows. Defaults to (5, 30, 60).
+
+    Returns:
+        List[str]: Names of the derived columns.
+    """
+
+    names = []
+    for col in SYSCALL_COUNTERS + ["total_syscalls"]:
+        for h in horizons:
+            names.append(f"{col}_sum_{h}s")
+        for h in horizons:
+            names.append(f"{col}_rate_{h}s")
+        names.append(f"{col}_delta")
+    for col in SYSCALL_COUNTERS:
+        names.append(f"{col}_ratio")
+    return names
+
+
+class SyscallWindowRing:
+    """
+    Fixed-size ring buffer of recent syscall windows with incremental rolling sums.
+
+    Each call to `push` stores the counters of a new window and updates one running
+    sum per horizon by adding the incoming window and subtracting the one that
+    leaves the horizon. The cost per window is therefore independent of the
+    horizon length.
+    """
+
+    def __init__(self, horizons: Sequence[int] = DEFAULT_HORIZONS):
+        """
+        Initializes a new SyscallWindowRing instance.
+
+        Args:
+            horizons (Sequence[int], optional): Rolling horizons in windows. Defaults to (5, 30, 60).
+        """
+
+        self.horizons = tuple(int(h) for h in horizons)
+        self.columns = SYSCALL_COUNTERS + ["total_syscalls"]
+        self.feature_names = rolling_feature_names(self.horizons)
+
+        self._capacity = max(self.horizons)
+        self._buffer = np.zeros((self._capacity, len(self.columns)), dtype=np.int64)
+        self._sums = np.zeros((len(self.horizons), len(self.columns)), dtype=np.int64)
+        self._count = 0
+        self._pos = 0
+
+    def push(self, record: Dict) -> Dict[str, float]:
+        """
+        Adds a new window to the ring and returns the derived rolling features.
+
+        Missing or non-numeric counters are treated as zero.
+
+        Args:
+            record (Dict): Parsed syscall record (one bpftrace window).
+
+        Returns:
+            Dict[str, float]: Derived features keyed by the names in `feature_names`.
+        """
+
+        row = np.empty(len(self.columns), dtype=np.int64)
+        for j, col in enumerate(self.columns):
+            try:
+                row[j] = int(record.get(col) or 0)
+            except (TypeError, ValueError):
+                row[j] = 0
+
+        prev = self._buffer[(self._pos - 1) % self._capacity].copy() if self._count else row
+
+        # Update each running sum: add the new window, drop the one leaving the horizon
+        for k, h in enumerate(self.horizons):
+            self._sums[k] += row
+            if self._count >= h:
+                self._sums[k] -= self._buffer[(self._pos - h) % self._capacity]
+
+        self._buffer[self._pos] = row
+        self._pos = (self._pos + 1) % self._capacity
+        self._count += 1
+
+        total = row[-1]
+        out: Dict[str, float] = {}
+        for j, col in enumerate(self.columns):
+            for k, h in enumerate(self.horizons):
+                out[f"{col}_sum_{h}s"] = int(self._sums[k, j])
+            for k, h in enumerate(self.horizons):
+                out[f"{col}_rate_{h}s"] = float(self._sums[k, j]) / min(self._count, h)
+            out[f"{col}_delta"] = int(row[j] - prev[j])
+        for j, col in enumerate(SYSCALL_COUNTERS):
+            out[f"{col}_ratio"] = float(row[j]) / total if total else 0.0
+
+        return out
+
+    def reset(self) -> None:
+        """
+        Clears all stored windows and running sums.
+
+        Returns:
+            None
+        """
+
+        self._buffer[:] = 0
+        self._sums[:] = 0
+        self._count = 0
+        self._pos = 0
+
+
+def add_rolling_syscall_features(
+    df: pd.DataFrame,
+    horizons: Sequence[int] = DEFAULT_HORIZONS,
+) -> pd.DataFrame:
+    """
+    Appends the rolling syscall features to a DataFrame of consecutive windows.
+
+    This is the batch counterpart of `SyscallWindowRing` used at training time.
+    Rows are processed in their current order, and the produced values are
+    identical to pushing every row through a fresh ring.
+
+    Args:
+        df (pd.DataFrame): DataFrame with the syscall schema, one row per window.
+        horizons (Sequence[int], optional): Rolling horizons in windows. Defaults to (5, 30, 60).
+
+    Returns:
+        pd.DataFrame: A new DataFrame with the derived columns appended.
+    """
+
+    cols = SYSCALL_COUNTERS + ["total_syscalls"]
+    counts = df.reindex(columns=cols).apply(pd.to_numeric, errors="coerce").fillna(0).astype("int64")
+
+    derived: Dict[str, pd.Series] = {}
+    for col in cols:
+        series = counts[col]
+        for h in horizons:
+            derived[f"{col}_sum_{h}s"] = series.rolling(h, min_periods=1).sum().astype("int64")
+        for h in horizons:
+            derived[f"{col}_rate_{h}s"] = series.rolling(h, min_periods=1).mean()
+        derived[f"{col}_delta"] = series.diff().fillna(0).astype("int64")
+
+    total = counts["total_syscalls"].replace(0, np.nan)
+    for col in SYSCALL_COUNTERS:
+        derived[f"{col}_ratio"] = (counts[col] / total).fillna(0.0)
+
+    derived_df = pd.DataFrame(derived, index=df.index)[rolling_feature_names(horizons)]
+    return pd.concat([df, derived_df], axis=1)
+
+
+def pipeline_feature_names(model: object, steps: Optional[List[tuple]] = None) -> set:
+    """
+    Collects the input column names expected by a pipeline's model and preprocessing steps.
+
+    Args:
+        model (object): Trained model, possibly exposing `feature_names_in_`.
+        steps (List[tuple], optional): Preprocessing steps as (type, transformer) tuples.
+
+    Returns:
+        set: Column names seen during fit by any component of the pipeline.
+    """
+
+    names = set(getattr(model, "feature_names_in_", []))
+    for _, transformer in steps or []:
+        names.update(getattr(transformer, "feature_names_in_", []))
+    return names
+
+
+def build_process_bpftrace_script(key: str = "pid", top_k: int = 10) -> str:
+    """
+    Generates a bpftrace program that counts syscalls per process in 1-second windows.
+
+    Counters are keyed by `pid` or `comm`. On every window the script prints a
+    `W <start_ns> <end_ns>` header, the `top_k` busiest processes (`@tot`), the
+    per-syscall counters of those processes (`@c`) and an `E` marker, and then resets
+    all maps. The busiest processes are found with `top_k` passes over `@tot` that
+    lower a threshold (`@thr`) until `top_k` processes are above it, so the output
+    per window stays bounded no matter how many processes are alive on the host.
+    Processes tied at the threshold are printed too; `ProcessWindowParser` only keeps
+    the counters of the processes listed in `@tot`. Requires bpftrace 0.21 or newer
+    (map `for` loops).
+
+    Args:
+        key (str, optional): Process key, either "pid" or "comm". Defaults to "pid".
+        top_k (int, optional): Number of busiest processes kept per window. Defaults to 10.
+
+    Returns:
+        str: The bpftrace program text.
+
+    Raises:
+        ValueError: If `key` is not a supported process key.
+    """
+
+    if key not in PROCESS_KEYS:
+        raise ValueError(f"Process key not supported: {key!r} (Expected 'pid' or 'comm')")
+
+    top_k = max(1, int(top_k))
+
+    probes = "\n".join(
+        f'tracepoint:syscalls:sys_enter_{tp} {{ @c[{key}, "{name}"]++; @tot[{key}]++; }}'
+        for name, tp in SYSCALL_TRACEPOINTS.items()
+    )
+
+    key_format = "%d" if key == "pid" else "%s"
+
+    return (
+        "BEGIN { @start = nsecs; }\n"
+        f"{probes}\n"
+        "interval:s:1 {\n"
+        '  printf("W %llu %llu\\n", @start, nsecs);\n'
+        f"  print(@tot, {top_k});\n"
+        # Lowers @thr to the next distinct total until top_k processes are at or above it
+        "  @thr = 0; @lim = 0; @n = 0; $i = 0;\n"
+        f"  while ($i < {top_k}) {{\n"
+        "    @m = 0;\n"
+        "    for ($kv : @tot) { if ((@lim == 0 || $kv.1 < @lim) && $kv.1 > @m) { @m = $kv.1; } }\n"
+        "    if (@m == 0) { break; }\n"
+        "    for ($kv : @tot) { if ($kv.1 == @m) { @n += 1; } }\n"
+        "    @thr = @m; @lim = @m;\n"
+        f"    if (@n >= {top_k}) {{ break; }}\n"
+        "    $i += 1;\n"
+        "  }\n"
+        "  for ($kv : @c) {\n"
+        "    if (@tot[$kv.0.0] >= @thr) {\n"
+        f'      printf("@c[{key_format}, %s]: %llu\\n", $kv.0.0, $kv.0.1, $kv.1);\n'
+        "    }\n"
+        "  }\n"
+        '  printf("E\\n");\n'
+        "  clear(@c); clear(@tot);\n"
+        "  @start = nsecs;\n"
+        "}\n"
+        "END { clear(@c); clear(@tot); clear(@start); clear(@thr); clear(@lim); clear(@n); clear(@m); }\n"
+    )
+
+
+class ProcessWindowParser:
+    """
+    Incremental parser for the output of `build_process_bpftrace_script`.
+
+    Lines are fed one at a time; only the counters of the processes listed in
+    `@tot` are kept. When the end marker of a window is read, the parser returns
+    one compact record per kept process with the syscall schema
+    plus the process key column.
+    """
+
+    def __init__(self, key: str = "pid", top_k: int = 10):
+        """
+        Initializes a new ProcessWindowParser instance.
+
+        Args:
+            key (str, optional): Process key used by the script ("pid" or "comm"). Defaults to "pid".
+            top_k (int, optional): Maximum number of processes returned per window. Defaults to 10.
+        """
+
+        self.key = key
+        self.top_k = max(1, int(top_k))
+        self._reset(0, 0)
+
+    def _reset(self, start_ns: int, end_ns: int) -> None:
+        self._start_ns = start_ns
+        self._end_ns = end_ns
+        self._totals: Dict[str, int] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def feed(self, line: str) -> Optional[List[dict]]:
+        """
+        Consumes one output line.
+
+        Args:
+            line (str): A line printed by bpftrace.
+
+        Returns:
+            Optional[List[dict]]: The records of the window that just ended, ordered by
+            `total_syscalls` (busiest first), or None if the window is still open.
+        """
+
+        line = line.strip()
+        if not line:
+            return None
+
+        if line.startswith("W "):
+            parts = line.split()
+            try:
+                self._reset(int(parts[1]), int(parts[2]))
+            except (IndexError, ValueError):
+                self._reset(0, 0)
+            return None
+
+        if line == "E":
+            return self._flush()
+
+        match = _MAP_LINE.match(line)
+        if not match:
+            return None
+
+        name, raw_key, value = match.group(1), match.group(2), int(match.group(3))
+        if name == "tot":
+            self._totals[raw_key.strip()] = value
+        else:
+            # @tot (printed first) lists the kept processes; counters of the others are dropped
+            proc_key, _, syscall = raw_key.rpartition(",")
+            proc_key = proc_key.strip()
+            if proc_key in self._totals:
+                self._counts.setdefault(proc_key, {})[syscall.strip()] = value
+        return None
+
+    def _flush(self) -> List[dict]:
+        busiest = sorted(self._totals.items(), key=lambda kv: kv[1], reverse=True)[:self.top_k]
+
+        records = []
+        for proc_key, total in busiest:
+            counts = self._counts.get(proc_key, {})
+            record = {self.key: int(proc_key) if self.key == "pid" and proc_key.isdigit() else proc_key}
+            record["window_start_ns"] = self._start_ns
+            record["window_end_ns"] = self._end_ns
+            for col in SYSCALL_COUNTERS:
+                record[col] = counts.get(col, 0)
+            record["total_syscalls"] = total
+            records.append(record)
+
+        self._reset(self._start_ns, self._end_ns)
+        return records
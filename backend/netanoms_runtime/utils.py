@@ -14,17 +14,16 @@ from django.conf import settings
 import io
 import socket
 import struct
-import tempfile
-import pyshark
 import ipaddress
 import shap
-from collections import defaultdict
 import matplotlib.pyplot as plt
 
 from typing import Any, Dict, List, Optional, Tuple
 from .capture_config import CaptureConfig
 from .ssh_config import SSHConfig
 from .pipeline_def import PipelineDef
+from .pcap_stream import extract_packet_features, aggregate_flows
+from .syscall_features import build_process_bpftrace_script, pipeline_feature_names
 
 logger = logging.getLogger('backend')
 
@@ -46,6 +45,19 @@ PROTOCOL_MAP = {
 # Reverse mapping: from protocol name to number
 PROTOCOL_REVERSE_MAP = {v: int(k) for k, v in PROTOCOL_MAP.items()}
 
+# Live features that only need L2/L3 headers (frame length comes from the pcap record)
+L3_FEATURES = {"time", "length", "src", "dst", "protocol", "ttl"}
+
+# Live features that also need the first bytes of the TCP/UDP header
+L4_FEATURES = L3_FEATURES | {
+    "src_port", "dst_port", "packet_count", "total_bytes",
+    "avg_packet_size", "flow_duration", "avg_ttl",
+}
+
+# Snaplen covering Ethernet + one VLAN tag (18) + max IPv4 header (60) [+ max TCP header (60)]
+SNAPLEN_L3 = 78
+SNAPLEN_L4 = 138
+
 # =============================================================================
 # Build tshark command (docker vs host)
 # =============================================================================
@@ -55,9 +67,10 @@ def _build_capture_cmd(ssh: SSHConfig, capture: CaptureConfig) -> list[str]:
     Builds the command used to start a capture process based on the provided configuration.
 
     This function constructs the appropriate command-line arguments depending on the
-    selected capture mode. It delegates command construction to either `_build_tshark_cmd`
-    or `_build_bpftrace_cmd`, depending on whether the mode involves network traffic
-    or system call tracing.
+    selected capture mode. It delegates command construction to `_build_tshark_cmd`
+    (or `_build_dumpcap_packet_cmd` when `capture.packet_source` is "dumpcap"),
+    `_build_argus_flow_cmd` or `_build_bpftrace_cmd`, depending on whether the mode
+    involves packets, flows or system call tracing.
 
     Args:
         ssh (SSHConfig): SSH configuration object containing remote execution parameters.
@@ -72,6 +85,8 @@ def _build_capture_cmd(ssh: SSHConfig, capture: CaptureConfig) -> list[str]:
     """
 
     mode = capture.mode.strip().lower()
+    if mode == "packet" and (capture.packet_source or "").lower() == "dumpcap":
+        return _build_dumpcap_packet_cmd(ssh, capture)
     if mode == "packet":
         return _build_tshark_cmd(ssh, capture)
     if mode == "flow":
@@ -80,6 +95,56 @@ def _build_capture_cmd(ssh: SSHConfig, capture: CaptureConfig) -> list[str]:
         return _build_bpftrace_cmd(ssh, capture)
     raise ValueError(f"Capture mode not supported: {capture.mode!r}")
 
+def derive_capture_pushdown(
+    pipelines: List[PipelineDef],
+    protocols: Optional[List[str]] = None,
+    ports: Optional[List[int]] = None,
+) -> Tuple[Optional[str], Optional[int]]:
+    """
+    Derives a BPF capture filter and a snaplen from the features used by the pipelines.
+
+    The snaplen is the smallest header length that still yields every feature the
+    pipelines were trained with: `SNAPLEN_L3` when only addresses, protocol, TTL and
+    lengths are used, `SNAPLEN_L4` when ports or flow counters are used. If any
+    pipeline does not expose its input columns, or uses a column outside the known
+    live features, no snaplen is returned and packets are captured in full.
+
+    The filter restricts the capture to the optional protocol/port scope, so that
+    out-of-scope packets are dropped in the kernel before tshark or dumpcap read them.
+
+    Args:
+        pipelines (List[PipelineDef]): Pipelines that will consume the capture.
+        protocols (List[str], optional): Protocols to keep (e.g. ["tcp", "udp"]).
+            Defaults to None (all protocols).
+        ports (List[int], optional): TCP/UDP ports to keep (source or destination).
+            Defaults to None (all ports).
+
+    Returns:
+        Tuple[Optional[str], Optional[int]]: The BPF filter (or None) and the snaplen (or None).
+    """
+
+    snaplen: Optional[int] = SNAPLEN_L3
+    for pipe in pipelines:
+        features = pipeline_feature_names(pipe.model, pipe.steps)
+        # One-hot encoded protocol columns (e.g. "protocol_TCP") only need the IP header
+        features = {"protocol" if f.startswith("protocol_") else f for f in features}
+        if not features or not features <= L4_FEATURES:
+            snaplen = None
+            break
+        if not features <= L3_FEATURES:
+            snaplen = SNAPLEN_L4
+
+    clauses = []
+    protocols = [p.strip().lower() for p in protocols or [] if p and p.strip()]
+    if protocols:
+        clauses.append("(" + " or ".join(protocols) + ")")
+    if ports:
+        clauses.append("(" + " or ".join(f"port {int(p)}" for p in ports) + ")")
+    bpf_filter = " and ".join(clauses) or None
+
+    logger.info(f"[CAPTURE PUSHDOWN] filter={bpf_filter!r}, snaplen={snaplen}")
+    return bpf_filter, snaplen
+
 def _build_tshark_cmd(ssh: SSHConfig, cap: CaptureConfig) -> List[str]:
     """
     Builds the command-line instruction to launch a `tshark` capture session.
@@ -91,7 +156,8 @@ def _build_tshark_cmd(ssh: SSHConfig, cap: CaptureConfig) -> List[str]:
     - **"host"** → executes locally on the same machine.
 
     The function also adds `sudo` when required and escapes additional arguments
-    securely using `shlex.quote()` to prevent shell injection issues.
+    securely using `shlex.quote()` to prevent shell injection issues. When set,
+    `cap.capture_filter` (`-f`) and `cap.snaplen` (`-s`) are applied at capture time.
 
     Args:
         ssh (SSHConfig): SSH configuration object containing connection parameters
@@ -108,6 +174,10 @@ def _build_tshark_cmd(ssh: SSHConfig, cap: CaptureConfig) -> List[str]:
     """
 
     base = f"{ssh.tshark_path} -l -i {ssh.interface}"
+    if cap.capture_filter:
+        base += f" -f {shlex.quote(cap.capture_filter)}"
+    if cap.snaplen:
+        base += f" -s {int(cap.snaplen)}"
     if cap.ek:
         base += " -T ek"
     if cap.extra_args:
@@ -126,6 +196,47 @@ def _build_tshark_cmd(ssh: SSHConfig, cap: CaptureConfig) -> List[str]:
     else:
         raise ValueError(f"run_env unknown: {cap.run_env} (Expected 'docker' o 'host')")
 
+def _build_dumpcap_packet_cmd(ssh: SSHConfig, cap: CaptureConfig) -> List[str]:
+    """
+    Builds a `dumpcap` command that writes the raw pcap stream to stdout.
+
+    Used by packet mode when `cap.packet_source` is "dumpcap": packets are not
+    dissected by tshark but decoded in-process by `pcap_stream`, which only reads
+    the L3/L4 headers. The stream is binary, so the process must be opened without
+    text mode.
+
+    Args:
+        ssh (SSHConfig): SSH configuration object (host, username, interface, sudo).
+        cap (CaptureConfig): Capture configuration (run_env, filter, snaplen, extra args).
+
+    Returns:
+        List[str]: The `dumpcap` command as a list of arguments for subprocess execution.
+
+    Raises:
+        ValueError: If `cap.run_env` is not recognized (expected "docker" or "host").
+    """
+
+    dumpcap_bin = getattr(ssh, "dumpcap_path", "/usr/bin/dumpcap")
+
+    base = f"{dumpcap_bin} -P -i {shlex.quote(ssh.interface)} -q"
+    if cap.capture_filter:
+        base += f" -f {shlex.quote(cap.capture_filter)}"
+    if cap.snaplen:
+        base += f" -s {int(cap.snaplen)}"
+    if cap.extra_args:
+        base += " " + " ".join(shlex.quote(x) for x in cap.extra_args)
+    base += " -w -"
+
+    if ssh.sudo:
+        base = "sudo -n " + base
+
+    if cap.run_env.lower() == "docker":
+        return ["ssh", f"{ssh.username}@{ssh.host}", base]
+    elif cap.run_env.lower() == "host":
+        return shlex.split(base)
+    else:
+        raise ValueError(f"run_env unknown: {cap.run_env} (Expected 'docker' o 'host')")
+
 def _build_argus_flow_cmd(ssh: SSHConfig, cap: CaptureConfig) -> list[str]:
     """
     Build a remote Argus pipeline that outputs live flow records in (quasi) real-time.
@@ -136,12 +247,17 @@ def _build_argus_flow_cmd(ssh: SSHConfig, cap: CaptureConfig) -> list[str]:
       - ra prints CSV (commas) so your df_from_ra_csv_lines() + handler work as-is
       - In docker mode we execute on the HOST via ssh user@host and wrap in bash -lc + pipefail
       - No timeout here: production must be continuous
+      - cap.capture_filter / cap.snaplen are passed to dumpcap (-f / -s), so argus only sees what it needs
     """
     dumpcap_bin = getattr(ssh, "dumpcap_path", "/usr/bin/dumpcap")
 
     ra_fields = "saddr,sport,daddr,dport,proto,pkts,bytes,dur,sttl,dttl"
 
     dumpcap_base = f"{dumpcap_bin} -P -i {shlex.quote(ssh.interface)} -q"
+    if cap.capture_filter:
+        dumpcap_base += f" -f {shlex.quote(cap.capture_filter)}"
+    if cap.snaplen:
+        dumpcap_base += f" -s {int(cap.snaplen)}"
 
     if cap.extra_args:
         dumpcap_base += " " + " ".join(shlex.quote(x) for x in cap.extra_args)
@@ -192,19 +308,28 @@ def _build_bpftrace_cmd(ssh: SSHConfig, capture: CaptureConfig) -> list[str]:
     Notes:
         - The function assumes that root privileges are typically required for `bpftrace`.
         - If `run_env` is set to `"docker"`, the command is executed remotely via SSH.
+        - If `capture.syscall_key` is set, a per-process program is generated with
+          `build_process_bpftrace_script` and passed with `-e`.
         - The `--` separator ensures that SSH does not interpret subsequent arguments.
     """
 
-    bpftrace_script_path = capture.bpftrace_script_path or ""
-
-    logger.info(f"[BUILD BPFTRACE CMD] Using bpftrace script: {bpftrace_script_path}")
     bpftrace_bin = getattr(ssh, "bpftrace_path", "/usr/bin/bpftrace")
 
     remote_cmd = []
     if ssh.sudo:
         remote_cmd += ["sudo", "-n"]
 
-    remote_cmd += [bpftrace_bin, "-q", bpftrace_script_path]
+    if capture.syscall_key:
+        # Per-process mode: generated program passed inline (quoted for the remote shell)
+        program = build_process_bpftrace_script(capture.syscall_key, capture.syscall_top_k)
+        logger.info(f"[BUILD BPFTRACE CMD] Using generated per-{capture.syscall_key} script (top {capture.syscall_top_k})")
+        if capture.run_env == "docker":
+            program = shlex.quote(program)
+        remote_cmd += [bpftrace_bin, "-q", "-e", program]
+    else:
+        bpftrace_script_path = capture.bpftrace_script_path or ""
+        logger.info(f"[BUILD BPFTRACE CMD] Using bpftrace script: {bpftrace_script_path}")
+        remote_cmd += [bpftrace_bin, "-q", bpftrace_script_path]
     if capture.extra_args:
         remote_cmd += capture.extra_args
 
@@ -253,10 +378,10 @@ def int_to_ip(ip_int):
 
 def extract_features_by_flow_from_pcap(file_obj):
     """
-    Extracts flow-based features from a PCAP file using PyShark.
+    Extracts flow-based features from a PCAP file with the native header decoder.
 
-    This function processes the PCAP packet by packet, grouping them by flow (identified by
-    source/destination IPs and ports, and protocol), and computes flow-level statistics such as:
+    Packets are decoded as in `extract_features_by_packet_from_pcap` and grouped by flow
+    (source/destination IPs and ports, and protocol) to compute:
     - packet count
     - total bytes
     - average packet size
@@ -264,7 +389,7 @@ def extract_features_by_flow_from_pcap(file_obj):
     - average TTL
 
     Args:
-        file_obj (file-like object): The uploaded PCAP file.
+        file_obj (file-like object): The uploaded PCAP/PCAPNG file, opened in binary mode.
 
     Returns:
         pandas.DataFrame: A DataFrame containing the aggregated flow features.
@@ -272,112 +397,23 @@ def extract_features_by_flow_from_pcap(file_obj):
 
     logger.info("[EXTRACT FLOW] Extracting features from PCAP file...")
 
-    # Save uploaded file to a temporary .pcap file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pcap") as tmp:
-        tmp.write(file_obj.read())
-        tmp_path = tmp.name
-
-    logger.info("[EXTRACT FLOW] Temporary file created at: %s", tmp_path)
+    df = aggregate_flows(extract_packet_features(file_obj))
 
-    cap = None
-    flow_dict = defaultdict(list)
-
-    try:
-        # Initialize PyShark capture
-        cap = pyshark.FileCapture(tmp_path, keep_packets=False)
-
-        for i, pkt in enumerate(cap):
-            try:
-                # Basic packet metadata
-                time = float(pkt.sniff_time.timestamp()) if hasattr(pkt, 'sniff_time') else None
-                length = int(pkt.length) if hasattr(pkt, 'length') else None
-
-                # Extract source and destination IPs
-                src = pkt.ip.src if hasattr(pkt, 'ip') else None
-                dst = pkt.ip.dst if hasattr(pkt, 'ip') else None
-
-                # Extract protocol information
-                proto = pkt.transport_layer or getattr(pkt, 'highest_layer', None)
-                proto_name = PROTOCOL_MAP.get(str(proto), str(proto)) if proto else 'UNKNOWN'
-
-                # Extract source and destination ports, defaulting to -1 if not available
-                src_port = dst_port = -1
-
-                if pkt.transport_layer:
-                    try:
-                        layer = pkt[pkt.transport_layer]
-                        
-                        # Use getattr to safely access srcport and dstport attributes
-                        src_port = int(getattr(layer, 'srcport', -1)) if hasattr(layer, 'srcport') else -1
-                        dst_port = int(getattr(layer, 'dstport', -1)) if hasattr(layer, 'dstport') else -1
-                    except Exception as e:
-                        logger.warning("[EXTRACT FLOW] Error retrieving ports from packet %d: %s", i + 1, str(e))
-
-                # Extract TCP flags and TTL if available
-                flags = pkt.tcp.flags if hasattr(pkt, 'tcp') and hasattr(pkt.tcp, 'flags') else None
-                ttl = int(pkt.ip.ttl) if hasattr(pkt, 'ip') and hasattr(pkt.ip, 'ttl') else None
-
-                # Create a unique key for the flow based on src, src_port, dst, dst_port, and protocol
-                flow_key = (src, src_port, dst, dst_port, proto_name)
-                flow_dict[flow_key].append({
-                    'time': time,
-                    'length': length,
-                    'ttl': ttl,
-                    'flags': flags
-                })
-
-            except Exception as e:
-                logger.warning("[EXTRACT FLOW] Error processing packet %d: %s", i + 1, str(e))
-                continue
-
-    except Exception as e:
-        logger.error("[EXTRACT FLOW] Error reading PCAP file: %s", str(e))
-    finally:
-        if cap:
-            cap.close()
-            del cap
-        logger.info("[EXTRACT FLOW] Capture closed successfully")
-
-    # Aggregate flow-level statistics
-    aggregated = []
-    for flow, packets in flow_dict.items():
-        times = [p['time'] for p in packets if p['time'] is not None]
-        lengths = [p['length'] for p in packets if p['length'] is not None]
-        ttls = [p['ttl'] for p in packets if p['ttl'] is not None]
-
-        aggregated.append({
-            'src': flow[0],
-            'src_port': flow[1],
-            'dst': flow[2],
-            'dst_port': flow[3],
-            'protocol': flow[4],
-            'packet_count': len(packets),
-            'total_bytes': sum(lengths),
-            'avg_packet_size': sum(lengths) / len(lengths) if lengths else 0,
-            'flow_duration': max(times) - min(times) if times else 0,
-            'avg_ttl': sum(ttls) / len(ttls) if ttls else None,
-        })
-
-    # Convert to DataFrame
-    df = pd.DataFrame(aggregated)
-
-    # Fill NaN values and replace empty strings
-    df['src_port'] = df['src_port'].fillna(-1)
-    df['dst_port'] = df['dst_port'].fillna(-1)
-    df['protocol'] = df['protocol'].fillna('UNKNOWN').replace('', 'UNKNOWN')
-
-    logger.info("[EXTRACT FLOW] DataFrame aggregated: %s", df)
+    logger.info("[EXTRACT FLOW] Extracted %d flows", len(df))
+    logger.debug("[EXTRACT FLOW] DataFrame aggregated: %s", df)
     return df
 
 def extract_features_by_packet_from_pcap(file_obj):
     """
-    Extracts packet-level features from a PCAP file using PyShark.
+    Extracts packet-level features from a PCAP file with the native header decoder.
 
-    This function processes each packet in the capture individually and extracts features
-    such as timestamp, length, IP addresses, ports, protocol name, TTL, etc.
+    Packets are decoded like `pcap_stream.decode_headers`, the decoder used by the live
+    `dumpcap` packet source, so training and production rows share the same semantics
+    (time, length, IPs, ports, protocol name, TTL). The headers are decoded in chunks
+    of packets with NumPy, in the calling process.
 
     Args:
-        file_obj (file-like object): The uploaded PCAP file.
+        file_obj (file-like object): The uploaded PCAP/PCAPNG file, opened in binary mode.
 
     Returns:
         pandas.DataFrame: A DataFrame containing one row per packet with basic features.
@@ -385,62 +421,10 @@ def extract_features_by_packet_from_pcap(file_obj):
 
     logger.info("[EXTRACT PACKET] Extracting packet-level features...")
 
-    # Save uploaded PCAP file to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pcap") as tmp:
-        tmp.write(file_obj.read())
-        tmp_path = tmp.name
-
-    # Initialize PyShark capture
-    cap = pyshark.FileCapture(tmp_path, keep_packets=False)
-    packets = []
-
-    try:
-        for i, pkt in enumerate(cap):
-            try:
-                # Timestamp and packet length
-                time = float(pkt.sniff_time.timestamp())
-                length = int(pkt.length)
-
-                # Extract source and destination IPs
-                src = pkt.ip.src if hasattr(pkt, 'ip') else None
-                dst = pkt.ip.dst if hasattr(pkt, 'ip') else None
-
-                # Extract TTL
-                ttl = int(pkt.ip.ttl) if hasattr(pkt, 'ip') and hasattr(pkt.ip, 'ttl') else None
-
-                # Extract protocol information
-                proto = pkt.transport_layer or getattr(pkt, 'highest_layer', None)
-                proto_name = PROTOCOL_MAP.get(str(proto), str(proto)) if proto else 'UNKNOWN'
-
-                # Extract source and destination ports, defaulting to -1 if not available
-                src_port = dst_port = -1
-
-                # Use getattr to safely access srcport and dstport attributes
-                if pkt.transport_layer:
-                    layer = pkt[pkt.transport_layer]
-                    src_port = int(getattr(layer, 'srcport', -1))
-                    dst_port = int(getattr(layer, 'dstport', -1))
-
-                # Append packet features to the list
-                packets.append({
-                    'time': time,
-                    'length': length,
-                    'src': src,
-                    'dst': dst,
-                    'src_port': src_port,
-                    'dst_port': dst_port,
-                    'protocol': proto_name,
-                    'ttl': ttl,
-                })
-            except Exception as e:
-                logger.warning("[EXTRACT PACKET] Error in packet %d: %s", i + 1, str(e))
-    finally:
-        cap.close()
-        del cap
+    df = extract_packet_features(file_obj)
 
-    # Convert the list of packets to a DataFrame
-    df = pd.DataFrame(packets)
-    logger.info("[EXTRACT PACKET] DataFrame aggregated: %s", df)
+    logger.info("[EXTRACT PACKET] Extracted %d packets", len(df))
+    logger.debug("[EXTRACT PACKET] DataFrame aggregated: %s", df)
 
     return df
 
@@ -687,6 +671,7 @@ def build_pipelines_from_components(
     *,
     model_id: str = "model_1",
     X_train: Optional[Any] = None,
+    compiled: Optional[Any] = None,
 ) -> List[PipelineDef]:
     preprocessors = preprocessors or []
     steps: List[Tuple[str, Any]] = []
@@ -701,6 +686,7 @@ def build_pipelines_from_components(
             model=model,
             steps=steps,
             X_train=X_train,
+            compiled=compiled,
         )
     ]
 
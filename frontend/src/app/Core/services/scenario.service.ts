@@ -287,6 +287,20 @@ export class ScenarioService {
     }
     return EMPTY;
   }
+
+  /**
+   * @summary Gets the progress of the latest execution of a scenario.
+   * 
+   * @param uuid Scenario identifier
+   * 
+   * @returns Observable with the run status and per-node progress
+   */
+  getScenarioRunStatus(uuid: string): Observable<any> {
+    if (isPlatformBrowser(this.platformId)) {
+      return this.handleRequest(this.http.get(`${this.apiUrl}${uuid}/run-status/`, { headers: this.getAuthHeaders() }));
+    }
+    return EMPTY;
+  }
   
   /**
    * @summary Deletes a scenario by UUID.
@@ -366,6 +380,75 @@ export class ScenarioService {
     return EMPTY;
   }
 
+  /**
+   * @summary Fetches the number of production anomalies over time, aggregated by the backend.
+   * 
+   * @param uuid Scenario identifier
+   * @param params Optional `since`/`until` (ISO 8601), `model` and maximum number of `buckets`
+   * 
+   * @returns Observable with the bucket size in seconds and the non-empty buckets
+   */
+  getScenarioAnomalyTimeline(uuid: string, params: Record<string, string | number> = {}): Observable<any> {
+    if (isPlatformBrowser(this.platformId)) {
+      return this.handleRequest(
+        this.http.get(`${this.apiUrl}${uuid}/anomaly-stats/timeline/`, { headers: this.getAuthHeaders(), params })
+      );
+    }
+    return EMPTY;
+  }
+
+  /**
+   * @summary Fetches the most frequent source IPs, destination ports and protocols of production anomalies.
+   * 
+   * @param uuid Scenario identifier
+   * @param params Optional `since`/`until` (ISO 8601), `model` and `limit`
+   * 
+   * @returns Observable with the `sources`, `ports` and `protocols` lists
+   */
+  getScenarioAnomalyTop(uuid: string, params: Record<string, string | number> = {}): Observable<any> {
+    if (isPlatformBrowser(this.platformId)) {
+      return this.handleRequest(
+        this.http.get(`${this.apiUrl}${uuid}/anomaly-stats/top/`, { headers: this.getAuthHeaders(), params })
+      );
+    }
+    return EMPTY;
+  }
+
+  /**
+   * @summary Fetches the number of production anomalies detected by every model.
+   * 
+   * @param uuid Scenario identifier
+   * @param params Optional `since`/`until` (ISO 8601)
+   * 
+   * @returns Observable with the total and the count of every model
+   */
+  getScenarioAnomalyModelCounts(uuid: string, params: Record<string, string | number> = {}): Observable<any> {
+    if (isPlatformBrowser(this.platformId)) {
+      return this.handleRequest(
+        this.http.get(`${this.apiUrl}${uuid}/anomaly-stats/models/`, { headers: this.getAuthHeaders(), params })
+      );
+    }
+    return EMPTY;
+  }
+
+  /**
+   * @summary Downloads the anomalies of a scenario as a file streamed by the backend.
+   * 
+   * @param uuid Scenario identifier
+   * @param params Optional `export_format` (csv, jsonl or parquet), `since`/`until` (ISO 8601),
+   * `production`, `model` and `execution`
+   * 
+   * @returns Observable with the exported file
+   */
+  exportScenarioAnomalies(uuid: string, params: Record<string, string | number> = {}): Observable<Blob> {
+    if (isPlatformBrowser(this.platformId)) {
+      return this.handleRequest(
+        this.http.get(`${this.apiUrl}${uuid}/anomalies/export/`, { headers: this.getAuthHeaders(), params, responseType: 'blob' })
+      );
+    }
+    return EMPTY;
+  }
+
   /**
    * @summary Starts production mode for a scenario by UUID.
    * 
@@ -341,11 +341,9 @@ export class ScenariosComponent {
     
     if (confirm('Are you sure you want to run this scenario?')) {
       this.scenarioService.runScenario(uuid).subscribe({
-        next: (response:any) => {
-          alert('Scenario running successfully');
+        next: () => {
           this.getScenarios();
-  
-          const metrics = response.metrics;
+          this.pollRunStatus(uuid);
         },
         error: (error: any) => {
           console.error('Error running scenario:', error);
@@ -357,6 +355,33 @@ export class ScenariosComponent {
     }
   }
 
+  /**
+   * @summary Polls the progress of a scenario run until it finishes.
+   * 
+   * @param uuid UUID of the running scenario
+   */
+  private pollRunStatus(uuid: string): void {
+    setTimeout(() => {
+      this.scenarioService.getScenarioRunStatus(uuid).subscribe({
+        next: (run: any) => {
+          if (run.status === 'Finished') {
+            alert('Scenario run successfully');
+            this.getScenarios();
+          } else if (run.status === 'Error') {
+            alert('Error running scenario: ' + JSON.stringify(run.error || 'Unexpected error'));
+            this.getScenarios();
+          } else {
+            this.pollRunStatus(uuid);
+          }
+        },
+        error: (error: any) => {
+          console.error('Error getting scenario run status:', error);
+          this.getScenarios();
+        }
+      });
+    }, 2000);
+  }
+
   /**
    * @summary Downloads the scenario design as a `.json` file.
    * 
@@ -186,7 +186,7 @@ export class TimelineADComponent implements OnInit {
       this.charts[chartId] = new Chart(canvas as HTMLCanvasElement, {
         type: 'line',
         data: {
-          labels: values.map((_: any, i: number) => i.toString()),
+          labels: values.map((_: any, i: number) => (metric.anomalies.index ? metric.anomalies.index[i] : i).toString()),
           datasets: [{
             label: 'Values',
             data: values,